@@ -0,0 +1,71 @@
+"""Passo de tempo fixo da simulação e animação dos movimentos.
+
+A simulação do jogo (movimentos, câmera, animações) avança em passos de
+duração fixa, não em quadros, então tudo leva o mesmo tempo de relógio em
+qualquer computador. O quadro desenhado fica entre dois passos, e as posições
+são interpoladas para esse instante. Este módulo não importa o pygame."""
+
+# Duração, em segundos, de cada passo da simulação.
+SIMULATION_STEP = 1.0 / 60
+# O tempo máximo de um quadro que a simulação tenta alcançar. Depois de uma
+# pausa longa (a janela arrastada, por exemplo) o resto é descartado, em vez
+# de fazer centenas de passos de uma vez.
+MAX_FRAME_TIME = 0.25
+
+
+class FixedTimestep:
+    """Converte o tempo de cada quadro em passos de simulação de tamanho fixo.
+
+         A cada quadro, addFrameTime() soma o tempo que passou e o loop executa
+         um passo da simulação enquanto nextStep() retornar True. time é o
+         tempo da simulação, em segundos, e renderTime() o instante que o
+         quadro deve mostrar (entre o último passo e o próximo)."""
+
+    def __init__(self, step=SIMULATION_STEP, maxFrameTime=MAX_FRAME_TIME):
+        self.step = step
+        self.maxFrameTime = maxFrameTime
+        self.accumulator = 0.0
+        self.time = 0.0
+
+    def addFrameTime(self, elapsed):
+        self.accumulator += min(elapsed, self.maxFrameTime)
+
+    def nextStep(self):
+        """Avança a simulação um passo, se já passou tempo para isso."""
+        if self.accumulator < self.step:
+            return False
+        self.accumulator -= self.step
+        self.time += self.step
+        return True
+
+    def alpha(self):
+        """Retorna quanto do próximo passo já passou, de 0.0 até 1.0."""
+        return self.accumulator / self.step
+
+    def renderTime(self):
+        return self.time + self.accumulator
+
+
+class Slide:
+    """Um objeto deslizando de um espaço (x, y) do mapa para outro, a partir
+         do tempo de simulação startTime, durante duration segundos."""
+
+    __slots__ = ('imageName', 'fromXY', 'toXY', 'startTime', 'duration')
+
+    def __init__(self, imageName, fromXY, toXY, startTime, duration):
+        self.imageName = imageName
+        self.fromXY = fromXY
+        self.toXY = toXY
+        self.startTime = startTime
+        self.duration = duration
+
+    def isFinished(self, time):
+        return time >= self.startTime + self.duration
+
+    def position(self, time):
+        """Retorna a posição (x, y) do objeto no tempo time, em espaços do
+             mapa (com frações durante o movimento)."""
+        progress = min(1.0, max(0.0, (time - self.startTime) / self.duration))
+        fromX, fromY = self.fromXY
+        toX, toY = self.toXY
+        return (fromX + (toX - fromX) * progress, fromY + (toY - fromY) * progress)
@@ -0,0 +1,81 @@
+"""Carregamento das imagens do Star Pusher.
+
+As imagens são convertidas uma única vez para o formato de pixels da tela
+(com convert_alpha()), então os blits não precisam mais converter pixels a
+cada quadro. Os ladrilhos usados em todo mapa são empacotados em um único
+Surface (o atlas) e as outras imagens só são carregadas quando usadas pela
+primeira vez. pygame.display.set_mode() precisa ter sido chamado antes."""
+
+import pygame
+from pygame.locals import *
+
+
+def loadImage(filename):
+    """Carrega um arquivo de imagem já convertido para o formato da tela."""
+    return pygame.image.load(filename).convert_alpha()
+
+
+class ImageManager:
+    """Um substituto para o dicionário de imagens do jogo: images['star']
+         retorna o Surface da imagem 'star', carregando-a na primeira vez.
+
+         imageFiles mapeia o nome de cada imagem para o seu arquivo. As imagens
+         em atlasNames são todas carregadas juntas, na primeira vez que uma
+         delas é pedida, e viram pedaços (subsurfaces) de um único atlas."""
+
+    def __init__(self, imageFiles, atlasNames):
+        self.imageFiles = imageFiles
+        self.atlasNames = tuple(atlasNames)
+        self.images = {}
+        self.scaledImages = {}
+        self.atlas = None
+
+    def __getitem__(self, name):
+        if name not in self.images:
+            if name in self.atlasNames:
+                self.buildAtlas()
+            else:
+                self.images[name] = loadImage(self.imageFiles[name])
+        return self.images[name]
+
+    def __contains__(self, name):
+        return name in self.imageFiles
+
+    def keys(self):
+        return self.imageFiles.keys()
+
+    def buildAtlas(self):
+        """Carrega as imagens de atlasNames lado a lado em um único Surface."""
+
+        sourceImages = [pygame.image.load(self.imageFiles[name]) for name in self.atlasNames]
+        atlasWidth = sum(image.get_width() for image in sourceImages)
+        atlasHeight = max(image.get_height() for image in sourceImages)
+        atlas = pygame.Surface((atlasWidth, atlasHeight), SRCALPHA)
+        atlas.fill((0, 0, 0, 0))
+
+        rects = []
+        left = 0
+        for image in sourceImages:
+            rect = image.get_rect(topleft=(left, 0))
+            # BLEND_RGBA_MAX sobre pixels zerados copia os pixels (e o alfa)
+            # exatamente como estão, sem misturar com o fundo transparente.
+            atlas.blit(image, rect, special_flags=BLEND_RGBA_MAX)
+            rects.append(rect)
+            left += rect.width
+
+        self.atlas = atlas.convert_alpha()
+        for name, rect in zip(self.atlasNames, rects):
+            self.images[name] = self.atlas.subsurface(rect)
+
+    def getScaled(self, name, scale):
+        """Retorna a imagem redimensionada pelo fator scale (para níveis de
+             zoom), guardando o resultado para as próximas chamadas."""
+
+        if scale == 1:
+            return self[name]
+        key = (name, scale)
+        if key not in self.scaledImages:
+            image = self[name]
+            size = (max(1, int(image.get_width() * scale)), max(1, int(image.get_height() * scale)))
+            self.scaledImages[key] = pygame.transform.smoothscale(image, size)
+        return self.scaledImages[key]
@@ -0,0 +1,160 @@
+"""Resolução em lote de coleções de níveis usando vários processos.
+
+Cada nível é resolvido em um processo novo, com limite de tempo e de
+memória, então um nível muito difícil não trava o resto da coleção e o pico
+de memória medido é só daquele nível. O limite de tempo também é conferido
+pelo processo principal: um processo que passa dele por mais que
+HARD_LIMIT_SLACK segundos (preso fora da busca, por exemplo) é terminado, e
+um processo que morre sem mandar o resultado (terminado pelo sistema por
+falta de memória, por exemplo) é anotado como 'crashed', em vez de deixar a
+coleção esperando por ele para sempre. Este módulo não importa o pygame."""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+from collections import deque
+
+import starsolver
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: sem limite de memória nem medida de pico.
+
+DEFAULT_MEMORY_LIMIT_MB = 2048
+# O limite de tempo de cada nível, em segundos, quando nenhum é dado.
+DEFAULT_TIME_LIMIT = 300
+# Quantos segundos depois do limite de tempo o processo de um nível é terminado.
+HARD_LIMIT_SLACK = 10
+
+
+def _limitMemory(memoryLimitMB):
+    """Inicializador dos processos do pool: limita o espaço de endereçamento
+         do processo para que a busca receba MemoryError em vez de esgotar a
+         memória da máquina."""
+    if resource is None or not memoryLimitMB:
+        return
+    limit = memoryLimitMB * 1024 * 1024
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass  # O sistema não deixa mudar o limite; segue sem ele.
+
+
+def peakMemoryMB():
+    """Retorna o pico de memória residente do processo atual, em MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024.0 * 1024.0)  # No macOS o valor vem em bytes.
+    return peak / 1024.0
+
+
+def _failedResult(levelNum, status, seconds):
+    """Retorna o resultado de um nível cuja busca não chegou ao fim."""
+    return {
+        'status': status,
+        'solution': None,
+        'moves': None,
+        'pushes': None,
+        'nodesExpanded': None,
+        'seconds': seconds,
+        'levelNum': levelNum,
+        'peakMemoryMB': None
+    }
+
+
+def _solveWorker(task):
+    """Resolve um nível dentro do processo do nível."""
+    levelNum, levelObj, mode, timeLimit = task
+    startTime = time.time()
+    try:
+        result = starsolver.solve(levelObj, mode=mode, timeLimit=timeLimit)
+    except MemoryError:
+        return _failedResult(levelNum, 'memory', time.time() - startTime)
+    result['levelNum'] = levelNum
+    result['peakMemoryMB'] = peakMemoryMB()
+    return result
+
+
+def _runWorker(connection, task, memoryLimitMB):
+    """O processo de um nível: resolve o nível e manda o resultado pela
+         conexão."""
+    _limitMemory(memoryLimitMB)
+    connection.send(_solveWorker(task))
+    connection.close()
+
+
+def solveInParallel(levels, levelNums=None, mode=starsolver.PUSHES, timeLimit=DEFAULT_TIME_LIMIT,
+                    memoryLimitMB=DEFAULT_MEMORY_LIMIT_MB, processes=None, callback=None):
+    """Resolve os níveis (objetos de nível de readLevelsFile()), cada um em um
+         processo novo. levelNums são os números dos níveis (começando em 1),
+         ou None para todos. processes é o número de processos ao mesmo tempo
+         (o padrão é um por núcleo da CPU). Com timeLimit None, os níveis não
+         têm limite de tempo.
+
+         callback, se dado, é chamado com o resultado de cada nível assim que
+         ele termina. Retorna a lista de resultados de solve(), com as chaves
+         extras 'levelNum' e 'peakMemoryMB', na ordem dos níveis. Além dos
+         status de solve(), um nível pode terminar com 'memory' (o limite de
+         memória) ou 'crashed' (o processo morreu sem mandar o resultado); um
+         processo terminado por passar do limite de tempo fica com 'limit'."""
+
+    if levelNums is None:
+        levelNums = range(1, len(levels) + 1)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    pending = deque((levelNum, levels[levelNum - 1], mode, timeLimit) for levelNum in levelNums)
+
+    results = []
+    running = {}  # conexão -> (processo, número do nível, início)
+    try:
+        while pending or running:
+            while pending and len(running) < processes:
+                task = pending.popleft()
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=_runWorker, args=(sender, task, memoryLimitMB),
+                                                  daemon=True)
+                process.start()
+                sender.close()  # Assim o fim do processo fecha a conexão.
+                running[receiver] = (process, task[0], time.time())
+
+            timeout = None
+            if timeLimit is not None:
+                firstStart = min(startTime for (process, levelNum, startTime) in running.values())
+                timeout = max(0.0, firstStart + timeLimit + HARD_LIMIT_SLACK - time.time())
+            ready = multiprocessing.connection.wait(list(running), timeout)
+
+            now = time.time()
+            for receiver in list(running):
+                process, levelNum, startTime = running[receiver]
+                if receiver in ready:
+                    try:
+                        result = receiver.recv()
+                    except EOFError:
+                        result = _failedResult(levelNum, 'crashed', now - startTime)
+                elif timeLimit is not None and now - startTime >= timeLimit + HARD_LIMIT_SLACK:
+                    process.terminate()
+                    result = _failedResult(levelNum, 'limit', now - startTime)
+                else:
+                    continue
+                del running[receiver]
+                receiver.close()
+                process.join()
+                results.append(result)
+                if callback is not None:
+                    callback(result)
+    finally:
+        for receiver, (process, levelNum, startTime) in running.items():
+            process.terminate()
+            process.join()
+            receiver.close()
+
+    results.sort(key=lambda result: result['levelNum'])
+    return results
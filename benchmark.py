@@ -0,0 +1,319 @@
+"""Benchmarks dos caminhos mais usados do Star Pusher.
+
+Mede quantos movimentos por segundo makeMove(), replay.Replay e o
+vecenv.VecStarPusher (se o NumPy estiver instalado) fazem, quanto tempo leva para
+ler o Levels.txt e converter mapas grandes, e o tempo de decorateMap(),
+labelRegions(), decorateMap() com um mapgrid.MapGrid (se o NumPy estiver
+instalado) e drawMap() (com o driver de vídeo "dummy" do SDL, sem abrir
+janela) nos níveis reais e em mapas sintéticos grandes. Os resultados podem ser gravados em JSON com --output
+para comparar execuções e encontrar regressões de desempenho.
+
+Uso: python benchmark.py [--quick] [--output resultados.json]"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import replay
+import starcore
+from gamestate import cellToXY
+from levelfile import buildLevelIndex, parseLevel, readLevelsFile
+
+LEVELSFILE = 'Levels.txt'
+
+# Tamanhos (colunas, linhas) dos mapas sintéticos de cada benchmark.
+SYNTHETIC_SIZES = [(30, 30), (100, 100), (200, 200), (500, 500)]
+SYNTHETIC_DRAW_SIZES = [(30, 30), (60, 40)]
+QUICK_SYNTHETIC_SIZES = [(30, 30), (100, 100)]
+QUICK_SYNTHETIC_DRAW_SIZES = [(30, 30)]
+# Mapas grandes demais para drawMap(), só desenhados em pedaços.
+SYNTHETIC_CHUNKED_SIZES = [(60, 40), (500, 500)]
+QUICK_SYNTHETIC_CHUNKED_SIZES = [(60, 40)]
+
+# Os caracteres do mapa por onde o jogador pode andar.
+FLOOR_CHARACTERS = ' .$*@+'
+
+
+def bestTime(function, repeat):
+    """Executa function repeat vezes e retorna o menor tempo, em segundos."""
+    best = None
+    for i in range(repeat):
+        startTime = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - startTime
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def makeSyntheticMap(width, height, seed=0):
+    """Cria o texto de um nível retangular de width x height com paredes na
+         borda, algumas paredes soltas no meio e tantas estrelas quanto
+         objetivos. Retorna a lista de linhas do mapa."""
+
+    rng = random.Random(seed)
+    rows = []
+    for y in range(height):
+        row = []
+        for x in range(width):
+            if x in (0, width - 1) or y in (0, height - 1) or rng.randint(0, 99) < 8:
+                row.append('#')
+            else:
+                row.append(' ')
+        rows.append(row)
+
+    floor = [(x, y) for y in range(height) for x in range(width) if rows[y][x] == ' ']
+    rng.shuffle(floor)
+    numStars = max(1, len(floor) // 50)
+    playerx, playery = floor.pop()
+    rows[playery][playerx] = '@'
+    for i in range(numStars):
+        x, y = floor.pop()
+        rows[y][x] = '$'
+        x, y = floor.pop()
+        rows[y][x] = '.'
+
+    return [''.join(row) for row in rows]
+
+
+def makeSyntheticLevel(width, height, seed=0):
+    """Retorna o objeto de nível do mapa criado por makeSyntheticMap()."""
+    return parseLevel(makeSyntheticMap(width, height, seed), 0, 0, '<sintético %sx%s>' % (width, height))
+
+
+def benchParse(results, sizes, repeat):
+    results['parse Levels.txt (s)'] = bestTime(lambda: readLevelsFile(LEVELSFILE), repeat)
+    results['index Levels.txt (s)'] = bestTime(lambda: buildLevelIndex(LEVELSFILE), repeat)
+    for width, height in sizes:
+        mapTextLines = makeSyntheticMap(width, height)
+        # parseLevel() completa as linhas no lugar, então cada execução recebe uma cópia.
+        results['parseLevel %sx%s (s)' % (width, height)] = bestTime(
+            lambda: parseLevel(list(mapTextLines), 0, 0, '<sintético>'), repeat)
+
+
+def randomWalk(levelObj, numMoves, seed=0):
+    """Faz numMoves tentativas de movimento aleatórias com makeMove()."""
+    rng = random.Random(seed)
+    directions = [rng.choice((starcore.UP, starcore.DOWN, starcore.LEFT, starcore.RIGHT))
+                  for i in range(numMoves)]
+    mapObj = levelObj['mapObj']
+    gameStateObj = levelObj['startState'].copy()
+    makeMove = starcore.makeMove
+
+    startTime = time.perf_counter()
+    for direction in directions:
+        makeMove(mapObj, gameStateObj, direction)
+    return numMoves / (time.perf_counter() - startTime)
+
+
+def benchMoves(results, levels, syntheticLevels, numMoves):
+    movesPerSecond = [randomWalk(levels[i], numMoves) for i in range(0, len(levels), 20)]
+    results['makeMove Levels.txt (movimentos/s)'] = sum(movesPerSecond) / len(movesPerSecond)
+    for (width, height), levelObj in syntheticLevels:
+        results['makeMove %sx%s (movimentos/s)' % (width, height)] = randomWalk(levelObj, numMoves)
+
+
+def randomSolution(levelObj, numMoves, seed=0):
+    """Retorna o texto LURD de um passeio aleatório com até numMoves
+         movimentos válidos, gerado com makeMove()."""
+    rng = random.Random(seed)
+    letters = {starcore.UP: 'u', starcore.DOWN: 'd', starcore.LEFT: 'l', starcore.RIGHT: 'r'}
+    mapObj = levelObj['mapObj']
+    gameStateObj = levelObj['startState'].copy()
+    solution = []
+    for i in range(numMoves):
+        direction = rng.choice((starcore.UP, starcore.DOWN, starcore.LEFT, starcore.RIGHT))
+        starsBefore = gameStateObj.stars
+        if starcore.makeMove(mapObj, gameStateObj, direction):
+            letter = letters[direction]
+            solution.append(letter.upper() if gameStateObj.stars != starsBefore else letter)
+    return ''.join(solution)
+
+
+def benchReplay(results, syntheticLevels, numMoves, repeat):
+    for (width, height), levelObj in syntheticLevels:
+        solution = randomSolution(levelObj, numMoves)
+        seconds = bestTime(lambda: replay.Replay(levelObj, solution), repeat)
+        results['Replay %sx%s (movimentos/s)' % (width, height)] = len(solution) / seconds
+        levelReplay = replay.Replay(levelObj, solution)
+        steps = random.Random(0).sample(range(levelReplay.length + 1), 100)
+        results['Replay.stateAt %sx%s (s)' % (width, height)] = bestTime(
+            lambda: [levelReplay.stateAt(step) for step in steps], repeat) / len(steps)
+
+
+def decorate(levelObj):
+    startState = levelObj['startState']
+    return starcore.decorateMap(levelObj['mapObj'], cellToXY(startState.board, startState.player))
+
+
+def benchDecorate(results, levels, syntheticLevels, repeat):
+    def decorateAll():
+        for levelObj in levels:
+            decorate(levelObj)
+    results['decorateMap Levels.txt (s/nível)'] = bestTime(decorateAll, repeat) / len(levels)
+
+    for (width, height), levelObj in syntheticLevels:
+        results['decorateMap %sx%s (s)' % (width, height)] = bestTime(lambda: decorate(levelObj), repeat)
+        results['labelRegions %sx%s (s)' % (width, height)] = bestTime(
+            lambda: starcore.labelRegions(levelObj['mapObj'], FLOOR_CHARACTERS), repeat)
+
+
+def benchMapGrid(results, syntheticLevels, repeat):
+    try:
+        import mapgrid
+    except ImportError:
+        results['MapGrid'] = 'numpy não instalado'
+        return
+
+    for (width, height), levelObj in syntheticLevels:
+        grid = mapgrid.MapGrid.fromMapObj(levelObj['mapObj'])
+        startState = levelObj['startState']
+        startxy = cellToXY(startState.board, startState.player)
+        results['MapGrid.fromMapObj %sx%s (s)' % (width, height)] = bestTime(
+            lambda: mapgrid.MapGrid.fromMapObj(levelObj['mapObj']), repeat)
+        results['decorateMap MapGrid %sx%s (s)' % (width, height)] = bestTime(
+            lambda: starcore.decorateMap(grid, startxy), repeat)
+
+
+def benchVecEnv(results, levels, numMoves):
+    try:
+        import vecenv
+    except ImportError:
+        results['VecStarPusher'] = 'numpy não instalado'
+        return
+
+    rng = random.Random(0)
+    for numEnvs in (64, 1024):
+        env = vecenv.VecStarPusher(levels, numEnvs=numEnvs, maxSteps=200)
+        numSteps = max(1, numMoves // numEnvs)
+        actions = [[rng.randrange(vecenv.NUM_ACTIONS) for i in range(numEnvs)] for step in range(numSteps)]
+        actions = vecenv.numpy.array(actions)
+        startTime = time.perf_counter()
+        for stepActions in actions:
+            env.step(stepActions)
+        results['VecStarPusher %s ambientes (movimentos/s)' % (numEnvs)] = \
+            numSteps * numEnvs / (time.perf_counter() - startTime)
+
+
+def drawMap(mapObj, gameStateObj, goals):
+    """Desenha o mapa inteiro em uma Surface nova, como o jogo fazia antes de
+         desenhar o mapa em pedaços (veja mapview.ChunkedMapSurface). Fica
+         aqui como a referência dos benchmarks de desenho."""
+    import pygame
+    import starpusher
+
+    mapSurfWidth = len(mapObj) * starpusher.TILEWIDTH
+    mapSurfHeight = (len(mapObj[0]) - 1) * starpusher.TILEFLOORHEIGHT + starpusher.TILEHEIGHT
+    mapSurf = pygame.Surface((mapSurfWidth, mapSurfHeight))
+    starpusher.drawMapArea(mapSurf, mapObj, gameStateObj, set(goals), mapSurf.get_rect())
+    return mapSurf
+
+
+def redrawMapSpaces(mapSurf, mapObj, gameStateObj, goals, spaces):
+    """Redesenha em mapSurf (criado por drawMap()) apenas os espaços (x, y)
+         da lista spaces. Retorna a lista de Rects que mudaram."""
+    import pygame
+    import starpusher
+
+    goals = set(goals)
+    dirtyRects = []
+    for (x, y) in spaces:
+        spaceRect = pygame.Rect((x * starpusher.TILEWIDTH, y * starpusher.TILEFLOORHEIGHT,
+                                 starpusher.TILEWIDTH, starpusher.TILEHEIGHT))
+        starpusher.drawMapArea(mapSurf, mapObj, gameStateObj, goals, spaceRect)
+        dirtyRects.append(spaceRect)
+    return dirtyRects
+
+
+def benchDraw(results, levels, drawLevels, chunkedLevels, repeat):
+    # O driver "dummy" deixa o pygame desenhar em memória sem abrir janela.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        import starpusher
+    except ImportError:
+        results['drawMap'] = 'pygame não instalado'
+        return
+    starpusher.initGame()
+
+    for name, levelObj in [('Levels.txt nível 1', levels[0]), ('Levels.txt nível 50', levels[49])] + \
+            [('%sx%s' % size, levelObj) for size, levelObj in drawLevels]:
+        mapObj = decorate(levelObj)
+        gameStateObj = levelObj['startState']
+        results['drawMap %s (s)' % (name)] = bestTime(
+            lambda: drawMap(mapObj, gameStateObj, levelObj['goals']), repeat)
+
+        # Redesenhar só os espaços de um movimento com empurrão (3 espaços).
+        mapSurf = drawMap(mapObj, gameStateObj, levelObj['goals'])
+        playerx, playery = cellToXY(gameStateObj.board, gameStateObj.player)
+        spaces = [(playerx, playery), (playerx, max(0, playery - 1)), (playerx, max(0, playery - 2))]
+        results['redrawMapSpaces %s (s)' % (name)] = bestTime(
+            lambda: redrawMapSpaces(mapSurf, mapObj, gameStateObj, levelObj['goals'], spaces), repeat)
+
+    # Uma janela inteira desenhada a partir dos pedaços do mapa: com os
+    # pedaços ainda por desenhar e com eles já guardados.
+    windowSurf = starpusher.DISPLAYSURF
+    windowRect = windowSurf.get_rect()
+    for size, levelObj in chunkedLevels:
+        mapObj = decorate(levelObj)
+        gameStateObj = levelObj['startState']
+        goals = set(levelObj['goals'])
+
+        def makeView():
+            return starpusher.ChunkedMapSurface(
+                len(mapObj) * starpusher.TILEWIDTH,
+                (len(mapObj[0]) - 1) * starpusher.TILEFLOORHEIGHT + starpusher.TILEHEIGHT,
+                starpusher.CHUNKWIDTH, starpusher.CHUNKHEIGHT,
+                lambda surface, area, origin: starpusher.drawMapArea(surface, mapObj, gameStateObj, goals,
+                                                                     area, origin),
+                starpusher.MAXCHUNKS)
+
+        results['janela em pedaços %sx%s, nova (s)' % size] = bestTime(
+            lambda: makeView().draw(windowSurf, (0, 0), windowRect), repeat)
+        mapView = makeView()
+        mapView.draw(windowSurf, (0, 0), windowRect)
+        results['janela em pedaços %sx%s, guardada (s)' % size] = bestTime(
+            lambda: mapView.draw(windowSurf, (0, 0), windowRect), repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks do Star Pusher')
+    parser.add_argument('--quick', action='store_true', help='menos repetições e mapas menores')
+    parser.add_argument('--output', help='grava os resultados neste arquivo JSON')
+    args = parser.parse_args()
+
+    repeat = 3 if args.quick else 7
+    numMoves = 20000 if args.quick else 200000
+    sizes = QUICK_SYNTHETIC_SIZES if args.quick else SYNTHETIC_SIZES
+    drawSizes = QUICK_SYNTHETIC_DRAW_SIZES if args.quick else SYNTHETIC_DRAW_SIZES
+    chunkedSizes = QUICK_SYNTHETIC_CHUNKED_SIZES if args.quick else SYNTHETIC_CHUNKED_SIZES
+
+    levels = readLevelsFile(LEVELSFILE)
+    syntheticLevels = [(size, makeSyntheticLevel(*size)) for size in sizes]
+    drawLevels = [(size, makeSyntheticLevel(*size)) for size in drawSizes]
+    chunkedLevels = [(size, makeSyntheticLevel(*size)) for size in chunkedSizes]
+
+    results = {}
+    benchParse(results, sizes, repeat)
+    benchMoves(results, levels, syntheticLevels, numMoves)
+    benchReplay(results, syntheticLevels, numMoves, repeat)
+    benchVecEnv(results, levels, numMoves)
+    benchDecorate(results, levels, syntheticLevels, repeat)
+    benchMapGrid(results, syntheticLevels, repeat)
+    benchDraw(results, levels, drawLevels, chunkedLevels, repeat)
+
+    for name, value in results.items():
+        if isinstance(value, float):
+            print('%-45s %14.6f' % (name, value))
+        else:
+            print('%-45s %14s' % (name, value))
+
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            json.dump({'python': sys.version, 'results': results}, outputFile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
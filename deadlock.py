@@ -0,0 +1,123 @@
+"""Índice de becos sem saída (deadlocks) de um nível do Star Pusher.
+
+O índice é calculado uma vez, quando o nível é carregado, a partir da placa
+criada por gamestate.makeBoard(). Ele guarda as "casas mortas" (células de
+onde uma estrela nunca consegue chegar a nenhum objetivo) e oferece uma
+verificação rápida de estrelas congeladas (freeze), que também cobre os
+blocos 2x2 de estrelas e paredes. Este módulo não importa o pygame."""
+
+from collections import deque
+
+from gamestate import DOWN, RIGHT, cellsToBits
+
+
+def makeDeadlockIndex(board, numStars):
+    """Calcula o índice de deadlocks da placa para um nível com numStars estrelas.
+
+         As casas vivas são encontradas "puxando" uma estrela a partir de todos
+         os objetivos ao mesmo tempo: a estrela pode ir de prev para cell se
+         existe espaço para o jogador atrás dela. Toda célula livre que não é
+         alcançada dessa forma é uma casa morta.
+
+         Retorna um dicionário com a placa, o bytearray deadSquares (1 nas casas
+         mortas), a mesma informação como máscara de bits e quantas estrelas
+         sobram além do número de objetivos."""
+
+    walls = board['walls']
+    offsets = [offset for (direction, offset) in board['directions']]
+
+    live = bytearray(board['size'])
+    queue = deque(board['goals'])
+    for goal in board['goals']:
+        live[goal] = 1
+    while queue:
+        cell = queue.popleft()
+        for offset in offsets:
+            prev = cell - offset
+            if not live[prev] and not walls[prev] and not walls[prev - offset]:
+                live[prev] = 1
+                queue.append(prev)
+
+    deadCells = [cell for cell in range(board['size']) if not walls[cell] and not live[cell]]
+    deadSquares = bytearray(board['size'])
+    for cell in deadCells:
+        deadSquares[cell] = 1
+    deadMask = cellsToBits(deadCells, board['size'])
+
+    return {
+        'board': board,
+        'deadSquares': deadSquares,
+        'deadMask': deadMask,
+        'spareStars': numStars - len(board['goals'])
+    }
+
+
+def countBits(bits):
+    return bin(bits).count('1')
+
+
+def isFreezeDeadlock(deadlocks, starBits, cell):
+    """Retorna True se a estrela em cell não pode mais se mover em nenhum eixo
+         (presa por paredes, casas mortas ou outras estrelas também presas) e
+         alguma das estrelas presas não está sobre um objetivo.
+
+         starBits é a máscara de bits de todas as estrelas, já com a estrela em
+         cell. Durante a verificação, as estrelas que ainda estão sendo
+         examinadas contam como paredes para evitar ciclos."""
+
+    board = deadlocks['board']
+    walls = board['walls']
+    deadSquares = deadlocks['deadSquares']
+    vertical = board['offsets'][DOWN]
+    horizontal = board['offsets'][RIGHT]
+    examined = {}  # célula da estrela -> None (em exame), True ou False
+    frozen = []
+
+    def isBlockedOnAxis(cell, offset):
+        before = cell - offset
+        after = cell + offset
+        if walls[before] or walls[after]:
+            return True
+        if deadSquares[before] and deadSquares[after]:
+            return True
+        for neighbor in (before, after):
+            if (starBits >> neighbor) & 1 and isFrozen(neighbor):
+                return True
+        return False
+
+    def isFrozen(cell):
+        if cell in examined:
+            return examined[cell] is not False
+        examined[cell] = None
+        result = isBlockedOnAxis(cell, vertical) and isBlockedOnAxis(cell, horizontal)
+        examined[cell] = result
+        if result:
+            frozen.append(cell)
+        return result
+
+    if not isFrozen(cell):
+        return False
+    goalMask = board['goalMask']
+    for star in frozen:
+        if not (goalMask >> star) & 1:
+            return True
+    return False
+
+
+def isDeadlockedPush(deadlocks, starBits, fromCell, toCell):
+    """Retorna True se empurrar a estrela de fromCell para toCell deixa o nível
+         impossível de resolver. starBits são as estrelas antes do empurrão.
+
+         Com estrelas sobrando (mais estrelas que objetivos), algumas estrelas
+         podem ficar presas fora dos objetivos; então uma casa morta só é um
+         deadlock quando passa desse limite, e a verificação de estrelas
+         congeladas só é usada quando não há estrelas sobrando."""
+
+    newBits = starBits ^ ((1 << fromCell) | (1 << toCell))
+    spareStars = deadlocks['spareStars']
+    if deadlocks['deadSquares'][toCell]:
+        if spareStars == 0 or countBits(newBits & deadlocks['deadMask']) > spareStars:
+            return True
+    if spareStars == 0 and isFreezeDeadlock(deadlocks, newBits, toCell):
+        return True
+    return False
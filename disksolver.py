@@ -0,0 +1,439 @@
+"""Resolvedor com a tabela de estados em disco, para níveis que não cabem na
+memória.
+
+O solve() do starsolver guarda os estados da busca em dicionários, e os
+níveis maiores precisam de dezenas de milhões deles. solveOnDisk() faz a
+mesma busca A*, mas os estados ficam em uma DiskStateTable: dois arquivos
+mapeados na memória com mmap, então o sistema operacional mantém na memória
+só as páginas em uso. Cada estado é um registro de tamanho fixo com a posição
+empacotada (os bits das estrelas e a célula do jogador), o custo, a
+heurística e o registro do estado anterior, e um índice de endereçamento
+aberto pelo hash Zobrist leva da posição ao registro. Na memória ficam só a
+lista aberta (um inteiro por entrada) e uma cache limitada da heurística.
+
+Um registro só é marcado como expandido depois que todos os seus filhos
+estão na tabela, então uma busca interrompida (pelo limite de tempo, por
+Ctrl+C ou por uma queda do processo) continua de onde parou quando
+solveOnDisk() é chamada de novo com o mesmo arquivo: a lista aberta é
+refeita com os registros ainda não expandidos. A cada CHECKPOINT_INTERVAL
+nós expandidos os arquivos são gravados no disco com flush(). Este módulo
+não importa o pygame."""
+
+import heapq
+import mmap
+import os
+import struct
+import time
+
+from deadlock import isDeadlockedPush
+from gamestate import bitsToCells
+from history import DIRECTIONCODES, DIRECTIONS
+from starsolver import (INFINITY, MOVES, PROGRESS_INTERVAL, PUSHES, makeHeuristic, playerReach, pushDistances,
+                        pushesToLURD, walkDistances)
+
+RECORDS_EXTENSION = '.records'
+INDEX_EXTENSION = '.index'
+
+# O cabeçalho do arquivo de registros: a assinatura, a versão, o modo de
+# busca, a identificação do nível (o Zobrist do estado inicial e o tamanho da
+# placa), quantos registros existem e quantos nós já foram expandidos.
+TABLE_MAGIC = b'SPDT'
+TABLE_VERSION = 1
+HEADER = struct.Struct('<4sBBxxQIQQ')
+HEADER_SIZE = 64
+MODECODES = {PUSHES: 0, MOVES: 1}
+
+# Depois da posição empacotada, cada registro tem: o custo, a heurística, o
+# registro do estado anterior, a célula do jogador antes do empurrão, a
+# direção do empurrão e as marcas abaixo.
+HASH = struct.Struct('<Q')
+PLAYER = struct.Struct('<I')
+VALUES = struct.Struct('<IIqIBB')
+
+# As marcas de um registro.
+HAS_COST = 1  # um estado gerado pela busca, com custo e registro anterior
+EXPANDED = 2  # já saiu da lista aberta (não está na fronteira)
+CLOSED = 4  # a posição (no modo PUSHES, com o jogador normalizado) já foi expandida
+
+NO_COST = 0xFFFFFFFF  # o custo dos registros que só marcam uma posição fechada
+NO_PARENT = -1
+
+INITIAL_CAPACITY = 1 << 16  # registros no arquivo novo; ele dobra quando enche
+CHECKPOINT_INTERVAL = 100000
+# Quantos valores da heurística ficam guardados na memória.
+HEURISTIC_CACHE_SIZE = 1 << 20
+
+# Cada entrada da lista aberta é um inteiro: f, h e o número do registro, em
+# ordem de prioridade (menor f, depois menor h).
+RECORD_BITS = 48
+H_BITS = 24
+RECORD_MASK = (1 << RECORD_BITS) - 1
+H_MASK = (1 << H_BITS) - 1
+
+
+def openEntry(cost, h, record):
+    return (((cost + h) << H_BITS | h) << RECORD_BITS) | record
+
+
+class DiskStateTable:
+    """Os registros dos estados de uma busca, em filename + '.records', e o
+         índice deles pelo hash, em filename + '.index'.
+
+         keySize é o tamanho da posição empacotada, em bytes. Os registros
+         são numerados na ordem em que são criados e nunca mudam de número,
+         então o registro anterior de cada estado é só o número dele. O índice
+         tem o dobro de entradas da capacidade do arquivo de registros, e é
+         refeito quando o arquivo dobra."""
+
+    def __init__(self, filename, keySize):
+        self.recordsFilename = filename + RECORDS_EXTENSION
+        self.indexFilename = filename + INDEX_EXTENSION
+        self.keySize = keySize
+        self.valuesOffset = HASH.size + keySize
+        self.recordSize = self.valuesOffset + VALUES.size
+        self.header = None
+        self.numRecords = 0
+        self.nodesExpanded = 0
+        self.recordsFile = self.records = None
+        self.indexFile = self.indexMap = self.index = None
+
+    def open(self, mode, zobrist, boardSize):
+        """Abre a tabela. Retorna True se ela já existia (uma busca a
+             continuar) ou False se foi criada vazia. Levanta ValueError se o
+             arquivo existente é de outro nível ou de outro modo de busca."""
+
+        self.header = (TABLE_MAGIC, TABLE_VERSION, MODECODES[mode], zobrist, boardSize)
+        resumed = os.path.exists(self.recordsFilename)
+        if resumed:
+            self.recordsFile = open(self.recordsFilename, 'r+b')
+            self.records = mmap.mmap(self.recordsFile.fileno(), 0)
+            fields = HEADER.unpack_from(self.records)
+            if fields[:5] != self.header:
+                self.close()
+                raise ValueError('%s não é uma tabela deste nível e modo de busca.' % (self.recordsFilename))
+            self.numRecords, self.nodesExpanded = fields[5:]
+            self.capacity = (len(self.records) - HEADER_SIZE) // self.recordSize
+            if not os.path.exists(self.indexFilename):
+                self._rebuildIndex()
+            self._mapIndex()
+        else:
+            self.capacity = INITIAL_CAPACITY
+            self.recordsFile = open(self.recordsFilename, 'w+b')
+            self.recordsFile.truncate(HEADER_SIZE + self.capacity * self.recordSize)
+            self.records = mmap.mmap(self.recordsFile.fileno(), 0)
+            self._writeHeader()
+            self._rebuildIndex()
+            self._mapIndex()
+        return resumed
+
+    def _writeHeader(self):
+        HEADER.pack_into(self.records, 0, *(self.header + (self.numRecords, self.nodesExpanded)))
+
+    def _mapIndex(self):
+        self.indexFile = open(self.indexFilename, 'r+b')
+        self.indexMap = mmap.mmap(self.indexFile.fileno(), 0)
+        # Cada entrada é o número do registro mais 1 (0 é uma entrada vazia).
+        self.index = memoryview(self.indexMap).cast('I')
+        self.mask = len(self.index) - 1
+
+    def _unmapIndex(self):
+        self.index.release()
+        self.indexMap.close()
+        self.indexFile.close()
+        self.index = self.indexMap = self.indexFile = None
+
+    def _rebuildIndex(self):
+        """Refaz o índice com o dobro de entradas da capacidade, a partir dos
+             hashes dos registros, em um arquivo novo que então substitui o
+             antigo."""
+        numSlots = 2 * self.capacity
+        tempFilename = '%s.%s.tmp' % (self.indexFilename, os.getpid())
+        with open(tempFilename, 'w+b') as tempFile:
+            tempFile.truncate(4 * numSlots)
+            indexMap = mmap.mmap(tempFile.fileno(), 0)
+            index = memoryview(indexMap).cast('I')
+            mask = numSlots - 1
+            records, recordSize = self.records, self.recordSize
+            for record in range(self.numRecords):
+                slot = HASH.unpack_from(records, HEADER_SIZE + record * recordSize)[0] & mask
+                while index[slot]:
+                    slot = (slot + 1) & mask
+                index[slot] = record + 1
+            index.release()
+            indexMap.flush()
+            indexMap.close()
+        os.replace(tempFilename, self.indexFilename)
+
+    def _grow(self):
+        """Dobra a capacidade do arquivo de registros e refaz o índice."""
+        self._unmapIndex()
+        self.records.flush()
+        self.records.close()
+        self.capacity *= 2
+        self.recordsFile.truncate(HEADER_SIZE + self.capacity * self.recordSize)
+        self.records = mmap.mmap(self.recordsFile.fileno(), 0)
+        self._rebuildIndex()
+        self._mapIndex()
+
+    def find(self, hashValue, key):
+        """Retorna o número do registro da posição key (com o hash hashValue),
+             ou -1 se ela não está na tabela."""
+        index, mask, records = self.index, self.mask, self.records
+        keyStart, keyEnd = HASH.size, self.valuesOffset
+        slot = hashValue & mask
+        while True:
+            entry = index[slot]
+            if not entry:
+                return -1
+            offset = HEADER_SIZE + (entry - 1) * self.recordSize
+            if HASH.unpack_from(records, offset)[0] == hashValue and \
+                    records[offset + keyStart:offset + keyEnd] == key:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def add(self, hashValue, key, cost, h, parent, behind, direction, flags):
+        """Cria o registro de uma posição que não está na tabela. Retorna o
+             número dele."""
+        if self.numRecords == self.capacity:
+            self._grow()
+        record = self.numRecords
+        offset = HEADER_SIZE + record * self.recordSize
+        HASH.pack_into(self.records, offset, hashValue)
+        self.records[offset + HASH.size:offset + self.valuesOffset] = key
+        VALUES.pack_into(self.records, offset + self.valuesOffset, cost, h, parent, behind, direction, flags)
+        # O número de registros é gravado antes do índice: se o processo cair
+        # entre os dois, o registro só fica sem entrada no índice.
+        self.numRecords += 1
+        self._writeHeader()
+        index, mask = self.index, self.mask
+        slot = hashValue & mask
+        while index[slot]:
+            slot = (slot + 1) & mask
+        index[slot] = record + 1
+        return record
+
+    def get(self, record):
+        """Retorna (custo, h, registro anterior, jogador antes do empurrão,
+             direção, marcas) do registro."""
+        return VALUES.unpack_from(self.records, HEADER_SIZE + record * self.recordSize + self.valuesOffset)
+
+    def set(self, record, cost, h, parent, behind, direction, flags):
+        VALUES.pack_into(self.records, HEADER_SIZE + record * self.recordSize + self.valuesOffset,
+                         cost, h, parent, behind, direction, flags)
+
+    def setFlags(self, record, flags):
+        # As marcas são o último byte do registro.
+        self.records[HEADER_SIZE + (record + 1) * self.recordSize - 1] = flags
+
+    def position(self, record):
+        """Retorna (hash, bits das estrelas, jogador) do registro."""
+        offset = HEADER_SIZE + record * self.recordSize
+        hashValue = HASH.unpack_from(self.records, offset)[0]
+        key = self.records[offset + HASH.size:offset + self.valuesOffset]
+        return hashValue, int.from_bytes(key[:-PLAYER.size], 'little'), PLAYER.unpack_from(key, len(key) - PLAYER.size)[0]
+
+    def frontier(self):
+        """Retorna as entradas da lista aberta dos registros gerados e ainda
+             não expandidos, para continuar uma busca."""
+        entries = []
+        for record in range(self.numRecords):
+            cost, h, parent, behind, direction, flags = self.get(record)
+            if flags & HAS_COST and not flags & EXPANDED:
+                entries.append(openEntry(cost, h, record))
+        return entries
+
+    def checkpoint(self, nodesExpanded):
+        """Grava no disco tudo o que mudou na tabela."""
+        self.nodesExpanded = nodesExpanded
+        self._writeHeader()
+        self.records.flush()
+        self.indexMap.flush()
+
+    def close(self):
+        if self.index is not None:
+            self._unmapIndex()
+        if self.records is not None:
+            self.records.close()
+            self.recordsFile.close()
+            self.records = self.recordsFile = None
+
+    def remove(self):
+        """Fecha a tabela e apaga os arquivos dela."""
+        self.close()
+        for filename in (self.recordsFilename, self.indexFilename):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
+def solveOnDisk(levelObj, filename, mode=PUSHES, maxNodes=None, timeLimit=None, startState=None, progress=None):
+    """Procura uma solução para o nível com A*, como starsolver.solve(), com
+         os estados na DiskStateTable de filename. Se a tabela já existe, a
+         busca continua de onde ela parou.
+
+         maxNodes conta os nós de todas as vezes que a busca rodou; timeLimit
+         vale só para esta vez. O resultado é o mesmo de solve(), e
+         'nodesExpanded' também conta as vezes anteriores. Os arquivos da
+         tabela ficam no disco no fim (veja DiskStateTable.remove())."""
+
+    assert mode in (PUSHES, MOVES), 'Modo de busca desconhecido: %s' % (mode)
+    startTime = time.time()
+
+    board = levelObj['board']
+    if startState is None:
+        startState = levelObj['startState']
+    walls = board['walls']
+    directions = board['directions']
+    offsets = [offset for (direction, offset) in directions]
+    zobristStars = board['zobristStars']
+    zobristPlayer = board['zobristPlayer']
+    goalMask = board['goalMask']
+    deadlocks = levelObj['deadlocks']
+    heuristic = makeHeuristic(board, pushDistances(board), HEURISTIC_CACHE_SIZE)
+    starBytes = (board['size'] + 7) // 8
+
+    def packPosition(starBits, player):
+        return starBits.to_bytes(starBytes, 'little') + PLAYER.pack(player)
+
+    result = {
+        'status': 'unsolvable',
+        'solution': None,
+        'moves': None,
+        'pushes': None,
+        'nodesExpanded': 0,
+        'seconds': 0.0
+    }
+
+    table = DiskStateTable(filename, starBytes + PLAYER.size)
+    if table.open(mode, startState.zobrist(), board['size']):
+        openList = table.frontier()
+        heapq.heapify(openList)
+    else:
+        startStars = tuple(startState.starCells())
+        startH = heuristic(startStars, startState.stars)
+        if startH >= INFINITY:
+            table.close()
+            result['seconds'] = time.time() - startTime
+            return result
+        startRecord = table.add(startState.zobrist(), packPosition(startState.stars, startState.player),
+                                0, startH, NO_PARENT, 0, 0, HAS_COST)
+        openList = [openEntry(0, startH, startRecord)]
+
+    nodesExpanded = table.nodesExpanded
+    goalRecord = None
+    try:
+        while openList:
+            entry = heapq.heappop(openList)
+            record = entry & RECORD_MASK
+            h = (entry >> RECORD_BITS) & H_MASK
+            cost = (entry >> (RECORD_BITS + H_BITS)) - h
+            recordCost, recordH, parent, recordBehind, recordDirection, flags = table.get(record)
+            if cost > recordCost or flags & EXPANDED:
+                continue  # Uma entrada antiga, já existe um caminho melhor.
+
+            key, starBits, player = table.position(record)
+            if goalMask & ~starBits == 0:
+                goalRecord = record
+                break
+
+            stars = tuple(bitsToCells(starBits))
+            starsKey = key ^ zobristPlayer[player]
+            if mode == PUSHES:
+                marks, normalized = playerReach(walls, offsets, stars, player)
+                closedHash = starsKey ^ zobristPlayer[normalized]
+                closedPosition = packPosition(starBits, normalized)
+                closedRecord = table.find(closedHash, closedPosition)
+            else:
+                dist = walkDistances(walls, directions, starBits, player)
+                closedRecord = record
+            if closedRecord >= 0 and table.get(closedRecord)[5] & CLOSED:
+                table.setFlags(record, flags | EXPANDED)
+                continue
+
+            # Os limites são conferidos antes de contar o nó: um nó que não foi
+            # expandido não pode entrar na contagem gravada na tabela.
+            if maxNodes is not None and nodesExpanded >= maxNodes:
+                result['status'] = 'limit'
+                break
+            nodesExpanded += 1
+            if timeLimit is not None and time.time() - startTime > timeLimit:
+                result['status'] = 'limit'
+                break
+            if progress is not None and nodesExpanded % PROGRESS_INTERVAL == 0:
+                progress(nodesExpanded, time.time() - startTime)
+            if nodesExpanded % CHECKPOINT_INTERVAL == 0:
+                table.checkpoint(nodesExpanded)
+
+            for i in range(len(stars)):
+                star = stars[i]
+                for direction, offset in directions:
+                    behind = star - offset
+                    target = star + offset
+                    if walls[target] or (starBits >> target) & 1:
+                        continue
+                    if mode == PUSHES:
+                        if marks[behind] != 2:
+                            continue
+                        newCost = cost + 1
+                    else:
+                        if behind not in dist:
+                            continue
+                        newCost = cost + dist[behind][0] + 1
+                    if isDeadlockedPush(deadlocks, starBits, star, target):
+                        continue
+
+                    newStarsKey = starsKey ^ zobristStars[star] ^ zobristStars[target]
+                    newKey = newStarsKey ^ zobristPlayer[star]
+                    newStarBits = starBits ^ (1 << star) ^ (1 << target)
+                    newPosition = packPosition(newStarBits, star)
+                    child = table.find(newKey, newPosition)
+                    if child >= 0:
+                        childCost, childH, childParent, childBehind, childDirection, childFlags = table.get(child)
+                        if childCost <= newCost:
+                            continue
+                        if childFlags & HAS_COST:
+                            newH = childH
+                        else:
+                            newH = heuristic(tuple(sorted(stars[:i] + (target,) + stars[i + 1:])), newStarBits,
+                                              (stars, star, target))
+                            if newH >= INFINITY:
+                                continue
+                        table.set(child, newCost, newH, record, behind, DIRECTIONCODES[direction],
+                                  (childFlags | HAS_COST) & ~EXPANDED)
+                    else:
+                        newH = heuristic(tuple(sorted(stars[:i] + (target,) + stars[i + 1:])), newStarBits,
+                                         (stars, star, target))
+                        if newH >= INFINITY:
+                            continue
+                        child = table.add(newKey, newPosition, newCost, newH, record, behind,
+                                          DIRECTIONCODES[direction], HAS_COST)
+                    heapq.heappush(openList, openEntry(newCost, newH, child))
+
+            # Só agora, com todos os filhos na tabela, o nó deixa a fronteira.
+            if closedRecord < 0:
+                table.add(closedHash, closedPosition, NO_COST, 0, NO_PARENT, 0, 0, CLOSED)
+            elif closedRecord != record:
+                table.setFlags(closedRecord, table.get(closedRecord)[5] | CLOSED)
+            table.setFlags(record, table.get(record)[5] | EXPANDED | (CLOSED if closedRecord == record else 0))
+
+        result['nodesExpanded'] = nodesExpanded
+        if goalRecord is not None:
+            pushes = []  # lista de (célula do jogador antes do empurrão, direção)
+            record = goalRecord
+            while True:
+                cost, h, parent, behind, direction, flags = table.get(record)
+                if parent == NO_PARENT:
+                    break
+                pushes.append((behind, DIRECTIONS[direction]))
+                record = parent
+            pushes.reverse()
+            result['solution'] = pushesToLURD(board, startState, pushes)
+            result['status'] = 'solved'
+            result['moves'] = len(result['solution'])
+            result['pushes'] = sum(1 for letter in result['solution'] if letter.isupper())
+    finally:
+        table.checkpoint(nodesExpanded)
+        table.close()
+    result['seconds'] = time.time() - startTime
+    return result
@@ -0,0 +1,162 @@
+"""Estado compacto do jogo Star Pusher.
+
+As células do mapa são numeradas com índices inteiros em uma grade que tem
+uma borda extra de paredes (a "placa" do nível). O GameState guarda a posição
+do jogador como um índice e as estrelas como um conjunto de bits em um único
+inteiro, então verificar se há uma estrela em uma célula é O(1), copiar um
+estado custa só algumas referências e o hash Zobrist é atualizado a cada
+movimento em vez de ser recalculado. Este módulo não importa o pygame."""
+
+import random
+import struct
+
+UP = 'up'
+DOWN = 'down'
+LEFT = 'left'
+RIGHT = 'right'
+
+# Semente fixa para as tabelas Zobrist: a mesma célula tem sempre o mesmo
+# número aleatório, então os hashes são iguais entre execuções e processos.
+ZOBRIST_SEED = 0x5354415250555348
+
+
+def makeBoard(mapObj, goals):
+    """Cria a placa de um nível a partir do seu objeto de mapa e da lista de
+         tuplas (x, y) dos objetivos.
+
+         A placa é um dicionário compartilhado por todos os estados do nível,
+         com as paredes, os objetivos e as tabelas Zobrist."""
+
+    numCols = len(mapObj)
+    numRows = len(mapObj[0])
+    stride = numRows + 2
+    size = (numCols + 2) * stride
+
+    if not isinstance(mapObj, list):
+        # Um mapgrid.MapGrid já calcula as paredes com a borda.
+        walls = bytearray(mapObj.boardWalls())
+    else:
+        walls = bytearray(b'\x01') * size
+        for x in range(numCols):
+            start = (x + 1) * stride + 1
+            walls[start:start + numRows] = bytes(character in ('#', 'x') for character in mapObj[x])
+
+    goalCells = tuple(sorted((x + 1) * stride + y + 1 for (x, y) in goals))
+    goalMask = cellsToBits(goalCells, size)
+
+    # Os números de 64 bits são tirados de um único bloco de bytes aleatórios,
+    # o que é várias vezes mais rápido que um getrandbits() por célula.
+    rng = random.Random(ZOBRIST_SEED)
+    zobristStars = list(struct.unpack('<%dQ' % (size), rng.randbytes(8 * size)))
+    zobristPlayer = list(struct.unpack('<%dQ' % (size), rng.randbytes(8 * size)))
+
+    return {
+        'numCols': numCols,
+        'numRows': numRows,
+        'stride': stride,
+        'size': size,
+        'walls': walls,
+        'directions': ((UP, -1), (DOWN, 1), (LEFT, -stride), (RIGHT, stride)),
+        'offsets': {UP: -1, DOWN: 1, LEFT: -stride, RIGHT: stride},
+        'goals': goalCells,
+        'goalMask': goalMask,
+        'zobristStars': zobristStars,
+        'zobristPlayer': zobristPlayer
+    }
+
+
+def xyToCell(board, x, y):
+    """Converte (x, y) do mapa para o índice de célula da placa."""
+    return (x + 1) * board['stride'] + y + 1
+
+
+def cellToXY(board, cell):
+    """Converte um índice de célula da placa de volta para (x, y) do mapa."""
+    return (cell // board['stride'] - 1, cell % board['stride'] - 1)
+
+
+def bitsToCells(bits):
+    """Retorna a lista ordenada dos índices dos bits ligados em bits."""
+    cells = []
+    while bits:
+        lowest = bits & -bits
+        cells.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return cells
+
+
+def cellsToBits(cells, size):
+    """Retorna o inteiro com os bits das células ligados (o inverso de
+         bitsToCells()). size é o número de células da placa. Os bits são
+         montados em um bytearray e convertidos de uma vez, o que é bem mais
+         rápido que fazer bits |= 1 << cell quando há muitas células."""
+    packed = bytearray((size + 7) // 8)
+    for cell in cells:
+        packed[cell >> 3] |= 1 << (cell & 7)
+    return int.from_bytes(packed, 'little')
+
+
+def starsHash(board, cells):
+    """Retorna o hash Zobrist de um conjunto de células com estrelas."""
+    zobristStars = board['zobristStars']
+    value = 0
+    for cell in cells:
+        value ^= zobristStars[cell]
+    return value
+
+
+class GameState:
+    """A posição do jogador, as estrelas e o contador de passos de um nível.
+
+         Dois estados são iguais quando o jogador e as estrelas estão nos mesmos
+         lugares; o hash é o Zobrist da posição. Um estado usado como chave de
+         dicionário não deve ser alterado depois."""
+
+    __slots__ = ('board', 'player', 'stars', 'starsHash', 'stepCounter')
+
+    def __init__(self, board, player, starCells, stepCounter=0):
+        self.board = board
+        self.player = player
+        self.stars = cellsToBits(starCells, board['size'])
+        self.starsHash = starsHash(board, starCells)
+        self.stepCounter = stepCounter
+
+    def copy(self):
+        """Retorna uma cópia do estado. As estrelas são um inteiro imutável,
+             então a cópia só é separada de verdade quando um dos dois mudar."""
+        other = object.__new__(GameState)
+        other.board = self.board
+        other.player = self.player
+        other.stars = self.stars
+        other.starsHash = self.starsHash
+        other.stepCounter = self.stepCounter
+        return other
+
+    def hasStar(self, cell):
+        return (self.stars >> cell) & 1 == 1
+
+    def starCells(self):
+        """Retorna a lista ordenada das células que têm estrelas."""
+        return bitsToCells(self.stars)
+
+    def moveStar(self, fromCell, toCell):
+        """Move a estrela de fromCell para toCell, atualizando o hash."""
+        self.stars ^= (1 << fromCell) | (1 << toCell)
+        zobristStars = self.board['zobristStars']
+        self.starsHash ^= zobristStars[fromCell] ^ zobristStars[toCell]
+
+    def isSolved(self):
+        """Retorna True se todos os objetivos tiverem estrelas."""
+        return self.board['goalMask'] & ~self.stars == 0
+
+    def zobrist(self):
+        """Retorna o hash Zobrist de 64 bits do jogador mais as estrelas."""
+        return self.starsHash ^ self.board['zobristPlayer'][self.player]
+
+    def __hash__(self):
+        return self.zobrist()
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return self.player == other.player and self.stars == other.stars
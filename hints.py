@@ -0,0 +1,136 @@
+"""Dicas calculadas em segundo plano durante o jogo.
+
+A busca de uma dica usa o resolvedor a partir do estado atual do jogo, em
+outro processo, então ela não trava a janela nem divide a CPU com o loop do
+jogo (uma thread ficaria presa ao GIL do Python). O processo manda o seu
+progresso por uma fila, e o jogo só lê a fila sem esperar, uma vez por
+quadro. Este módulo não importa o pygame."""
+
+import multiprocessing
+import queue
+
+import starsolver
+
+# Quanto tempo, em segundos, uma busca de dica pode levar.
+HINT_TIME_LIMIT = 30
+
+# Os estados de HintEngine.status.
+IDLE = 'idle'  # Nenhuma dica pedida (ou a dica foi cancelada).
+SEARCHING = 'searching'
+FOUND = 'found'  # hint tem os passos até o próximo empurrão.
+SOLVED = 'solved'  # O nível já está resolvido.
+UNSOLVABLE = 'unsolvable'  # Não há solução a partir do estado atual.
+LIMIT = 'limit'  # A busca passou do limite de tempo.
+FAILED = 'failed'  # O processo da busca terminou sem resposta.
+
+
+def firstPush(solution):
+    """Retorna o começo da solução em LURD até o primeiro empurrão (uma letra
+         maiúscula), inclusive. Retorna a solução inteira se não há empurrões."""
+    for i in range(len(solution)):
+        if solution[i].isupper():
+            return solution[:i + 1]
+    return solution
+
+
+def _hintWorker(levelObj, gameStateObj, timeLimit, resultQueue):
+    """Executa a busca dentro do processo da dica."""
+
+    def progress(nodesExpanded, seconds):
+        resultQueue.put(('progress', nodesExpanded, seconds))
+
+    result = starsolver.solve(levelObj, timeLimit=timeLimit, startState=gameStateObj, progress=progress)
+    resultQueue.put(('result', result))
+
+
+class HintEngine:
+    """Procura a próxima jogada a partir de um estado do jogo sem bloquear.
+
+         start() inicia uma busca em outro processo e poll() (chamada a cada
+         quadro) lê o progresso sem esperar. status diz em que pé está a busca,
+         nodesExpanded e seconds o progresso, e hint os passos até o próximo
+         empurrão quando status é FOUND. cancel() interrompe a busca."""
+
+    def __init__(self, timeLimit=HINT_TIME_LIMIT):
+        self.timeLimit = timeLimit
+        self.process = None
+        self.resultQueue = None
+        self.status = IDLE
+        self.hint = None
+        self.nodesExpanded = 0
+        self.seconds = 0.0
+
+    def start(self, levelObj, gameStateObj):
+        """Começa a procurar uma dica a partir de gameStateObj, cancelando a
+             busca anterior, se houver."""
+        self.cancel()
+        self.resultQueue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_hintWorker, args=(levelObj, gameStateObj.copy(), self.timeLimit, self.resultQueue))
+        # Um processo "daemon" é encerrado junto com o jogo.
+        self.process.daemon = True
+        self.process.start()
+        self.status = SEARCHING
+
+    def isRunning(self):
+        return self.status == SEARCHING
+
+    def cancel(self):
+        """Interrompe a busca (se ainda estiver rodando) e esquece a dica."""
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.terminate()
+            self._closeProcess()
+        self.status = IDLE
+        self.hint = None
+        self.nodesExpanded = 0
+        self.seconds = 0.0
+
+    def poll(self):
+        """Lê as mensagens que a busca mandou até agora, sem esperar.
+             Retorna True se status ou o progresso mudaram."""
+
+        if self.status != SEARCHING:
+            return False
+        # Verifique antes de ler a fila: se o processo já tinha terminado, tudo
+        # o que ele mandou já está na fila.
+        finished = not self.process.is_alive()
+        changed = False
+        while True:
+            try:
+                message = self.resultQueue.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if message[0] == 'progress':
+                self.nodesExpanded, self.seconds = message[1], message[2]
+            else:
+                self._finish(message[1])
+                return True
+
+        if finished:
+            self._closeProcess()
+            self.status = FAILED  # Por exemplo, o processo ficou sem memória.
+            return True
+        return changed
+
+    def _closeProcess(self):
+        self.process.join()
+        self.resultQueue.close()
+        self.process = None
+        self.resultQueue = None
+
+    def _finish(self, result):
+        self._closeProcess()
+        self.nodesExpanded = result['nodesExpanded']
+        self.seconds = result['seconds']
+        if result['status'] == 'solved':
+            if result['solution']:
+                self.status = FOUND
+                self.hint = firstPush(result['solution'])
+            else:
+                self.status = SOLVED
+        elif result['status'] == 'unsolvable':
+            self.status = UNSOLVABLE
+        else:
+            self.status = LIMIT
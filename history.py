@@ -0,0 +1,96 @@
+"""Histórico de movimentos para desfazer e refazer jogadas.
+
+Cada movimento é guardado como um único byte: a direção (2 bits) e se uma
+estrela foi empurrada (1 bit). Isso basta para desfazer o movimento no
+GameState sem guardar cópias do estado: o jogador volta uma casa e, se houve
+empurrão, a estrela que está na frente dele volta junto. Este módulo não
+importa o pygame."""
+
+from gamestate import DOWN, LEFT, RIGHT, UP
+
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+DIRECTIONCODES = {UP: 0, DOWN: 1, LEFT: 2, RIGHT: 3}
+
+
+def encodeMove(direction, pushed):
+    """Retorna o código de um byte de um movimento."""
+    return (DIRECTIONCODES[direction] << 1) | (1 if pushed else 0)
+
+
+def decodeMove(code):
+    """Retorna (direção, empurrou) de um código criado por encodeMove()."""
+    return DIRECTIONS[code >> 1], code & 1 == 1
+
+
+class MoveHistory:
+    """Os movimentos feitos em um nível e a posição atual dentro deles.
+
+         Os movimentos depois da posição atual são os que podem ser refeitos;
+         fazer um movimento novo os descarta."""
+
+    __slots__ = ('moves', 'position')
+
+    def __init__(self):
+        self.moves = bytearray()
+        self.position = 0
+
+    def canUndo(self):
+        return self.position > 0
+
+    def canRedo(self):
+        return self.position < len(self.moves)
+
+    def record(self, direction, pushed):
+        """Anota um movimento que acabou de ser feito com makeMove()."""
+        del self.moves[self.position:]
+        self.moves.append(encodeMove(direction, pushed))
+        self.position += 1
+
+    def undo(self, gameStateObj):
+        """Desfaz o último movimento em gameStateObj. Retorna a lista das
+             células que mudaram, ou None se não há nada para desfazer."""
+
+        if self.position == 0:
+            return None
+        self.position -= 1
+        direction, pushed = decodeMove(self.moves[self.position])
+        offset = gameStateObj.board['offsets'][direction]
+
+        player = gameStateObj.player
+        gameStateObj.player = player - offset
+        gameStateObj.stepCounter -= 1
+        if pushed:
+            # A estrela empurrada está logo na frente do jogador.
+            gameStateObj.moveStar(player + offset, player)
+            return [player - offset, player, player + offset]
+        return [player - offset, player]
+
+    def redo(self, gameStateObj):
+        """Refaz o próximo movimento desfeito em gameStateObj. Retorna a lista
+             das células que mudaram, ou None se não há nada para refazer."""
+
+        if self.position == len(self.moves):
+            return None
+        direction, pushed = decodeMove(self.moves[self.position])
+        self.position += 1
+        offset = gameStateObj.board['offsets'][direction]
+
+        player = gameStateObj.player
+        gameStateObj.player = player + offset
+        gameStateObj.stepCounter += 1
+        if pushed:
+            gameStateObj.moveStar(player + offset, player + 2 * offset)
+            return [player, player + offset, player + 2 * offset]
+        return [player, player + offset]
+
+    def seek(self, gameStateObj, position):
+        """Desfaz ou refaz movimentos até que position movimentos estejam
+             feitos. Retorna o conjunto das células que mudaram."""
+
+        position = max(0, min(position, len(self.moves)))
+        changedCells = set()
+        while self.position > position:
+            changedCells.update(self.undo(gameStateObj))
+        while self.position < position:
+            changedCells.update(self.redo(gameStateObj))
+        return changedCells
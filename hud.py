@@ -0,0 +1,91 @@
+"""A camada de textos e imagens desenhada por cima do mapa (o HUD).
+
+Cada item do HUD (o número do nível, o contador de passos, a imagem
+"solved!") só é renderizado de novo quando o seu valor muda, e os textos já
+renderizados ficam guardados para serem reaproveitados (por exemplo, ao
+desfazer movimentos o contador volta a valores que já foram mostrados). A
+camada anota as áreas da janela que mudaram, então o jogo só precisa compor
+essas áreas sobre o mapa, sem limpar a janela inteira."""
+
+from collections import OrderedDict
+
+from profiler import SURFACES_CREATED, getProfiler
+
+# Quantos textos renderizados o TextCache guarda.
+MAX_CACHED_TEXTS = 256
+
+
+class TextCache:
+    """Os Surfaces de textos renderizados com uma fonte e uma cor, guardados
+         pelo texto. Os menos usados são descartados depois de maxTexts."""
+
+    def __init__(self, font, color, maxTexts=MAX_CACHED_TEXTS):
+        self.font = font
+        self.color = color
+        self.maxTexts = maxTexts
+        self.texts = OrderedDict()
+
+    def render(self, text):
+        """Retorna o Surface do texto, renderizando-o só na primeira vez."""
+        if text in self.texts:
+            self.texts.move_to_end(text)
+            return self.texts[text]
+        textSurf = self.font.render(text, 1, self.color)
+        getProfiler().count(SURFACES_CREATED)
+        self.texts[text] = textSurf
+        if len(self.texts) > self.maxTexts:
+            self.texts.popitem(last=False)
+        return textSurf
+
+
+class HudLayer:
+    """Os itens do HUD, desenhados na ordem em que foram adicionados.
+
+         Os itens são posicionados com os mesmos argumentos de Rect usados por
+         get_rect() (bottomleft=(20, 700), center=..., etc.). Mudar, adicionar
+         ou remover um item anota a área antiga e a nova; takeDirtyRects()
+         retorna essas áreas, nas coordenadas da janela."""
+
+    def __init__(self, textCache):
+        self.textCache = textCache
+        self.items = OrderedDict()  # nome -> (valor, Surface, Rect)
+        self.dirtyRects = []
+
+    def setText(self, name, text, **position):
+        """Mostra o texto no item name. Não faz nada se ele já mostra o texto."""
+        item = self.items.get(name)
+        if item is not None and item[0] == text:
+            return
+        textSurf = self.textCache.render(text)
+        self._setItem(name, text, textSurf, textSurf.get_rect(**position))
+
+    def setImage(self, name, image, **position):
+        """Mostra o Surface image no item name."""
+        item = self.items.get(name)
+        rect = image.get_rect(**position)
+        if item is not None and item[1] is image and item[2] == rect:
+            return
+        self._setItem(name, image, image, rect)
+
+    def remove(self, name):
+        """Remove o item name do HUD, se ele existir."""
+        if name in self.items:
+            self.dirtyRects.append(self.items.pop(name)[2])
+
+    def _setItem(self, name, value, surface, rect):
+        if name in self.items:
+            self.dirtyRects.append(self.items[name][2])
+        self.items[name] = (value, surface, rect)
+        self.dirtyRects.append(rect)
+
+    def takeDirtyRects(self):
+        """Retorna e esquece as áreas que mudaram desde a última chamada."""
+        dirtyRects = self.dirtyRects
+        self.dirtyRects = []
+        return dirtyRects
+
+    def draw(self, surface, area):
+        """Desenha em surface os itens que aparecem na área area."""
+        for value, itemSurf, itemRect in self.items.values():
+            if itemRect.colliderect(area):
+                surface.blit(itemSurf, itemRect)
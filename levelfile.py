@@ -0,0 +1,249 @@
+"""Leitura dos arquivos de níveis do Star Pusher.
+
+Na primeira leitura de um arquivo é montado um índice com a posição (em
+bytes) de cada nível. O índice é salvo ao lado do arquivo de níveis e só é
+refeito quando o tamanho ou a data de modificação do arquivo mudam. Com o
+índice, openLevelsFile() devolve uma coleção que só lê e converte um nível
+quando ele é pedido, então abrir um arquivo com milhares de níveis é rápido
+e usa pouca memória.
+
+Só o índice fica salvo em disco, e não os níveis já convertidos: varrer o
+arquivo inteiro é a parte cara (e proporcional ao tamanho da coleção), mas
+converter um nível leva menos de 1 ms e só acontece quando ele é jogado. Um
+nível convertido serializado (com as tabelas Zobrist e de becos sem saída)
+ocupa dezenas de vezes mais que o texto dele, e carregá-lo do disco
+economizaria só uma fração de milissegundo por nível.
+
+Os arquivos são lidos como LEVEL_ENCODING (latin-1) tanto no índice quanto
+na conversão: cada byte é um caractere, então qualquer arquivo é lido sem
+erro e as posições em bytes do índice batem com o texto. Este módulo não
+importa o pygame."""
+
+import json
+import os
+from collections import OrderedDict
+
+from deadlock import makeDeadlockIndex
+from gamestate import GameState, makeBoard, xyToCell
+
+# Extensão e versão do arquivo de índice salvo ao lado do arquivo de níveis.
+INDEX_EXTENSION = '.idx'
+INDEX_VERSION = 1
+
+# A codificação dos arquivos de níveis. Os caracteres dos mapas são ASCII; com
+# latin-1, os outros bytes (em comentários, por exemplo) nunca são um erro.
+LEVEL_ENCODING = 'latin-1'
+
+# Quantos níveis já convertidos a coleção mantém na memória.
+MAX_PARSED_LEVELS = 32
+
+# Os caracteres do mapa que marcam o jogador, as estrelas e os objetivos.
+LEVEL_OBJECT_CHARACTERS = frozenset('@+.$*')
+
+
+def stripLevelLine(line):
+    """Remove o fim de linha e os comentários (tudo depois de ;) de uma linha."""
+    line = line.rstrip('\r\n')
+    if ';' in line:
+        # Ignore as linhas com ;, são comentários no arquivo de levels.
+        line = line[:line.find(';')]
+    return line
+
+
+def buildLevelIndex(filename):
+    """Percorre o arquivo uma vez e retorna uma lista com (início, fim,
+         linha) de cada nível: as posições em bytes do primeiro e do último
+         byte do mapa no arquivo e o número da linha em branco que o termina."""
+
+    index = []
+    offset = 0
+    levelStart = None
+    lineNum = -1
+    with open(filename, 'rb') as mapFile:
+        for lineNum, line in enumerate(mapFile):
+            text = stripLevelLine(line.decode(LEVEL_ENCODING))
+            if text != '':
+                if levelStart is None:
+                    levelStart = offset
+            elif levelStart is not None:
+                # Uma linha em branco indica o final do mapa de um nível no arquivo.
+                index.append((levelStart, offset, lineNum))
+                levelStart = None
+            offset += len(line)
+
+    if levelStart is not None:
+        # O último nível não precisa terminar com uma linha em branco.
+        index.append((levelStart, offset, lineNum + 1))
+    return index
+
+
+def loadLevelIndex(filename):
+    """Retorna o índice dos níveis do arquivo, usando o índice salvo em disco
+         quando ele ainda corresponde ao arquivo e salvando um novo caso
+         contrário. Se não for possível gravar o índice, ele só não é salvo."""
+
+    fileStat = os.stat(filename)
+    indexFilename = filename + INDEX_EXTENSION
+    try:
+        with open(indexFilename, 'r') as indexFile:
+            cached = json.load(indexFile)
+        if cached['version'] == INDEX_VERSION and cached['size'] == fileStat.st_size and \
+                cached['mtime'] == fileStat.st_mtime_ns:
+            return [tuple(entry) for entry in cached['levels']]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # Sem índice salvo (ou ele está corrompido): monte um novo.
+
+    index = buildLevelIndex(filename)
+    cached = {
+        'version': INDEX_VERSION,
+        'size': fileStat.st_size,
+        'mtime': fileStat.st_mtime_ns,
+        'levels': index
+    }
+    try:
+        # Grave em um arquivo temporário e troque de uma vez, para que outro
+        # processo nunca leia um índice pela metade.
+        tempFilename = '%s.%s.tmp' % (indexFilename, os.getpid())
+        with open(tempFilename, 'w') as indexFile:
+            json.dump(cached, indexFile)
+        os.replace(tempFilename, indexFilename)
+    except OSError:
+        pass
+    return index
+
+
+def parseLevel(mapTextLines, levelNum, lineNum, filename):
+    """Converte as linhas do mapa de um nível (já sem comentários) em um
+         objeto de nível. levelNum começa em 0 e lineNum é a linha do arquivo
+         onde o nível termina; ambos só são usados nas mensagens de erro."""
+
+    # Encontre a linha mais longa no mapa.
+    maxWidth = -1
+    for i in range(len(mapTextLines)):
+        if len(mapTextLines[i]) > maxWidth:
+            maxWidth = len(mapTextLines[i])
+    # Adicione espaços ao final das linhas mais curtas. este
+    # garante que o mapa seja retangular.
+    for i in range(len(mapTextLines)):
+        mapTextLines[i] += ' ' * (maxWidth - len(mapTextLines[i]))
+
+    # Converter mapTextLines em um objeto de mapa.
+    # zip() transpõe as linhas em colunas, então mapObj[x][y] é o espaço (x, y).
+    mapObj = [list(column) for column in zip(*mapTextLines)]
+
+    startx = None  # X e y para a posição inicial do jogador
+    starty = None
+    goals = []  # lista de (x, y) tuplas para cada objetivo.
+    stars = []  # lista de (x, y) para a posição inicial de cada estrela.
+
+    # Percorra os espaços no mapa e encontre @,. E $
+    # caracteres para o estado inicial do jogo.
+    for x in range(maxWidth):
+        if not LEVEL_OBJECT_CHARACTERS.intersection(mapObj[x]):
+            continue  # Uma coluna só de paredes e piso não tem nada para procurar.
+        for y in range(len(mapObj[x])):
+            if mapObj[x][y] in ('@', '+'):
+                # '@' é jogador, '+' é jogador e objetivo
+                startx = x
+                starty = y
+
+            if mapObj[x][y] in ('.', '+', '*'):
+                # '.' é objetivo, '*' é estrela e objetivo
+                goals.append((x, y))
+
+            if mapObj[x][y] in ('$', '*'):
+                # '$' é uma estrela
+                stars.append((x, y))
+
+    # Verificações básicas de sanidade do projeto:
+    assert startx != None and starty != None, 'O nível %s (em torno da linha %s) em %s está faltando um "@" ou "+" para marcar o ponto inicial.' % (
+    levelNum + 1, lineNum, filename)
+    assert len(goals) > 0, 'O nível %s (em torno da linha %s) em %s deve ter pelo menos uma meta.' % (
+    levelNum + 1, lineNum, filename)
+    assert len(stars) >= len(
+        goals), 'O nível %s (em torno da linha %s) em %s é impossível de resolver. Possui %s objetivos, mas apenas %s estrelas.' % (
+    levelNum + 1, lineNum, filename, len(goals), len(stars))
+
+    # Criar um objeto nivelado e iniciar o estado do jogo.
+    board = makeBoard(mapObj, goals)
+    gameStateObj = GameState(board, xyToCell(board, startx, starty),
+                             [xyToCell(board, x, y) for (x, y) in stars])
+
+    return {
+        'width': maxWidth,
+        'height': len(mapObj),
+        'mapObj': mapObj,
+        'goals': goals,
+        'board': board,
+        'deadlocks': makeDeadlockIndex(board, len(stars)),
+        'startState': gameStateObj
+    }
+
+
+def readLevelText(mapFile, indexEntry):
+    """Lê do arquivo (aberto em modo binário) as linhas do mapa de um nível."""
+    start, end, lineNum = indexEntry
+    mapFile.seek(start)
+    mapTextLines = []
+    for line in mapFile.read(end - start).decode(LEVEL_ENCODING).split('\n'):
+        line = stripLevelLine(line)
+        if line != '':
+            mapTextLines.append(line)
+    return mapTextLines
+
+
+class LevelCollection:
+    """Os níveis de um arquivo, convertidos só quando são pedidos.
+
+         Funciona como uma lista somente leitura de objetos de nível: len()
+         retorna o número de níveis e levels[i] o nível i. Os últimos
+         MAX_PARSED_LEVELS níveis convertidos ficam guardados na memória."""
+
+    def __init__(self, filename, index):
+        self.filename = filename
+        self.index = index
+        self.parsed = OrderedDict()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, levelNum):
+        if levelNum < 0:
+            levelNum += len(self.index)
+        if not 0 <= levelNum < len(self.index):
+            raise IndexError('nível fora do intervalo: %s' % (levelNum))
+
+        if levelNum in self.parsed:
+            self.parsed.move_to_end(levelNum)
+            return self.parsed[levelNum]
+
+        with open(self.filename, 'rb') as mapFile:
+            mapTextLines = readLevelText(mapFile, self.index[levelNum])
+        levelObj = parseLevel(mapTextLines, levelNum, self.index[levelNum][2], self.filename)
+        self.parsed[levelNum] = levelObj
+        if len(self.parsed) > MAX_PARSED_LEVELS:
+            self.parsed.popitem(last=False)
+        return levelObj
+
+
+def openLevelsFile(filename):
+    """Abre um arquivo de níveis sem converter nenhum nível ainda. Veja
+         readLevelsFile() para o formato do arquivo."""
+    assert os.path.exists(filename), 'Arquivo dos Levels nao foi encontrado: %s' % (filename)
+    return LevelCollection(filename, loadLevelIndex(filename))
+
+
+def readLevelsFile(filename):
+    """Lê e converte todos os níveis do arquivo, retornando uma lista de
+         objetos de nível. Cada nível é um mapa no formato de Sokoban
+         (http://sokobano.de/wiki/index.php?title=Level_format); os níveis
+         são separados por linhas em branco e tudo depois de ; é comentário."""
+
+    assert os.path.exists(filename), 'Arquivo dos Levels nao foi encontrado: %s' % (filename)
+    index = loadLevelIndex(filename)
+    levels = []  # Irá conter uma lista de objetos de nível.
+    with open(filename, 'rb') as mapFile:
+        for levelNum in range(len(index)):
+            mapTextLines = readLevelText(mapFile, index[levelNum])
+            levels.append(parseLevel(mapTextLines, levelNum, index[levelNum][2], filename))
+    return levels
@@ -0,0 +1,283 @@
+"""Gerador de níveis novos do Star Pusher, no formato do Levels.txt.
+
+Cada nível começa como uma sala aleatória (um retângulo de paredes com
+paredes soltas dentro). As estrelas são postas nos objetivos e o jogo é
+jogado ao contrário: o jogador "puxa" estrelas para longe dos objetivos,
+anda só por onde pode andar e nunca atravessa estrelas ou paredes. Desfazer
+essas puxadas em ordem é uma solução, então todo nível gerado tem solução.
+
+Os níveis passam pelas mesmas verificações do readLevelsFile() (jogador,
+pelo menos um objetivo, estrelas >= objetivos), são resolvidos pelo
+starsolver para medir a solução ótima e pontuados pelo número de empurrões,
+de passos ou de nós expandidos (uma medida da dificuldade). Cada nível é
+gerado a partir da sua própria semente, em um pool de processos, então a
+mesma semente gera sempre o mesmo nível. Este módulo não importa o pygame.
+
+Uso: python levelgen.py 1000 --output NovosNiveis.txt [--processes 8]"""
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import starsolver
+from gamestate import cellToXY, makeBoard
+from levelfile import parseLevel, readLevelsFile
+from starcore import labelRegions
+
+DEFAULT_WIDTH = 10  # Tamanho das salas, contando as paredes da borda
+DEFAULT_HEIGHT = 8
+DEFAULT_STARS = 3
+# Porcentagem dos espaços de dentro da sala que viram paredes soltas.
+WALL_PCT = 20
+# Quantas puxadas aleatórias são feitas a partir dos objetivos.
+DEFAULT_PULLS = 300
+# Quantos níveis candidatos são gerados para cada nível; fica o de maior
+# pontuação.
+DEFAULT_ATTEMPTS = 8
+# O máximo de nós que o resolvedor expande para pontuar um candidato. Os que
+# passam disso são descartados, pois a solução ótima não é conhecida.
+SOLVER_MAX_NODES = 200000
+
+# As pontuações possíveis de um nível.
+SCORE_PUSHES = 'pushes'
+SCORE_MOVES = 'moves'
+SCORE_NODES = 'nodes'
+SCORE_KEYS = {SCORE_PUSHES: 'pushes', SCORE_MOVES: 'moves', SCORE_NODES: 'nodesExpanded'}
+
+
+def makeRoom(rng, width, height):
+    """Retorna o objeto de mapa (só com '#' e ' ') de uma sala de width x
+         height com paredes na borda e paredes soltas dentro. Só a maior
+         região de piso fica; as outras viram parede."""
+
+    mapObj = []
+    for x in range(width):
+        column = []
+        for y in range(height):
+            if x in (0, width - 1) or y in (0, height - 1) or rng.randint(0, 99) < WALL_PCT:
+                column.append('#')
+            else:
+                column.append(' ')
+        mapObj.append(column)
+
+    labels, numRegions = labelRegions(mapObj, ' ')
+    if numRegions > 1:
+        sizes = [0] * (numRegions + 1)
+        for column in labels:
+            for label in column:
+                sizes[label] += 1
+        sizes[0] = 0
+        largest = sizes.index(max(sizes))
+        for x in range(width):
+            for y in range(height):
+                if labels[x][y] not in (0, largest):
+                    mapObj[x][y] = '#'
+    return mapObj
+
+
+def _reachableCells(walls, offsets, stars, player):
+    """Retorna a lista das células que o jogador alcança sem passar por
+         estrelas (stars é um bytearray com 1 nas células com estrela)."""
+    seen = bytearray(walls)
+    seen[player] = 1
+    reachable = [player]
+    for cell in reachable:
+        for offset in offsets:
+            nxt = cell + offset
+            if not seen[nxt] and not stars[nxt]:
+                seen[nxt] = 1
+                reachable.append(nxt)
+    return reachable
+
+
+def reversePlay(rng, mapObj, numStars, numPulls):
+    """Põe numStars estrelas em objetivos sorteados no piso de mapObj e faz
+         até numPulls puxadas aleatórias. Retorna (objetivos, estrelas,
+         jogador), as posições (x, y) do nível, ou None se a sala não tem
+         espaço ou se as estrelas terminaram todas nos objetivos."""
+
+    board = makeBoard(mapObj, [])
+    walls = board['walls']
+    offsets = [offset for (direction, offset) in board['directions']]
+    floor = [cell for cell in range(board['size']) if not walls[cell]]
+    if len(floor) < numStars + 2:
+        return None
+
+    goals = rng.sample(floor, numStars)
+    stars = bytearray(board['size'])
+    for cell in goals:
+        stars[cell] = 1
+    player = rng.choice([cell for cell in floor if not stars[cell]])
+
+    for i in range(numPulls):
+        reachable = _reachableCells(walls, offsets, stars, player)
+        # Para puxar a estrela de star na direção offset, o jogador fica ao
+        # lado dela (em star + offset) e anda mais um espaço, levando-a.
+        pulls = []
+        for cell in reachable:
+            for offset in offsets:
+                star = cell - offset
+                behind = cell + offset
+                if stars[star] and not walls[behind] and not stars[behind]:
+                    pulls.append((star, cell, behind))
+        if not pulls:
+            break
+        star, cell, behind = rng.choice(pulls)
+        stars[star] = 0
+        stars[cell] = 1
+        player = behind
+
+    starCells = [cell for cell in floor if stars[cell]]
+    if set(starCells) == set(goals):
+        return None
+    # O jogador pode começar em qualquer espaço que alcança agora.
+    player = rng.choice(_reachableCells(walls, offsets, stars, player))
+    return ([cellToXY(board, cell) for cell in goals], [cellToXY(board, cell) for cell in starCells],
+            cellToXY(board, player))
+
+
+def levelLines(mapObj, goals, stars, player):
+    """Retorna as linhas do mapa no formato do Levels.txt. As paredes que não
+         tocam o piso (nem na diagonal) viram espaços do lado de fora."""
+
+    width, height = len(mapObj), len(mapObj[0])
+    goals, stars = set(goals), set(stars)
+    rows = []
+    for y in range(height):
+        row = []
+        for x in range(width):
+            if mapObj[x][y] == '#':
+                touchesFloor = any(0 <= x + dx < width and 0 <= y + dy < height and mapObj[x + dx][y + dy] != '#'
+                                   for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+                row.append('#' if touchesFloor else ' ')
+            elif (x, y) == player:
+                row.append('+' if (x, y) in goals else '@')
+            elif (x, y) in stars:
+                row.append('*' if (x, y) in goals else '$')
+            elif (x, y) in goals:
+                row.append('.')
+            else:
+                row.append(' ')
+        rows.append(''.join(row).rstrip())
+
+    # Uma linha em branco terminaria o nível, então tire as linhas vazias e
+    # os espaços que sobram à esquerda de todas as linhas.
+    rows = [row for row in rows if row]
+    indent = min(len(row) - len(row.lstrip()) for row in rows)
+    return [row[indent:] for row in rows]
+
+
+def _generateWorker(task):
+    """Gera um nível dentro de um processo do pool: tenta attempts candidatos
+         com a semente do nível e fica com o de maior pontuação."""
+    seed, width, height, numStars, numPulls, attempts, score, maxNodes = task
+    startTime = time.time()
+    rng = random.Random(seed)
+    best = None
+    for attempt in range(attempts):
+        mapObj = makeRoom(rng, width, height)
+        positions = reversePlay(rng, mapObj, numStars, numPulls)
+        if positions is None:
+            continue
+        lines = levelLines(mapObj, *positions)
+        try:
+            # parseLevel() altera as linhas, então ela recebe uma cópia.
+            levelObj = parseLevel(list(lines), 0, 0, '<semente %s>' % (seed))
+        except AssertionError:
+            continue
+        result = starsolver.solve(levelObj, mode=starsolver.PUSHES, maxNodes=maxNodes)
+        if result['status'] != 'solved' or result['pushes'] == 0:
+            continue
+        result['score'] = result[SCORE_KEYS[score]]
+        if best is None or result['score'] > best['score']:
+            result['lines'] = lines
+            best = result
+
+    if best is None:
+        best = {'lines': None, 'score': None}
+    best['seed'] = seed
+    best['seconds'] = time.time() - startTime
+    return best
+
+
+def generateInParallel(count, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, numStars=DEFAULT_STARS,
+                       seed=0, numPulls=DEFAULT_PULLS, attempts=DEFAULT_ATTEMPTS, score=SCORE_PUSHES,
+                       minScore=0, maxNodes=SOLVER_MAX_NODES, processes=None, callback=None):
+    """Gera count níveis em um pool de processos, o nível i com a semente
+         seed + i. processes é o número de processos (o padrão é um por núcleo
+         da CPU).
+
+         callback, se dado, é chamado com o resultado de cada semente assim que
+         ela termina. Retorna a lista dos resultados com pontuação pelo menos
+         minScore, em ordem de semente: os resultados de solve() da solução
+         ótima com as chaves extras 'seed', 'score' e 'lines' (as linhas do
+         mapa)."""
+
+    assert score in SCORE_KEYS, 'Pontuação desconhecida: %s' % (score)
+    tasks = [(seed + i, width, height, numStars, numPulls, attempts, score, maxNodes) for i in range(count)]
+
+    results = []
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(_generateWorker, tasks, chunksize=4):
+            if callback is not None:
+                callback(result)
+            if result['lines'] is not None and result['score'] >= minScore:
+                results.append(result)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    results.sort(key=lambda result: result['seed'])
+    return results
+
+
+def writeLevelsFile(filename, results):
+    """Grava os níveis gerados em filename, no formato do Levels.txt, com a
+         semente e o tamanho da solução de cada um em um comentário."""
+    with open(filename, 'w') as levelsFile:
+        levelsFile.write('; Níveis gerados por levelgen.py\n;\n\n')
+        for levelNum, result in enumerate(results):
+            levelsFile.write('; %s\n' % (levelNum + 1))
+            levelsFile.write('; semente %s: %s empurrões, %s passos\n' % (
+                result['seed'], result['pushes'], result['moves']))
+            for line in result['lines']:
+                levelsFile.write(line + '\n')
+            levelsFile.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gerador de níveis do Star Pusher')
+    parser.add_argument('count', type=int, help='quantos níveis gerar')
+    parser.add_argument('--output', default='NiveisGerados.txt', help='arquivo de níveis gravado')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help='largura das salas, com as paredes')
+    parser.add_argument('--height', type=int, default=DEFAULT_HEIGHT, help='altura das salas, com as paredes')
+    parser.add_argument('--stars', type=int, default=DEFAULT_STARS, help='estrelas (e objetivos) por nível')
+    parser.add_argument('--pulls', type=int, default=DEFAULT_PULLS, help='puxadas aleatórias por candidato')
+    parser.add_argument('--attempts', type=int, default=DEFAULT_ATTEMPTS,
+                        help='candidatos por nível; fica o de maior pontuação')
+    parser.add_argument('--score', choices=sorted(SCORE_KEYS), default=SCORE_PUSHES,
+                        help='como pontuar os níveis: empurrões, passos ou nós expandidos da solução ótima')
+    parser.add_argument('--min-score', type=int, default=0, dest='minScore',
+                        help='descarta os níveis com pontuação menor')
+    parser.add_argument('--max-nodes', type=int, default=SOLVER_MAX_NODES, dest='maxNodes',
+                        help='nós que o resolvedor pode expandir para pontuar cada candidato')
+    parser.add_argument('--seed', type=int, default=0, help='semente do primeiro nível')
+    parser.add_argument('--processes', type=int, default=None, help='número de processos')
+    args = parser.parse_args()
+
+    startTime = time.time()
+    results = generateInParallel(args.count, args.width, args.height, args.stars, args.seed, args.pulls,
+                                 args.attempts, args.score, args.minScore, args.maxNodes, args.processes)
+    writeLevelsFile(args.output, results)
+    # Confira o arquivo gravado com o mesmo leitor do jogo.
+    levels = readLevelsFile(args.output)
+    print('%s de %s níveis gravados em %s (%.2fs)' % (len(levels), args.count, args.output, time.time() - startTime))
+
+
+if __name__ == '__main__':
+    main()
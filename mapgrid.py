@@ -0,0 +1,216 @@
+"""Mapas guardados em uma matriz do NumPy, para mapas grandes.
+
+Um MapGrid guarda o mapa em um ndarray de uint8 com o formato
+(colunas, linhas), um código por espaço (a posição do caractere em
+CHARACTERS), então as máscaras de paredes, pisos, objetivos e estrelas e a
+decoração do mapa são calculadas com operações na matriz inteira, em vez de
+chamar isWall() várias vezes por espaço.
+
+O MapGrid também funciona como um objeto de mapa comum: mapGrid[x][y]
+retorna e altera o caractere do espaço (x, y) e len() funciona no mapa e nas
+colunas, então as funções do starcore continuam funcionando com ele.
+decorateMap() e makeBoard() usam as versões com matrizes quando recebem um
+MapGrid.
+
+O NumPy é opcional: o jogo não importa este módulo, e quem o usa deve tratar
+o ImportError. Este módulo não importa o pygame."""
+
+import random
+from bisect import bisect_left, bisect_right
+
+import numpy
+
+from starcore import OUTSIDE_DECORATION_PCT, OUTSIDE_DECORATIONS
+
+# Os caracteres que podem aparecer em um mapa; o código de cada um é a sua
+# posição nesta string.
+CHARACTERS = ' #.$*@+ox' + ''.join(OUTSIDE_DECORATIONS)
+CODES = {character: code for code, character in enumerate(CHARACTERS)}
+
+WALL_CODES = [CODES['#'], CODES['x']]
+FLOOR_CODES = [CODES[character] for character in ' .$*@+o']
+GOAL_CODES = [CODES[character] for character in '.*+']
+STAR_CODES = [CODES[character] for character in '$*']
+# Os caracteres que decorateMap() troca por piso.
+OBJECT_CODES = [CODES[character] for character in '.$*@+']
+
+
+def reachableMask(passable, startx, starty):
+    """Retorna a matriz de bool dos espaços de passable (uma matriz de bool)
+         ligados ao espaço (startx, starty), como um floodFill() a partir
+         dele. Se (startx, starty) não é passável, a matriz é toda False.
+
+         As faixas verticais contínuas de espaços passáveis são encontradas
+         com operações na matriz inteira, e a busca anda de faixa em faixa
+         (duas faixas de colunas vizinhas estão ligadas se têm linhas em
+         comum), então o loop em Python depende do número de faixas e não do
+         número de espaços."""
+    numCols, numRows = passable.shape
+    # Cada faixa é [começo, fim) na sua coluna. Como nonzero() anda coluna
+    # por coluna, as faixas já ficam ordenadas pela coluna e pela linha.
+    padded = numpy.zeros((numCols, numRows + 2), dtype=numpy.int8)
+    padded[:, 1:-1] = passable
+    edges = numpy.diff(padded, axis=1)
+    runColumns, runStarts = numpy.nonzero(edges == 1)
+    runEnds = numpy.nonzero(edges == -1)[1]
+    reachable = numpy.zeros((numCols, numRows), dtype=bool)
+    if not passable[startx, starty]:
+        return reachable
+
+    # firstRun[x] é o índice da primeira faixa da coluna x.
+    firstRun = numpy.searchsorted(runColumns, numpy.arange(numCols + 1)).tolist()
+    columns, starts, ends = runColumns.tolist(), runStarts.tolist(), runEnds.tolist()
+    startRun = bisect_right(starts, starty, firstRun[startx], firstRun[startx + 1]) - 1
+
+    visited = bytearray(len(starts))
+    visited[startRun] = 1
+    stack = [startRun]
+    while stack:
+        run = stack.pop()
+        x, top, bottom = columns[run], starts[run], ends[run]
+        for neighborx in (x - 1, x + 1):
+            if neighborx < 0 or neighborx >= numCols:
+                continue
+            # As faixas da coluna vizinha que terminam depois de top e
+            # começam antes de bottom tocam esta faixa.
+            lo, hi = firstRun[neighborx], firstRun[neighborx + 1]
+            for neighbor in range(bisect_right(ends, top, lo, hi), bisect_left(starts, bottom, lo, hi)):
+                if not visited[neighbor]:
+                    visited[neighbor] = 1
+                    stack.append(neighbor)
+
+    # Marque as faixas visitadas: +1 no começo e -1 no fim de cada uma, e a
+    # soma acumulada de cada coluna fica positiva dentro das faixas.
+    runs = numpy.flatnonzero(numpy.frombuffer(bytes(visited), dtype=numpy.uint8))
+    marks = numpy.zeros((numCols, numRows + 1), dtype=numpy.int32)
+    marks[runColumns[runs], runStarts[runs]] += 1
+    marks[runColumns[runs], runEnds[runs]] -= 1
+    reachable[:] = numpy.cumsum(marks, axis=1)[:, :-1] > 0
+    return reachable
+
+
+class _GridColumn:
+    """Uma coluna de um MapGrid, vista como uma lista de caracteres."""
+
+    __slots__ = ('codes',)
+
+    def __init__(self, codes):
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, y):
+        if isinstance(y, slice):
+            return [CHARACTERS[code] for code in self.codes[y]]
+        return CHARACTERS[self.codes[y]]
+
+    def __setitem__(self, y, character):
+        if isinstance(y, slice):
+            self.codes[y] = [CODES[each] for each in character]
+        else:
+            self.codes[y] = CODES[character]
+
+    def __iter__(self):
+        return (CHARACTERS[code] for code in self.codes.tolist())
+
+
+class MapGrid:
+    """Um objeto de mapa guardado em codes, um ndarray de uint8 com o formato
+         (colunas, linhas)."""
+
+    def __init__(self, codes):
+        self.codes = codes
+
+    @classmethod
+    def fromMapObj(cls, mapObj):
+        """Cria um MapGrid a partir de um objeto de mapa (uma lista de colunas).
+             Levanta ValueError se o mapa tem um caractere desconhecido ou
+             colunas de tamanhos diferentes."""
+        numRows = len(mapObj[0]) if mapObj else 0
+        if any(len(column) != numRows for column in mapObj):
+            raise ValueError('As colunas do mapa não têm todas o mesmo tamanho.')
+        text = ''.join(''.join(column) for column in mapObj)
+        unknown = set(text) - set(CHARACTERS)
+        if unknown:
+            raise ValueError('Caracteres desconhecidos no mapa: %s' % (''.join(sorted(unknown))))
+        # bytes.translate() converte todos os caracteres em códigos de uma vez.
+        table = bytearray(range(256))
+        for character, code in CODES.items():
+            table[ord(character)] = code
+        codes = numpy.frombuffer(text.encode('latin-1').translate(table), dtype=numpy.uint8)
+        return cls(codes.reshape(len(mapObj), numRows).copy())
+
+    def toMapObj(self):
+        """Retorna o mapa como um objeto de mapa comum (uma lista de colunas)."""
+        characters = numpy.frombuffer(CHARACTERS.encode('latin-1'), dtype=numpy.uint8)
+        text = characters[self.codes].tobytes().decode('latin-1')
+        numRows = self.codes.shape[1]
+        return [list(text[start:start + numRows]) for start in range(0, len(text), numRows)]
+
+    def copy(self):
+        return MapGrid(self.codes.copy())
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, x):
+        return _GridColumn(self.codes[x])
+
+    def __iter__(self):
+        return (_GridColumn(column) for column in self.codes)
+
+    def wallMask(self):
+        """Retorna a matriz de bool dos espaços que são paredes."""
+        return numpy.isin(self.codes, WALL_CODES)
+
+    def floorMask(self):
+        """Retorna a matriz de bool dos espaços de piso (com ou sem objetos)."""
+        return numpy.isin(self.codes, FLOOR_CODES)
+
+    def goalMask(self):
+        return numpy.isin(self.codes, GOAL_CODES)
+
+    def starMask(self):
+        return numpy.isin(self.codes, STAR_CODES)
+
+    def cornerMask(self):
+        """Retorna a matriz de bool das paredes que são cantos: as que têm
+             paredes em dois lados vizinhos (cima e direita, direita e baixo,
+             baixo e esquerda, ou esquerda e cima). Fora do mapa não há
+             paredes, como em isWall()."""
+        walls = numpy.pad(self.wallMask(), 1, constant_values=False)
+        up = walls[1:-1, :-2]
+        down = walls[1:-1, 2:]
+        left = walls[:-2, 1:-1]
+        right = walls[2:, 1:-1]
+        return walls[1:-1, 1:-1] & ((up & right) | (right & down) | (down & left) | (left & up))
+
+    def boardWalls(self):
+        """Retorna as paredes no formato da placa de gamestate.makeBoard(): um
+             byte por célula, com uma borda extra de paredes."""
+        return numpy.pad(self.wallMask(), 1, constant_values=True).astype(numpy.uint8).tobytes()
+
+    def decorated(self, startxy, rng=random):
+        """A versão de decorateMap() para o MapGrid: retorna um novo MapGrid
+             com os objetos trocados por piso, o piso interno ('o') separado
+             do externo, as paredes de canto trocadas por 'x' e decorações nos
+             pisos externos.
+
+             As decorações são sorteadas com um gerador do NumPy cuja semente
+             vem de rng (o módulo random, se não for dado), então o resultado
+             é repetível (mas diferente do de um mapa comum)."""
+        startx, starty = startxy
+        codes = self.codes.copy()
+        codes[numpy.isin(codes, OBJECT_CODES)] = CODES[' ']
+
+        codes[reachableMask(codes == CODES[' '], startx, starty)] = CODES['o']
+
+        codes[MapGrid(codes).cornerMask()] = CODES['x']
+
+        outside = numpy.flatnonzero(codes == CODES[' '])
+        generator = numpy.random.default_rng(rng.getrandbits(64))
+        decorated = outside[generator.integers(0, 100, size=len(outside)) < OUTSIDE_DECORATION_PCT]
+        decorationCodes = numpy.array([CODES[character] for character in OUTSIDE_DECORATIONS], dtype=numpy.uint8)
+        codes.flat[decorated] = decorationCodes[generator.integers(0, len(decorationCodes), size=len(decorated))]
+        return MapGrid(codes)
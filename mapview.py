@@ -0,0 +1,89 @@
+"""Desenho do mapa em pedaços (chunks) para mapas maiores que a janela.
+
+Em vez de um único Surface do tamanho do mapa inteiro, o mapa é dividido em
+pedaços de tamanho fixo que só são desenhados quando alguma parte deles
+aparece na janela. Só os últimos pedaços usados ficam guardados, então a
+memória depende do tamanho da janela e não do tamanho do mapa, e o tempo de
+cada quadro não cresce com o mapa."""
+
+from collections import OrderedDict
+
+import pygame
+
+from profiler import SURFACES_CREATED, getProfiler
+
+
+class ChunkedMapSurface:
+    """O mapa desenhado em pedaços de chunkWidth x chunkHeight pixels.
+
+         drawArea(surface, area, origin) é chamada para desenhar a parte area
+         (um Rect nas coordenadas do mapa) em surface, cujo canto superior
+         esquerdo corresponde ao ponto origin do mapa. No máximo maxChunks
+         pedaços ficam guardados; os usados há mais tempo são reaproveitados."""
+
+    def __init__(self, width, height, chunkWidth, chunkHeight, drawArea, maxChunks):
+        self.width = width
+        self.height = height
+        self.chunkWidth = chunkWidth
+        self.chunkHeight = chunkHeight
+        self.drawArea = drawArea
+        self.maxChunks = maxChunks
+        self.chunks = OrderedDict()  # (coluna, linha) do pedaço -> Surface
+
+    def getRect(self):
+        """Retorna o Rect do mapa inteiro, com o canto em (0, 0)."""
+        return pygame.Rect(0, 0, self.width, self.height)
+
+    def chunkRect(self, key):
+        """Retorna o Rect (nas coordenadas do mapa) do pedaço key."""
+        column, row = key
+        return pygame.Rect(column * self.chunkWidth, row * self.chunkHeight, self.chunkWidth, self.chunkHeight)
+
+    def chunksIn(self, area):
+        """Retorna as chaves dos pedaços que têm alguma parte dentro de area
+             (um Rect nas coordenadas do mapa)."""
+        area = area.clip(self.getRect())
+        if area.width == 0 or area.height == 0:
+            return []
+        return [(column, row)
+                for column in range(area.left // self.chunkWidth, (area.right - 1) // self.chunkWidth + 1)
+                for row in range(area.top // self.chunkHeight, (area.bottom - 1) // self.chunkHeight + 1)]
+
+    def getChunk(self, key):
+        """Retorna o Surface do pedaço key, desenhando-o se necessário."""
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+
+        if len(self.chunks) >= self.maxChunks:
+            # Reaproveite o Surface do pedaço usado há mais tempo.
+            oldKey, chunkSurf = self.chunks.popitem(last=False)
+        else:
+            chunkSurf = pygame.Surface((self.chunkWidth, self.chunkHeight))
+            getProfiler().count(SURFACES_CREATED)
+        rect = self.chunkRect(key)
+        self.drawArea(chunkSurf, rect, rect.topleft)
+        self.chunks[key] = chunkSurf
+        return chunkSurf
+
+    def redraw(self, area):
+        """Redesenha a parte area (um Rect nas coordenadas do mapa) nos pedaços
+             guardados. Os pedaços que não estão guardados serão desenhados já
+             atualizados quando forem pedidos."""
+        for key in self.chunksIn(area):
+            if key in self.chunks:
+                rect = self.chunkRect(key)
+                self.drawArea(self.chunks[key], area.clip(rect), rect.topleft)
+
+    def draw(self, surface, topleft, area):
+        """Desenha em surface, com o canto do mapa no ponto topleft, só os
+             pedaços que aparecem em area (um Rect nas coordenadas de surface)."""
+        left, top = topleft
+        for key in self.chunksIn(area.move(-left, -top)):
+            rect = self.chunkRect(key)
+            surface.blit(self.getChunk(key), rect.move(left, top))
+
+    def clear(self):
+        """Descarta todos os pedaços guardados, por exemplo quando a aparência
+             do mapa inteiro muda."""
+        self.chunks.clear()
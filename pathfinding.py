@@ -0,0 +1,112 @@
+"""Caminhos do jogador até um espaço clicado com o mouse.
+
+A região do jogador (os espaços que ele alcança sem empurrar estrelas) só
+muda quando uma estrela muda de lugar, então ela é guardada e só é calculada
+de novo depois de um empurrão (ou de desfazer um). Os passos comuns, que
+são a maior parte de um nível, só mudam o jogador de lugar dentro da mesma
+região. Com a região, saber se um clique é alcançável é O(1), e a busca do
+caminho mais curto só anda por dentro dela. Este módulo não importa o
+pygame."""
+
+from collections import deque
+
+from profiler import getProfiler
+
+# O contador do profiler com quantas vezes a região do jogador foi calculada.
+REGIONS_COMPUTED = 'regiões do jogador calculadas'
+
+
+class PlayerRegion:
+    """A região do jogador em um nível, guardada até as estrelas mudarem.
+
+         marks tem um byte por célula da placa: 1 nas células da região."""
+
+    def __init__(self, board):
+        self.board = board
+        self.offsets = [offset for (direction, offset) in board['directions']]
+        self.stars = None  # as estrelas (bits) de quando a região foi calculada
+        self.marks = None
+
+    def update(self, gameStateObj):
+        """Calcula a região de novo se as estrelas mudaram desde a última vez
+             ou se o jogador está fora dela (depois de reiniciar o nível, por
+             exemplo)."""
+        if gameStateObj.stars == self.stars and self.marks[gameStateObj.player]:
+            return
+        getProfiler().count(REGIONS_COMPUTED)
+        walls = self.board['walls']
+        stars = gameStateObj.stars
+        marks = bytearray(len(walls))
+        marks[gameStateObj.player] = 1
+        stack = [gameStateObj.player]
+        while stack:
+            cell = stack.pop()
+            for offset in self.offsets:
+                nxt = cell + offset
+                if not marks[nxt] and not walls[nxt] and not (stars >> nxt) & 1:
+                    marks[nxt] = 1
+                    stack.append(nxt)
+        self.stars = stars
+        self.marks = marks
+
+    def contains(self, gameStateObj, cell):
+        """Retorna True se o jogador alcança cell sem empurrar estrelas."""
+        self.update(gameStateObj)
+        return self.marks[cell] == 1
+
+    def pathTo(self, gameStateObj, cell):
+        """Retorna a lista de direções do caminho mais curto do jogador até
+             cell sem empurrar estrelas, ou None se cell não é alcançável."""
+        if not self.contains(gameStateObj, cell):
+            return None
+        return self._shortestPaths(gameStateObj.player, [cell])[cell]
+
+    def pushPath(self, gameStateObj, starCell):
+        """Retorna a direção (em uma lista) para empurrar a estrela em starCell
+             para longe do jogador, ou None se o jogador não está ao lado dela
+             ou se o espaço depois dela está ocupado."""
+        walls = self.board['walls']
+        for direction, offset in self.board['directions']:
+            if gameStateObj.player + offset == starCell:
+                beyond = starCell + offset
+                if walls[beyond] or gameStateObj.hasStar(beyond):
+                    return None
+                return [direction]
+        return None
+
+    def _shortestPaths(self, start, targets):
+        """Busca em largura de start pela região até achar todas as células de
+             targets (todas dentro da região). Retorna {célula: direções}."""
+        directions = self.board['directions']
+        marks = self.marks
+        remaining = set(targets)
+        previous = {start: None}  # célula -> (célula anterior, direção)
+        queue = deque([start])
+        remaining.discard(start)
+        while queue and remaining:
+            cell = queue.popleft()
+            for direction, offset in directions:
+                nxt = cell + offset
+                if marks[nxt] and nxt not in previous:
+                    previous[nxt] = (cell, direction)
+                    remaining.discard(nxt)
+                    queue.append(nxt)
+
+        paths = {}
+        for target in targets:
+            path = []
+            cell = target
+            while previous[cell] is not None:
+                cell, direction = previous[cell]
+                path.append(direction)
+            path.reverse()
+            paths[target] = path
+        return paths
+
+    def clickPath(self, gameStateObj, cell):
+        """Retorna as direções para um clique em cell: empurrar a estrela, se
+             há uma estrela em cell ao lado do jogador, ou andar até cell.
+             Retorna None se não há como fazer nenhum dos dois."""
+        if gameStateObj.hasStar(cell):
+            return self.pushPath(gameStateObj, cell)
+        return self.pathTo(gameStateObj, cell)
@@ -0,0 +1,193 @@
+"""Medição do tempo de cada quadro do jogo.
+
+Com o jogo iniciado com --profile, cada quadro anota quanto tempo passou em
+cada parte do loop (eventos, makeMove(), desenho do mapa, composição da
+janela, display.update()) e contadores como ladrilhos desenhados e Surfaces
+criados. Os resultados podem ser mostrados na tela (tempo do quadro, p50 e
+p99) e exportados em JSON ou CSV no fim da sessão.
+
+Sem --profile o profiler ativo é um NullProfiler, cujos métodos não fazem
+nada, então o código instrumentado pode chamá-lo sempre. Este módulo não
+importa o pygame."""
+
+import csv
+import itertools
+import json
+import time
+from collections import deque
+
+# Quantos quadros o FrameProfiler guarda (uma hora de jogo a 30 FPS).
+MAX_RECORDED_FRAMES = 30 * 60 * 60
+
+# O nome do tempo total de trabalho de cada quadro (sem contar a espera por
+# eventos e o limite de FPS).
+FRAME = 'quadro'
+WAIT = 'espera'
+# O contador de Surfaces criados durante o quadro.
+SURFACES_CREATED = 'Surfaces criados'
+
+
+def percentile(values, fraction):
+    """Retorna o valor de values (uma lista ordenada) abaixo do qual fica a
+         fração fraction dos valores (0.5 para a mediana)."""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(fraction * len(values)))
+    return values[index]
+
+
+class _Section:
+    """O gerenciador de contexto retornado por FrameProfiler.section()."""
+
+    __slots__ = ('profiler', 'name', 'startTime')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.profiler.addTime(self.name, time.perf_counter() - self.startTime)
+
+
+class FrameProfiler:
+    """Os tempos (em segundos) e contadores de cada quadro.
+
+         O loop chama beginFrame() no começo de cada quadro e endFrame() no
+         fim. Dentro do quadro, "with profiler.section('nome'):" soma o tempo
+         do bloco em 'nome' e count('nome') soma em um contador. As seções
+         podem estar umas dentro das outras; o tempo de cada uma inclui o das
+         que estão dentro dela."""
+
+    enabled = True
+
+    def __init__(self, maxFrames=MAX_RECORDED_FRAMES):
+        self.frames = deque(maxlen=maxFrames)
+        self.current = None
+        self.frameStart = None
+        self.names = []  # os nomes usados, na ordem em que apareceram
+        self.frameCount = 0  # quantos quadros já terminaram
+
+    def beginFrame(self):
+        self.current = {}
+        self.frameStart = time.perf_counter()
+
+    def endFrame(self):
+        if self.current is None:
+            return
+        elapsed = time.perf_counter() - self.frameStart
+        self.current[FRAME] = elapsed - self.current.get(WAIT, 0.0)
+        self._addName(FRAME)
+        self.frames.append(self.current)
+        self.frameCount += 1
+        self.current = None
+
+    def section(self, name):
+        return _Section(self, name)
+
+    def addTime(self, name, seconds):
+        if self.current is not None:
+            self.current[name] = self.current.get(name, 0.0) + seconds
+            self._addName(name)
+
+    def count(self, name, amount=1):
+        if self.current is not None:
+            self.current[name] = self.current.get(name, 0) + amount
+            self._addName(name)
+
+    def _addName(self, name):
+        if name not in self.names:
+            self.names.append(name)
+
+    def values(self, name, lastFrames=None):
+        """Retorna a lista ordenada dos valores de name nos quadros (só nos
+             últimos lastFrames quadros, se dado). Quadros sem o valor contam 0."""
+        frames = self.frames
+        if lastFrames is not None:
+            frames = itertools.islice(reversed(frames), lastFrames)
+        return sorted(frame.get(name, 0) for frame in frames)
+
+    def summary(self):
+        """Retorna um dicionário com a média, p50, p99 e máximo de cada nome."""
+        result = {}
+        for name in self.names:
+            values = self.values(name)
+            if values:
+                result[name] = {
+                    'media': sum(values) / len(values),
+                    'p50': percentile(values, 0.5),
+                    'p99': percentile(values, 0.99),
+                    'max': values[-1]
+                }
+        return result
+
+    def overlayText(self, lastFrames=None):
+        """Retorna uma linha de texto com o tempo do último quadro e o p50 e
+             p99 dos últimos lastFrames quadros, em milissegundos."""
+        if not self.frames:
+            return 'quadro: -'
+        values = self.values(FRAME, lastFrames)
+        return 'quadro: %.1f ms  p50: %.1f ms  p99: %.1f ms' % (
+            self.frames[-1][FRAME] * 1000, percentile(values, 0.5) * 1000, percentile(values, 0.99) * 1000)
+
+    def export(self, filename):
+        """Grava os quadros em filename: em CSV (uma linha por quadro) se o
+             nome termina com .csv, ou em JSON (o resumo e os quadros)."""
+        if filename.lower().endswith('.csv'):
+            with open(filename, 'w', newline='') as outputFile:
+                writer = csv.writer(outputFile)
+                writer.writerow(self.names)
+                for frame in self.frames:
+                    writer.writerow([frame.get(name, 0) for name in self.names])
+        else:
+            with open(filename, 'w') as outputFile:
+                json.dump({'summary': self.summary(), 'frames': list(self.frames)}, outputFile, indent=1)
+
+
+class _NullSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, excType, excValue, traceback):
+        pass
+
+
+class NullProfiler:
+    """Um profiler desligado: tem os mesmos métodos do FrameProfiler, mas eles
+         não fazem nada."""
+
+    enabled = False
+    frameCount = 0
+    _section = _NullSection()
+
+    def beginFrame(self):
+        pass
+
+    def endFrame(self):
+        pass
+
+    def section(self, name):
+        return self._section
+
+    def addTime(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+
+_activeProfiler = NullProfiler()
+
+
+def getProfiler():
+    """Retorna o profiler ativo (um NullProfiler se a medição está desligada)."""
+    return _activeProfiler
+
+
+def setProfiler(profiler):
+    global _activeProfiler
+    _activeProfiler = profiler
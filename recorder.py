@@ -0,0 +1,181 @@
+"""Gravação das partidas em uma sequência de imagens ou em um vídeo.
+
+Gravar cada quadro com pygame.image.save() dentro do loop do jogo trava o
+jogo, pois codificar um PNG da janela inteira leva mais que um quadro. O
+FrameRecorder só copia, no loop do jogo, as áreas da janela que mudaram no
+quadro (as mesmas passadas para pygame.display.update()), o que custa
+pouco, e as põe em uma fila. Uma thread em segundo plano aplica essas áreas
+em uma cópia própria da janela e codifica os quadros, então o loop nunca
+espera pela gravação.
+
+A saída é um diretório com um PNG por quadro que mudou (quadro000123.png é o
+quadro 123 a RECORD_FPS quadros por segundo; os números que faltam repetem
+o quadro anterior) ou, se o nome termina com a extensão de um vídeo, um
+vídeo codificado pelo programa ffmpeg, que recebe os quadros por um pipe.
+
+Se a fila enche (a codificação não acompanha o jogo), as capturas seguintes
+são descartadas em vez de esperar, e a primeira captura depois disso copia a
+janela inteira, para que a cópia da thread não fique com áreas antigas. Se a
+gravação falha (o ffmpeg terminou, o disco encheu), o erro fica em error, a
+thread continua esvaziando a fila sem gravar, e stop() nunca trava o fim do
+jogo."""
+
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import pygame
+
+from profiler import getProfiler
+
+# Quadros por segundo da gravação (a gravação repete o último quadro quando o
+# jogo não desenha nada).
+RECORD_FPS = 30
+# Quantas capturas podem esperar pela thread de gravação.
+MAX_QUEUED_CAPTURES = 256
+# As extensões de arquivo gravadas como vídeo, com o ffmpeg.
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.webm', '.mov')
+
+# Quanto tempo, em segundos, stop() espera a thread terminar de gravar a fila.
+STOP_TIMEOUT = 10
+
+# O contador do profiler com as capturas descartadas porque a fila estava cheia.
+CAPTURES_DROPPED = 'capturas descartadas'
+
+
+class FrameRecorder:
+    """Grava os quadros da janela em output (um diretório ou um vídeo).
+
+         capture() é chamada pelo loop do jogo depois de cada
+         pygame.display.update(); stop() espera a thread terminar de gravar o
+         que está na fila. Levanta ValueError se output é um vídeo e o
+         ffmpeg não está instalado."""
+
+    enabled = True
+
+    def __init__(self, output, fps=RECORD_FPS, maxQueuedCaptures=MAX_QUEUED_CAPTURES):
+        self.output = output
+        self.fps = fps
+        self.isVideo = output.lower().endswith(VIDEO_EXTENSIONS)
+        if self.isVideo and shutil.which('ffmpeg') is None:
+            raise ValueError('O ffmpeg não está instalado; grave em um diretório de imagens.')
+        self.captures = queue.Queue(maxQueuedCaptures)
+        self.startTime = None
+        self.needFullFrame = True  # a primeira captura é da janela inteira
+        self.framesWritten = 0
+        self.capturesDropped = 0
+        self.thread = None
+        self.encoder = None  # o processo do ffmpeg
+        self.error = None  # o erro que interrompeu a gravação, se houve um
+
+    def capture(self, surface, rects=None):
+        """Copia as áreas rects de surface (a janela inteira, se rects não
+             for dado) e as põe na fila da thread de gravação. Nunca espera."""
+
+        if self.error is not None:
+            return  # A gravação falhou; não adianta copiar a janela.
+        now = time.perf_counter()
+        if self.thread is None:
+            self.startTime = now
+            self.thread = threading.Thread(target=self._run, args=(surface.get_size(),), daemon=True)
+            self.thread.start()
+        if rects is None or self.needFullFrame:
+            regions = [((0, 0), surface.copy())]
+        else:
+            regions = [(rect.topleft, surface.subsurface(rect).copy()) for rect in rects if rect.w and rect.h]
+        try:
+            self.captures.put_nowait((now - self.startTime, regions))
+            self.needFullFrame = False
+        except queue.Full:
+            self.capturesDropped += 1
+            getProfiler().count(CAPTURES_DROPPED)
+            self.needFullFrame = True
+
+    def _run(self, size):
+        """O loop da thread de gravação: aplica as capturas na cópia da
+             janela e grava os quadros, até a captura sem áreas de stop().
+             Depois de um erro, só esvazia a fila."""
+
+        try:
+            canvas = pygame.Surface(size)
+            if self.isVideo:
+                self.encoder = subprocess.Popen(
+                    ['ffmpeg', '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                     '-s', '%sx%s' % size, '-r', str(self.fps), '-i', '-', '-pix_fmt', 'yuv420p', self.output],
+                    stdin=subprocess.PIPE)
+            else:
+                os.makedirs(self.output, exist_ok=True)
+        except (OSError, pygame.error) as error:
+            self.error = error
+
+        changed = False  # canvas mudou desde o último PNG gravado
+        while True:
+            seconds, regions = self.captures.get()
+            if self.error is None:
+                try:
+                    if self._encode(canvas, int(seconds * self.fps), changed):
+                        changed = False
+                except (OSError, pygame.error) as error:
+                    self.error = error
+            if regions is None:
+                break
+            if self.error is None:
+                for topleft, regionSurf in regions:
+                    canvas.blit(regionSurf, topleft)
+                changed = True
+
+        if self.encoder is not None:
+            try:
+                self.encoder.stdin.close()
+            except OSError:
+                pass  # O ffmpeg já tinha terminado.
+            self.encoder.wait()
+
+    def _encode(self, canvas, frame, changed):
+        """Grava canvas, que é o quadro de framesWritten até antes de frame.
+             As capturas de um mesmo quadro da gravação são juntadas, então
+             nada é gravado enquanto frame não passa de framesWritten. Retorna
+             True se gravou."""
+        if frame <= self.framesWritten:
+            return False
+        if self.isVideo:
+            data = pygame.image.tobytes(canvas, 'RGB')
+            for i in range(frame - self.framesWritten):
+                self.encoder.stdin.write(data)
+        elif changed:
+            pygame.image.save(canvas, os.path.join(self.output, 'quadro%06d.png' % (self.framesWritten)))
+        self.framesWritten = frame
+        return True
+
+    def stop(self):
+        """Espera a thread gravar as capturas que estão na fila e termina a
+             gravação. O último quadro fica até o instante de stop(). Espera
+             no máximo STOP_TIMEOUT segundos."""
+        if self.thread is None:
+            return
+        if self.thread.is_alive():
+            # Um quadro a mais, para que a última captura também seja gravada.
+            try:
+                self.captures.put((time.perf_counter() - self.startTime + 1.0 / self.fps, None),
+                                  timeout=STOP_TIMEOUT)
+            except queue.Full:
+                self.error = self.error or TimeoutError('a gravação não acompanhou o jogo')
+            self.thread.join(STOP_TIMEOUT)
+        self.thread = None
+
+
+class NullRecorder:
+    """Uma gravação desligada: tem os mesmos métodos do FrameRecorder, mas
+         eles não fazem nada."""
+
+    enabled = False
+    error = None
+
+    def capture(self, surface, rects=None):
+        pass
+
+    def stop(self):
+        pass
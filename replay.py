@@ -0,0 +1,162 @@
+"""Reprodução rápida de soluções na notação LURD, sem janela.
+
+Uma solução é aplicada ao nível de uma vez, com um loop que só mexe na
+placa (sem chamar makeMove() a cada passo), e valida cada passo: o jogador
+não pode entrar em paredes, as letras maiúsculas precisam empurrar uma
+estrela e as minúsculas não. A cada KEYFRAME_INTERVAL passos é guardado um
+quadro-chave (a posição do jogador e das estrelas), então ir para qualquer
+passo da reprodução custa no máximo KEYFRAME_INTERVAL passos a partir do
+quadro-chave anterior. Este módulo não importa o pygame."""
+
+from gamestate import DOWN, LEFT, RIGHT, UP, GameState, bitsToCells, cellsToBits
+
+# A cada quantos passos a reprodução guarda um quadro-chave.
+KEYFRAME_INTERVAL = 1024
+
+LURD_DIRECTIONS = {'u': UP, 'd': DOWN, 'l': LEFT, 'r': RIGHT}
+
+
+def expandLURD(text):
+    """Retorna a solução em LURD sem espaços e fins de linha e com as
+         repetições expandidas ("3r" vira "rrr"). Levanta ValueError se há
+         caracteres que não são da notação."""
+
+    letters = []
+    count = ''
+    for character in text:
+        if character.isspace():
+            continue
+        if character.isdigit():
+            count += character
+        elif character.lower() in LURD_DIRECTIONS:
+            letters.append(character * (int(count) if count else 1))
+            count = ''
+        else:
+            raise ValueError('Caractere inválido na solução: %r' % (character))
+    if count:
+        raise ValueError('A solução termina com um número sem letra: %s' % (count))
+    return ''.join(letters)
+
+
+class Replay:
+    """Uma solução LURD aplicada a um nível.
+
+         Na criação, a solução inteira é reproduzida a partir do estado
+         inicial do nível (ou de startState). Se um passo for inválido, a
+         reprodução para nele: error tem a mensagem e length o número de
+         passos válidos antes dele. stateAt(step) retorna o GameState depois
+         de step passos."""
+
+    def __init__(self, levelObj, solution, startState=None, keyframeInterval=KEYFRAME_INTERVAL):
+        if startState is None:
+            startState = levelObj['startState']
+        self.board = levelObj['board']
+        self.solution = solution
+        self.keyframeInterval = keyframeInterval
+        self.startStep = startState.stepCounter
+        self.error = None
+
+        offsets = self.board['offsets']
+        letterOffsets = {}
+        for letter, direction in LURD_DIRECTIONS.items():
+            letterOffsets[letter] = offsets[direction]
+            letterOffsets[letter.upper()] = offsets[direction]
+
+        walls = self.board['walls']
+        size = self.board['size']
+        # As estrelas ficam em um bytearray, para consultar cada espaço
+        # rápido, e em um conjunto, para montar os quadros-chave.
+        starCells = set(startState.starCells())
+        stars = bytearray(size)
+        for cell in starCells:
+            stars[cell] = 1
+        player = startState.player
+        pushes = 0
+
+        # keyframes[i] é (jogador, bits das estrelas, empurrões) depois de
+        # i * keyframeInterval passos.
+        self.keyframes = [(player, startState.stars, 0)]
+        nextKeyframe = keyframeInterval
+
+        step = 0
+        for letter in solution:
+            offset = letterOffsets.get(letter)
+            if offset is None:
+                self.error = 'Passo %s: %r não é uma letra LURD.' % (step + 1, letter)
+                break
+            target = player + offset
+            if walls[target]:
+                self.error = 'Passo %s: o jogador anda para dentro de uma parede.' % (step + 1)
+                break
+            if stars[target]:
+                beyond = target + offset
+                if walls[beyond] or stars[beyond]:
+                    self.error = 'Passo %s: a estrela não pode ser empurrada.' % (step + 1)
+                    break
+                if letter.islower():
+                    self.error = 'Passo %s: %r empurra uma estrela, deveria ser %r.' % (
+                        step + 1, letter, letter.upper())
+                    break
+                stars[target] = 0
+                stars[beyond] = 1
+                starCells.remove(target)
+                starCells.add(beyond)
+                pushes += 1
+            elif letter.isupper():
+                self.error = 'Passo %s: %r não empurra nenhuma estrela, deveria ser %r.' % (
+                    step + 1, letter, letter.lower())
+                break
+            player = target
+            step += 1
+            if step == nextKeyframe:
+                self.keyframes.append((player, cellsToBits(starCells, size), pushes))
+                nextKeyframe += keyframeInterval
+
+        self.length = step  # quantos passos válidos foram reproduzidos
+        self.pushes = pushes
+        self.finalPlayer = player
+        self.finalStars = cellsToBits(starCells, size)
+
+    def isValid(self):
+        """Retorna True se todos os passos da solução são válidos."""
+        return self.error is None
+
+    def isSolution(self):
+        """Retorna True se todos os passos são válidos e o nível termina resolvido."""
+        return self.error is None and self.board['goalMask'] & ~self.finalStars == 0
+
+    def stateAt(self, step):
+        """Retorna o GameState depois de step passos (limitado a 0..length),
+             partindo do quadro-chave anterior a ele."""
+
+        step = max(0, min(step, self.length))
+        if step == self.length:
+            return GameState(self.board, self.finalPlayer, bitsToCells(self.finalStars), self.startStep + step)
+        keyframeIndex = step // self.keyframeInterval
+        player, starBits, pushes = self.keyframes[keyframeIndex]
+        gameStateObj = GameState(self.board, player, bitsToCells(starBits))
+        self._advance(gameStateObj, keyframeIndex * self.keyframeInterval, step)
+        return gameStateObj
+
+    def _advance(self, gameStateObj, fromStep, toStep):
+        """Aplica em gameStateObj os passos fromStep..toStep - 1 (já validados)."""
+        offsets = self.board['offsets']
+        player = gameStateObj.player
+        for letter in self.solution[fromStep:toStep]:
+            offset = offsets[LURD_DIRECTIONS[letter.lower()]]
+            target = player + offset
+            if letter.isupper():
+                gameStateObj.moveStar(target, target + offset)
+            player = target
+        gameStateObj.player = player
+        gameStateObj.stepCounter = self.startStep + toStep
+
+    def pushesAt(self, step):
+        """Retorna quantos empurrões foram feitos nos primeiros step passos."""
+        step = max(0, min(step, self.length))
+        keyframeIndex = step // self.keyframeInterval
+        pushes = self.keyframes[keyframeIndex][2]
+        for letter in self.solution[keyframeIndex * self.keyframeInterval:step]:
+            if letter.isupper():
+                pushes += 1
+        return pushes
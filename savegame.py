@@ -0,0 +1,260 @@
+"""Salvamento automático do progresso no jogo.
+
+Cada nível começado tem um diário: um arquivo binário onde cada movimento,
+desfazer e refazer é acrescentado no fim assim que acontece, um byte por
+registro (2 bits da direção, 1 bit de empurrão e um bit que marca o byte
+como registro, veja history.encodeMove()). Acrescentar um byte custa o mesmo
+em qualquer ponto do nível, então salvar nunca atrasa um quadro, mesmo em
+soluções muito longas.
+
+A cada SNAPSHOT_INTERVAL registros é gravado um instantâneo (a posição do
+jogador, as estrelas, o contador de passos e até onde o diário já estava
+aplicado, com o CRC32 dos registros até ali), então continuar um nível só aplica no GameState os registros
+depois do último instantâneo. O instantâneo é gravado em um arquivo
+temporário e trocado de uma vez, e o diário é lido só até o último registro
+completo, então uma queda do programa no meio de uma gravação perde no
+máximo o último movimento. Um instantâneo que não confere com o diário é
+apagado, para que não volte a valer quando o diário crescer de novo. Este módulo não importa o pygame."""
+
+import json
+import os
+import struct
+import zlib
+
+from gamestate import GameState, bitsToCells
+from history import MoveHistory
+
+# O diretório dos arquivos salvos, relativo ao diretório do jogo.
+SAVE_DIRECTORY = 'saves'
+JOURNAL_EXTENSION = '.jrn'
+SNAPSHOT_EXTENSION = '.snap'
+PROGRESS_FILENAME = 'progresso.json'
+
+# A cada quantos registros do diário é gravado um instantâneo.
+SNAPSHOT_INTERVAL = 256
+
+# O começo do diário: a assinatura, a versão e a identificação do nível (o
+# Zobrist do estado inicial e o tamanho da placa), para que o diário de um
+# nível que mudou no arquivo de níveis não seja aplicado a ele.
+JOURNAL_MAGIC = b'SPJ'
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct('<3sBQI')
+# offset, CRC32 do diário até offset, Zobrist, posição, passos, jogador
+SNAPSHOT_HEADER = struct.Struct('<QIQIiI')
+
+# Os registros têm o bit RECORD_FLAG ligado, então bytes zerados (o que sobra
+# no fim de um arquivo depois de uma queda do sistema) não são registros. Os
+# valores de 0 a 7 são os códigos de history.encodeMove().
+RECORD_FLAG = 0x80
+UNDO_RECORD = RECORD_FLAG | 8
+REDO_RECORD = RECORD_FLAG | 9
+
+
+def levelFingerprint(levelObj):
+    """Retorna os números que identificam o nível no cabeçalho do diário."""
+    startState = levelObj['startState']
+    return startState.zobrist(), levelObj['board']['size']
+
+
+def replaceFile(filename, data):
+    """Grava data em filename de uma vez: em um arquivo temporário que então
+         substitui o antigo, para que nunca exista um arquivo pela metade."""
+    tempFilename = '%s.%s.tmp' % (filename, os.getpid())
+    with open(tempFilename, 'wb') as tempFile:
+        tempFile.write(data)
+    os.replace(tempFilename, filename)
+
+
+def applyRecords(history, records, gameStateObj=None):
+    """Aplica os registros do diário em history (e em gameStateObj, se dado).
+         Retorna quantos bytes de records eram registros válidos; a leitura
+         para no primeiro byte que não é um registro."""
+
+    moves = history.moves
+    for index, record in enumerate(records):
+        if record == UNDO_RECORD:
+            if gameStateObj is not None:
+                history.undo(gameStateObj)
+            elif history.position > 0:
+                history.position -= 1
+        elif record == REDO_RECORD:
+            if gameStateObj is not None:
+                history.redo(gameStateObj)
+            elif history.position < len(moves):
+                history.position += 1
+        elif record & RECORD_FLAG and record < UNDO_RECORD:
+            del moves[history.position:]
+            moves.append(record & ~RECORD_FLAG)
+            if gameStateObj is not None:
+                history.redo(gameStateObj)
+            else:
+                history.position += 1
+        else:
+            return index
+    return len(records)
+
+
+class LevelJournal:
+    """O diário e o instantâneo de um nível.
+
+         resume() lê o que foi salvo e retorna o estado e o histórico do nível;
+         depois disso, append() acrescenta cada registro. Se os arquivos não
+         podem ser gravados (um diretório somente leitura, por exemplo), o
+         jogo continua, só sem salvar."""
+
+    def __init__(self, levelObj, levelNum, directory=SAVE_DIRECTORY):
+        self.levelObj = levelObj
+        self.journalFilename = os.path.join(directory, 'nivel%s%s' % (levelNum + 1, JOURNAL_EXTENSION))
+        self.snapshotFilename = os.path.join(directory, 'nivel%s%s' % (levelNum + 1, SNAPSHOT_EXTENSION))
+        self.directory = directory
+        self.journalFile = None
+        self.offset = 0  # o tamanho do diário, em bytes
+        self.recordsSinceSnapshot = 0
+        self.journalCrc = 0  # o CRC32 dos registros do diário
+
+    def resume(self):
+        """Retorna (gameStateObj, history) do nível como foram salvos (o estado
+             inicial, se não há nada salvo) e abre o diário para acrescentar."""
+
+        gameStateObj = self.levelObj['startState'].copy()
+        history = MoveHistory()
+        fingerprint = levelFingerprint(self.levelObj)
+        header = JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, *fingerprint)
+        try:
+            with open(self.journalFilename, 'rb') as journalFile:
+                data = journalFile.read()
+        except OSError:
+            data = b''
+
+        validLength = 0
+        if data[:JOURNAL_HEADER.size] == header:
+            records = memoryview(data)[JOURNAL_HEADER.size:]
+            snapshot = self._readSnapshot(fingerprint[0], records)
+            if snapshot is not None:
+                snapshotOffset, position, stepCounter, player, stars = snapshot
+                # O histórico até o instantâneo só precisa dos códigos; o
+                # estado vem do instantâneo.
+                applyRecords(history, records[:snapshotOffset])
+                if history.position == position:
+                    gameStateObj = self._makeState(player, stars, stepCounter)
+                    records = records[snapshotOffset:]
+                    validLength = snapshotOffset
+                else:
+                    history = MoveHistory()
+                    snapshot = None
+            if snapshot is None:
+                # Um instantâneo que não confere com o diário é apagado: com
+                # mais registros, ele poderia parecer válido de novo.
+                self._removeFiles(self.snapshotFilename)
+            validLength += applyRecords(history, records, gameStateObj)
+
+        self.journalCrc = zlib.crc32(data[JOURNAL_HEADER.size:JOURNAL_HEADER.size + validLength])
+        self._openJournal(header, validLength)
+        return gameStateObj, history
+
+    def _readSnapshot(self, zobrist, records):
+        """Retorna (offset, posição, passos, jogador, estrelas) do instantâneo,
+             ou None se ele não existe, está corrompido ou não é deste diário
+             (records são os registros lidos do diário)."""
+        try:
+            with open(self.snapshotFilename, 'rb') as snapshotFile:
+                data = snapshotFile.read()
+        except OSError:
+            return None
+        if len(data) < SNAPSHOT_HEADER.size + 4:
+            return None
+        body, checksum = data[:-4], struct.unpack('<I', data[-4:])[0]
+        if zlib.crc32(body) != checksum:
+            return None
+        offset, journalCrc, snapshotZobrist, position, stepCounter, player = SNAPSHOT_HEADER.unpack_from(body)
+        if snapshotZobrist != zobrist or offset > len(records) or zlib.crc32(records[:offset]) != journalCrc:
+            return None
+        stars = int.from_bytes(body[SNAPSHOT_HEADER.size:], 'little')
+        return offset, position, stepCounter, player, stars
+
+    def _makeState(self, player, stars, stepCounter):
+        return GameState(self.levelObj['board'], player, bitsToCells(stars), stepCounter)
+
+    def _openJournal(self, header, validLength):
+        """Abre o diário para acrescentar registros, cortando o que vem depois
+             do último registro válido (ou criando-o com o cabeçalho)."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if validLength == 0:
+                replaceFile(self.journalFilename, header)
+                # Um instantâneo antigo não vale para um diário novo.
+                self._removeFiles(self.snapshotFilename)
+            else:
+                with open(self.journalFilename, 'r+b') as journalFile:
+                    journalFile.truncate(JOURNAL_HEADER.size + validLength)
+            # Sem buffer: cada registro vai para o sistema na hora, então uma
+            # queda do programa não perde os registros já acrescentados.
+            self.journalFile = open(self.journalFilename, 'ab', buffering=0)
+        except OSError:
+            self.journalFile = None
+        self.offset = validLength
+        self.recordsSinceSnapshot = 0
+
+    def append(self, record, gameStateObj, history):
+        """Acrescenta um registro ao diário: um código de encodeMove(), ou
+             UNDO_RECORD ou REDO_RECORD. gameStateObj e history já devem estar
+             depois do registro; eles vão para o instantâneo quando é a hora."""
+        if self.journalFile is None:
+            return
+        try:
+            recordByte = bytes((record | RECORD_FLAG,))
+            self.journalFile.write(recordByte)
+            self.journalCrc = zlib.crc32(recordByte, self.journalCrc)
+            self.offset += 1
+            self.recordsSinceSnapshot += 1
+            if self.recordsSinceSnapshot >= SNAPSHOT_INTERVAL:
+                self.writeSnapshot(gameStateObj, history)
+        except OSError:
+            self.close()
+
+    def writeSnapshot(self, gameStateObj, history):
+        """Grava o instantâneo do estado depois de todos os registros atuais."""
+        body = SNAPSHOT_HEADER.pack(self.offset, self.journalCrc, levelFingerprint(self.levelObj)[0],
+                                    history.position, gameStateObj.stepCounter, gameStateObj.player) + \
+            gameStateObj.stars.to_bytes((gameStateObj.board['size'] + 7) // 8, 'little')
+        replaceFile(self.snapshotFilename, body + struct.pack('<I', zlib.crc32(body)))
+        self.recordsSinceSnapshot = 0
+
+    def close(self):
+        if self.journalFile is not None:
+            self.journalFile.close()
+            self.journalFile = None
+
+    def clear(self):
+        """Apaga o que foi salvo do nível (ao reiniciá-lo ou resolvê-lo)."""
+        self.close()
+        self._removeFiles(self.journalFilename, self.snapshotFilename)
+
+    def _removeFiles(self, *filenames):
+        for filename in filenames:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
+def saveProgress(levelsFilename, levelNum, directory=SAVE_DIRECTORY):
+    """Anota qual nível do arquivo de níveis está sendo jogado."""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        replaceFile(os.path.join(directory, PROGRESS_FILENAME),
+                    json.dumps({'levelsFile': levelsFilename, 'level': levelNum}).encode())
+    except OSError:
+        pass
+
+
+def loadProgress(levelsFilename, numLevels, directory=SAVE_DIRECTORY):
+    """Retorna o nível que estava sendo jogado no arquivo de níveis, ou 0."""
+    try:
+        with open(os.path.join(directory, PROGRESS_FILENAME), 'r') as progressFile:
+            progress = json.load(progressFile)
+        if progress['levelsFile'] == levelsFilename and 0 <= progress['level'] < numLevels:
+            return progress['level']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return 0
@@ -0,0 +1,268 @@
+"""Regras do jogo Star Pusher, sem depender do pygame.
+
+Aqui ficam as funções que movem o jogador e as estrelas, verificam paredes e
+o fim do nível, e preparam o mapa decorado (cantos, piso interno/externo e
+decorações). Elas podem ser usadas por ferramentas sem janela, como o
+resolvedor e os benchmarks, e são as mesmas que o jogo usa."""
+
+import random
+
+from deadlock import isDeadlockedPush
+from gamestate import DOWN, LEFT, RIGHT, UP, cellToXY, xyToCell
+from replay import Replay
+
+# A porcentagem de azulejos ao ar livre que possuem
+# decoração neles, como uma árvore ou pedra
+OUTSIDE_DECORATION_PCT = 20
+
+# Parte da semente das decorações de cada nível (veja levelRandom()).
+DECORATION_SEED = 'star pusher'
+
+# Os caracteres usados no mapa decorado para as decorações ao ar livre
+# (pedra, árvore baixa, árvore alta e árvore feia).
+OUTSIDE_DECORATIONS = ('1', '2', '3', '4')
+
+
+def isWall(mapObj, x, y):
+    """Retorna True se a posição (x, y) em
+         o mapa é uma parede; caso contrário, retorne False."""
+    if x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
+        return False  # x e y não estão realmente no mapa.
+    elif mapObj[x][y] in ('#', 'x'):
+        return True  # parede está bloqueando
+    return False
+
+
+def isBlocked(mapObj, gameStateObj, x, y):
+    """Retorna True se a posição (x, y) no mapa for
+         bloqueado por uma parede ou estrela, caso contrário, retorne False."""
+
+    if isWall(mapObj, x, y):
+        return True
+    elif x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
+        return True  # x e y não estão realmente no mapa.
+    elif gameStateObj.hasStar(xyToCell(gameStateObj.board, x, y)):
+        return True  # uma estrela está bloqueando
+
+    return False
+
+
+def makeMove(mapObj, gameStateObj, playerMoveTo, deadlocks=None):
+    """Dado um objeto de mapa e estado do jogo, veja se é possível o
+         jogador para fazer o movimento dado. Se for, altere a configuração do player.
+         posição (e a posição de qualquer estrela empurrada). Caso contrário, não faça nada.
+
+         Se deadlocks (o levelObj['deadlocks'] do nível) for passado, empurrões
+         que deixam o nível impossível de resolver também são recusados.
+
+         Retorna True se o jogador se moveu, caso contrário, False."""
+
+    # Certifique-se de que o jogador possa se mover na direção que deseja.
+    board = gameStateObj.board
+    playerx, playery = cellToXY(board, gameStateObj.player)
+
+    # O código para lidar com cada uma das direções é tão semelhante à parte
+    # de adicionar ou subtrair 1 às coordenadas x/y. Podemos
+    # simplifique usando as variáveis xOffset e yOffset.
+    if playerMoveTo == UP:
+        xOffset = 0
+        yOffset = -1
+    elif playerMoveTo == RIGHT:
+        xOffset = 1
+        yOffset = 0
+    elif playerMoveTo == DOWN:
+        xOffset = 0
+        yOffset = 1
+    elif playerMoveTo == LEFT:
+        xOffset = -1
+        yOffset = 0
+
+    # Veja se o jogador pode se mover nessa direção. O jogador também não
+    # pode sair dos limites do mapa.
+    if isWall(mapObj, playerx + xOffset, playery + yOffset) or \
+            not (0 <= playerx + xOffset < len(mapObj) and 0 <= playery + yOffset < len(mapObj[0])):
+        return False
+    else:
+        moveToCell = xyToCell(board, playerx + xOffset, playery + yOffset)
+        if gameStateObj.hasStar(moveToCell):
+            # Há uma estrela no caminho, veja se o jogador pode empurrá-la.
+            if not isBlocked(mapObj, gameStateObj, playerx + (xOffset * 2), playery + (yOffset * 2)):
+                # Mova a estrela.
+                starToCell = xyToCell(board, playerx + (xOffset * 2), playery + (yOffset * 2))
+                if deadlocks is not None and isDeadlockedPush(deadlocks, gameStateObj.stars, moveToCell, starToCell):
+                    return False
+                gameStateObj.moveStar(moveToCell, starToCell)
+            else:
+                return False
+        # Mover o jogador para cima
+        gameStateObj.player = moveToCell
+        return True
+
+
+def isLevelFinished(levelObj, gameStateObj):
+    """Retorna True se todos os objetivos tiverem estrelas."""
+
+    # Os objetivos e as estrelas são máscaras de bits, então basta ver se algum
+    # bit de objetivo não está ligado nas estrelas.
+    return gameStateObj.isSolved()
+
+
+def checkSolution(levelObj, solution):
+    """Reproduz uma solução LURD a partir do estado inicial do nível (veja
+         replay.Replay). Retorna True se todos os passos forem válidos e o
+         nível terminar resolvido, caso contrário, False."""
+
+    return Replay(levelObj, solution).isSolution()
+
+
+def playSolution(levelObj, solution):
+    """Como checkSolution(), mas joga a solução com makeMove() no mapa, passo
+         a passo, com as mesmas regras usadas durante o jogo. É mais lenta que
+         checkSolution(), mas não depende das paredes da placa que o
+         resolvedor e o Replay usam, então serve para conferir o resolvedor."""
+
+    mapObj = levelObj['mapObj']
+    gameStateObj = levelObj['startState'].copy()
+    letterToDirection = {'u': UP, 'd': DOWN, 'l': LEFT, 'r': RIGHT}
+
+    for letter in solution:
+        if letter.lower() not in letterToDirection:
+            return False
+        starsBefore = gameStateObj.stars
+        if not makeMove(mapObj, gameStateObj, letterToDirection[letter.lower()]):
+            return False
+        # Letras maiúsculas precisam empurrar uma estrela e minúsculas não.
+        if letter.isupper() == (starsBefore == gameStateObj.stars):
+            return False
+        gameStateObj.stepCounter += 1
+    return isLevelFinished(levelObj, gameStateObj)
+
+
+def levelRandom(mapObj):
+    """Retorna um random.Random com uma semente tirada do objeto de mapa, para
+         que as decorações de um nível sejam sempre as mesmas."""
+    return random.Random(DECORATION_SEED + ''.join(''.join(column) for column in mapObj))
+
+
+def decorateMap(mapObj, startxy, rng=random):
+    """Faz uma cópia do objeto de mapa fornecido e o modifica.
+         Aqui está o que é feito para isso:
+             * Paredes que são cantos são transformadas em peças de canto.
+             * É feita a distinção entre os pisos externo e interno.
+             * Decorações de árvores/pedras são adicionadas aleatoriamente aos ladrilhos externos.
+
+         As decorações são sorteadas com rng (o módulo random, se não for
+         dado); com o rng de levelRandom() elas são sempre as mesmas.
+
+         Retorna o objeto de mapa decorado. Um mapgrid.MapGrid é decorado com
+         operações na matriz inteira e retorna outro MapGrid."""
+
+    if not isinstance(mapObj, list):
+        return mapObj.decorated(startxy, rng)
+
+    startx, starty = startxy  # Syntactic sugar
+
+    # Copie o objeto do mapa para não modificar o original passado,
+    # removendo os caracteres que não são da parede dos dados do mapa.
+    # Os caracteres são imutáveis, então basta copiar cada coluna.
+    mapObjCopy = [[' ' if character in ('$', '.', '@', '+', '*') else character for character in column]
+                  for column in mapObj]
+
+    # Preenchimento de inundação para determinar os pisos internos/externos.
+    floodFill(mapObjCopy, startx, starty, ' ', 'o')
+
+    # Converta as paredes adjacentes em ladrilhos de canto.
+    for x in range(len(mapObjCopy)):
+        for y in range(len(mapObjCopy[0])):
+
+            if mapObjCopy[x][y] == '#':
+                if (isWall(mapObjCopy, x, y - 1) and isWall(mapObjCopy, x + 1, y)) or \
+                        (isWall(mapObjCopy, x + 1, y) and isWall(mapObjCopy, x, y + 1)) or \
+                        (isWall(mapObjCopy, x, y + 1) and isWall(mapObjCopy, x - 1, y)) or \
+                        (isWall(mapObjCopy, x - 1, y) and isWall(mapObjCopy, x, y - 1)):
+                    mapObjCopy[x][y] = 'x'
+
+            elif mapObjCopy[x][y] == ' ' and rng.randint(0, 99) < OUTSIDE_DECORATION_PCT:
+                mapObjCopy[x][y] = rng.choice(OUTSIDE_DECORATIONS)
+
+    return mapObjCopy
+
+
+def floodFill(mapObj, x, y, oldCharacter, newCharacter):
+    """Altera qualquer valor que corresponda a oldCharacter no objeto de mapa para
+         newCharacter na posição (x, y) e em todas as posições ligadas a ela
+         (pela esquerda, direita, baixo ou cima) que também correspondam.
+
+         O preenchimento é iterativo e por faixas (scanline): cada coluna é
+         preenchida em trechos contínuos e só o início de cada trecho novo nas
+         colunas vizinhas vai para a pilha, então mapas muito grandes não
+         estouram o limite de recursão do Python."""
+
+    # Neste jogo, o algoritmo de preenchimento cria o interior / o exterior
+    # distinção de piso. Para obter mais informações sobre o algoritmo
+    # Flood Fill, consulte:
+    #   http://en.wikipedia.org/wiki/Flood_fill
+    if oldCharacter == newCharacter:
+        return
+
+    stack = [(x, y)]
+    if mapObj[x][y] != oldCharacter:
+        # Como na versão recursiva, o preenchimento continua pelos vizinhos
+        # mesmo que a própria posição (x, y) não corresponda.
+        stack = [(nx, ny) for (nx, ny) in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+                 if 0 <= nx < len(mapObj) and 0 <= ny < len(mapObj[nx]) and mapObj[nx][ny] == oldCharacter]
+
+    numCols = len(mapObj)
+    while stack:
+        x, y = stack.pop()
+        column = mapObj[x]
+        if column[y] != oldCharacter:
+            continue  # Já preenchido por outra faixa.
+
+        # Estenda a faixa para cima e para baixo o máximo possível.
+        top = y
+        while top > 0 and column[top - 1] == oldCharacter:
+            top -= 1
+        bottom = y
+        while bottom < len(column) - 1 and column[bottom + 1] == oldCharacter:
+            bottom += 1
+        column[top:bottom + 1] = [newCharacter] * (bottom - top + 1)
+
+        # Procure nas colunas vizinhas os trechos que tocam esta faixa.
+        for neighborx in (x - 1, x + 1):
+            if neighborx < 0 or neighborx >= numCols:
+                continue
+            neighbor = mapObj[neighborx]
+            inSpan = False
+            for neighbory in range(top, min(bottom + 1, len(neighbor))):
+                if neighbor[neighbory] == oldCharacter:
+                    if not inSpan:
+                        stack.append((neighborx, neighbory))
+                        inSpan = True
+                else:
+                    inSpan = False
+
+
+def labelRegions(mapObj, passableCharacters):
+    """Rotula as regiões conectadas (pela esquerda, direita, baixo ou cima) dos
+         espaços do mapa cujo caractere está em passableCharacters.
+
+         Retorna (labels, numRegions): labels tem o mesmo formato do objeto de
+         mapa (labels[x][y]), com 0 nos espaços que não são passáveis e de 1 a
+         numRegions nos outros. Dois espaços estão na mesma região se, e só se,
+         têm o mesmo rótulo, então perguntar se um espaço é alcançável a partir
+         de outro depois disso é O(1)."""
+
+    # -1 marca os espaços passáveis que ainda não receberam uma região.
+    labels = [[-1 if character in passableCharacters else 0 for character in column]
+              for column in mapObj]
+    numRegions = 0
+    for x in range(len(labels)):
+        column = labels[x]
+        if -1 not in column:
+            continue
+        for y in range(len(column)):
+            if column[y] == -1:
+                numRegions += 1
+                floodFill(labels, x, y, -1, numRegions)
+    return labels, numRegions
@@ -1,11 +1,30 @@
-import copy
+import argparse
 import os
-import random
 import sys
+import time
+from collections import OrderedDict, deque
 
 import pygame
 from pygame.locals import *
 
+import batchsolver
+import disksolver
+from animation import FixedTimestep, Slide
+from assets import ImageManager
+import starsolver
+from gamestate import bitsToCells, cellToXY, xyToCell
+import hints
+from hud import HudLayer, TextCache
+from levelfile import openLevelsFile
+from mapview import ChunkedMapSurface
+from pathfinding import PlayerRegion
+import replay
+import savegame
+from recorder import FrameRecorder, NullRecorder
+from profiler import FRAME, WAIT, FrameProfiler, NullProfiler, setProfiler
+from starcore import (DOWN, LEFT, RIGHT, UP, decorateMap, isLevelFinished, levelRandom, makeMove,
+                      playSolution)
+
 FPS = 30  # Quadros por segundo para atualizar a tela
 WINWIDTH = 1024  # Largura da janela do programa, em pixels
 WINHEIGHT = 768  # Altura em pixels
@@ -17,25 +36,114 @@ TILEWIDTH = 50
 TILEHEIGHT = 85
 TILEFLOORHEIGHT = 40
 
-CAM_MOVE_SPEED = 5  # Quantos pixels por quadro a câmera move
-
-# A porcentagem de azulejos ao ar livre que possuem
-# decoração neles, como uma árvore ou pedra
-OUTSIDE_DECORATION_PCT = 20
+# Tamanho, em espaços do mapa, de cada pedaço do mapa desenhado, e quantos
+# pedaços ficam guardados: o dobro dos que cabem na janela de uma vez.
+CHUNKCOLUMNS = 8
+CHUNKROWS = 8
+CHUNKWIDTH = CHUNKCOLUMNS * TILEWIDTH
+CHUNKHEIGHT = CHUNKROWS * TILEFLOORHEIGHT
+MAXCHUNKS = 2 * (WINWIDTH // CHUNKWIDTH + 2) * (WINHEIGHT // CHUNKHEIGHT + 2)
+
+# Quantos níveis ficam com o mapa decorado e os pedaços já desenhados
+# guardados, para que reiniciar ou voltar a um nível seja instantâneo.
+MAXCACHEDLEVELS = 8
+
+CAM_MOVE_SPEED = 150  # Quantos pixels por segundo a câmera move
+
+# Os pixels transparentes acima da face de cima de cada ladrilho: um clique
+# na face de cima do espaço (x, y) fica entre TILETOPMARGIN e TILETOPMARGIN +
+# TILEFLOORHEIGHT pixels abaixo do topo do ladrilho.
+TILETOPMARGIN = 24
+
+# Quanto tempo, em segundos, o jogador e a estrela levam para deslizar de um
+# espaço para o próximo.
+MOVE_DURATION = 0.1
+# Segurar uma tecla a repete depois de KEYREPEATDELAY e então a cada
+# KEYREPEATINTERVAL milissegundos.
+KEYREPEATDELAY = 250
+KEYREPEATINTERVAL = 100
 
 BRIGHTBLUE = (0, 170, 255)
 WHITE = (255, 255, 255)
 BGCOLOR = BRIGHTBLUE
 TEXTCOLOR = WHITE
 
-UP = 'up'
-DOWN = 'down'
-LEFT = 'left'
-RIGHT = 'right'
+UNDO = 'undo'
+REDO = 'redo'
+# Um clique do mouse entra na fila de ações como (CLICK, célula).
+CLICK = 'click'
+
+# Com --profile, a cada quantos quadros o texto do profiler na tela é
+# atualizado e de quantos quadros são o p50 e o p99 mostrados.
+PROFILEROVERLAYINTERVAL = 15
+PROFILEROVERLAYFRAMES = 300
+
+# O profiler dos quadros do jogo. Fica desligado (um NullProfiler, que não
+# faz nada) a menos que o jogo seja iniciado com --profile.
+PROFILER = NullProfiler()
+PROFILEOUTPUT = None  # arquivo para onde as medições vão ao sair do jogo
+
+# A gravação da partida. Fica desligada (um NullRecorder) a menos que o jogo
+# seja iniciado com --record.
+RECORDER = NullRecorder()
+
+# Como cada letra da notação LURD aparece no texto da dica.
+HINTDIRECTIONNAMES = {'u': 'para cima', 'd': 'para baixo', 'l': 'para a esquerda', 'r': 'para a direita'}
+
+
+def main(profile=False, profileOutput=None, recordOutput=None):
+    global PROFILER, PROFILEOUTPUT, RECORDER
 
+    if profile or profileOutput:
+        # Meça o tempo de cada quadro e mostre-o na tela.
+        PROFILER = FrameProfiler()
+        PROFILEOUTPUT = profileOutput
+        setProfiler(PROFILER)
+    if recordOutput:
+        # Grave os quadros da janela em segundo plano.
+        RECORDER = FrameRecorder(recordOutput)
 
-def main():
-    global FPSCLOCK, DISPLAYSURF, IMAGESDICT, TILEMAPPING, OUTSIDEDECOMAPPING, BASICFONT, PLAYERIMAGES, currentImage
+    initGame()
+
+    startScreen()  # Mostra a tela de título até o usuário pressionar uma tecla
+
+    # Abra o arquivo de níveis. Cada nível só é lido quando for jogado. Veja o
+    # readLevelsFile() para detalhes sobre o formato deste arquivo e como
+    # criar seus próprios níveis.
+    levels = openLevelsFile('Levels.txt')
+    # Continue no nível em que o jogo estava da última vez.
+    currentLevelIndex = savegame.loadProgress('Levels.txt', len(levels))
+
+    # O loop principal do jogo. Esse loop executa um único nível, quando o usuário
+    # termina esse nível, o nível seguinte / anterior é carregado.
+    while True:  # main game loop
+        savegame.saveProgress('Levels.txt', currentLevelIndex)
+        # Execute o nível para realmente começar a jogar:
+        result = runLevel(levels, currentLevelIndex)
+
+        if result in ('solved', 'next'):
+            # Ir para o próximo nível
+            currentLevelIndex += 1
+            if currentLevelIndex >= len(levels):
+                # Se não houver mais níveis, volte ao primeiro.
+                currentLevelIndex = 0
+        elif result == 'back':
+            # Vá para o nível anterior.
+            currentLevelIndex -= 1
+            if currentLevelIndex < 0:
+                # Se não houver níveis anteriores, vá para o último.
+                currentLevelIndex = len(levels) - 1
+        elif result == 'reset':
+            pass  # Fazer nada. O loop chama novamente runLevel() para redefinir o nível
+
+
+def initGame():
+    """Inicializa o pygame, abre a janela e define as variáveis globais usadas
+         para desenhar (imagens, fonte, relógio). É chamada por main(), mas
+         também pode ser usada sozinha, por exemplo pelos benchmarks."""
+
+    global FPSCLOCK, DISPLAYSURF, IMAGESDICT, TILEMAPPING, OUTSIDEDECOMAPPING, BASICFONT, HUDTEXTS, HINTS, \
+        LEVELVIEWS, PLAYERIMAGES, currentImage
 
     # Inicialização de Pygame e configuração básica das variáveis globais
     pygame.init()
@@ -48,31 +156,43 @@ def main():
     DISPLAYSURF = pygame.display.set_mode((WINWIDTH, WINHEIGHT))
 
     pygame.display.set_caption('Star Pusher')
+    # Segurar uma seta continua andando.
+    pygame.key.set_repeat(KEYREPEATDELAY, KEYREPEATINTERVAL)
     BASICFONT = pygame.font.Font('freesansbold.ttf', 18)
+    # Os textos do HUD já renderizados, compartilhados entre os níveis.
+    HUDTEXTS = TextCache(BASICFONT, TEXTCOLOR)
+    # A busca de dicas em segundo plano (tecla H).
+    HINTS = hints.HintEngine()
+    # Os mapas decorados e desenhados dos últimos níveis jogados (veja
+    # getLevelView()), do usado há mais tempo para o mais recente.
+    LEVELVIEWS = OrderedDict()
 
     # Um valor de ditado global que conterá tudo o Pygame
-    # Objetos de superfície retornados por pygame.image.load ().
-    IMAGESDICT = {
-        'uncovered goal': pygame.image.load('images/RedSelector.png'),
-        'covered goal': pygame.image.load('images/Selector.png'),
-        'star': pygame.image.load('images/Star.png'),
-        'corner': pygame.image.load('images/Wall_Block_Tall.png'),
-        'wall': pygame.image.load('images/Wood_Block_Tall.png'),
-        'inside floor': pygame.image.load('images/Plain_Block.png'),
-        'outside floor': pygame.image.load('images/Grass_Block.png'),
-        'title': pygame.image.load('images/star_title.png'),
-        'solved': pygame.image.load('images/star_solved.png'),
-        'princess': pygame.image.load('images/princess.png'),
-        'boy': pygame.image.load('images/boy.png'),
-        'catgirl': pygame.image.load('images/catgirl.png'),
-        'horngirl': pygame.image.load('images/horngirl.png'),
-        'pinkgirl': pygame.image.load('images/pinkgirl.png'),
-        'robot': pygame.image.load('images/robot.png'),
-        'rock': pygame.image.load('images/Rock.png'),
-        'short tree': pygame.image.load('images/Tree_Short.png'),
-        'tall tree': pygame.image.load('images/Tree_Tall.png'),
-        'ugly tree': pygame.image.load('images/Tree_Ugly.png')
-    }
+    # Objetos de superfície, já convertidos para o formato da tela. Os
+    # ladrilhos do mapa são carregados juntos em um atlas; as outras imagens
+    # (título, "solved!", personagens) só quando forem usadas.
+    IMAGESDICT = ImageManager({
+        'uncovered goal': 'images/RedSelector.png',
+        'covered goal': 'images/Selector.png',
+        'star': 'images/Star.png',
+        'corner': 'images/Wall_Block_Tall.png',
+        'wall': 'images/Wood_Block_Tall.png',
+        'inside floor': 'images/Plain_Block.png',
+        'outside floor': 'images/Grass_Block.png',
+        'title': 'images/star_title.png',
+        'solved': 'images/star_solved.png',
+        'princess': 'images/princess.png',
+        'boy': 'images/boy.png',
+        'catgirl': 'images/catgirl.png',
+        'horngirl': 'images/horngirl.png',
+        'pinkgirl': 'images/pinkgirl.png',
+        'robot': 'images/robot.png',
+        'rock': 'images/Rock.png',
+        'short tree': 'images/Tree_Short.png',
+        'tall tree': 'images/Tree_Tall.png',
+        'ugly tree': 'images/Tree_Ugly.png'
+    }, ('uncovered goal', 'covered goal', 'star', 'corner', 'wall', 'inside floor',
+        'outside floor', 'rock', 'short tree', 'tall tree', 'ugly tree'))
 
     # Esses valores de ditado são globais e mapeiam o caractere que aparece
     # no arquivo de nível do objeto Surface que ele representa.
@@ -90,93 +210,113 @@ def main():
         '4': IMAGESDICT['ugly tree']
     }
 
-    # PLAYERIMAGES é uma lista de todos os personagens possíveis que o jogador pode ser.
-    # currentImage é o índice da imagem atual do player.
+    # PLAYERIMAGES é uma lista com os nomes (em IMAGESDICT) de todos os personagens
+    # possíveis que o jogador pode ser. currentImage é o índice da imagem atual do player.
     currentImage = 0
     PLAYERIMAGES = [
-        IMAGESDICT['princess'],
-        IMAGESDICT['boy'],
-        IMAGESDICT['catgirl'],
-        IMAGESDICT['horngirl'],
-        IMAGESDICT['pinkgirl'],
-        IMAGESDICT['robot']
+        'princess',
+        'boy',
+        'catgirl',
+        'horngirl',
+        'pinkgirl',
+        'robot'
     ]
 
-    startScreen()  # Mostra a tela de título até o usuário pressionar uma tecla
-
-    # Leia os níveis do arquivo de texto. Veja o readLevelsFile() para
-    # detalhes sobre o formato deste arquivo e como criar seus próprios níveis.
-    levels = readLevelsFile('Levels.txt')
-    currentLevelIndex = 0
-
-    # O loop principal do jogo. Esse loop executa um único nível, quando o usuário
-    # termina esse nível, o nível seguinte / anterior é carregado.
-    while True:  # main game loop
-        # Execute o nível para realmente começar a jogar:
-        result = runLevel(levels, currentLevelIndex)
-
-        if result in ('solved', 'next'):
-            # Ir para o próximo nível
-            currentLevelIndex += 1
-            if currentLevelIndex >= len(levels):
-                # Se não houver mais níveis, volte ao primeiro.
-                currentLevelIndex = 0
-        elif result == 'back':
-            # Vá para o nível anterior.
-            currentLevelIndex -= 1
-            if currentLevelIndex < 0:
-                # Se não houver níveis anteriores, vá para o último.
-                currentLevelIndex = len(levels) - 1
-        elif result == 'reset':
-            pass  # Fazer nada. O loop chama novamente runLevel() para redefinir o nível
-
 
 def runLevel(levels, levelNum):
     global currentImage
 
+    # Uma dica do nível anterior não vale mais.
+    HINTS.cancel()
+
     levelObj = levels[levelNum]
-    mapObj = decorateMap(levelObj['mapObj'], levelObj['startState']['player'])
-    gameStateObj = copy.deepcopy(levelObj['startState'])
-    mapNeedsRedraw = True  # set to True to call drawMap()
-    levelSurf = BASICFONT.render('Level %s de %s' % (levelNum + 1, len(levels)), 1, TEXTCOLOR)
-    levelRect = levelSurf.get_rect()
-    levelRect.bottomleft = (20, WINHEIGHT - 35)
+    # O estado e os movimentos feitos (para desfazer e refazer) continuam de
+    # onde o nível foi deixado; cada movimento novo é acrescentado ao diário.
+    journal = savegame.LevelJournal(levelObj, levelNum)
+    gameStateObj, history = journal.resume()
+    board = gameStateObj.board
+    # Os espaços que o jogador alcança, para os cliques do mouse. Só são
+    # calculados de novo quando uma estrela muda de lugar.
+    playerRegion = PlayerRegion(board)
+    # O mapa decorado e os pedaços do mapa já desenhados vêm da última vez
+    # que o nível foi jogado, se ela foi recente.
+    levelView = getLevelView(levels, levelNum)
+    showGameState(levelView, gameStateObj)
+    mapObj = levelView['mapObj']
+    mapView = levelView['mapView']
+    # As células cujo jogador ou estrela estão deslizando: eles são desenhados
+    # por cima do mapa durante a animação, e não nos pedaços do mapa.
+    animatedCells = levelView['hiddenCells']
+    screenNeedsRedraw = True  # set to True to redraw the whole window
+    # Os textos e a imagem "solved!" desenhados por cima do mapa.
+    hud = HudLayer(HUDTEXTS)
+    hud.setText('level', 'Level %s de %s' % (levelNum + 1, len(levels)), bottomleft=(20, WINHEIGHT - 35))
     mapWidth = len(mapObj) * TILEWIDTH
     mapHeight = (len(mapObj[0]) - 1) * TILEFLOORHEIGHT + TILEHEIGHT
     MAX_CAM_X_PAN = abs(HALF_WINHEIGHT - int(mapHeight / 2)) + TILEWIDTH
     MAX_CAM_Y_PAN = abs(HALF_WINWIDTH - int(mapWidth / 2)) + TILEHEIGHT
 
-    levelIsComplete = False
+    # Um nível continuado pode já estar resolvido, se o jogo foi fechado na
+    # tela do "solved!".
+    levelIsComplete = isLevelFinished(levelObj, gameStateObj)
     # Track how much the camera has moved
     cameraOffsetX = 0
     cameraOffsetY = 0
+    # A posição da câmera no passo de simulação anterior, para interpolar.
+    prevCameraOffsetX = 0
+    prevCameraOffsetY = 0
+    mapTopLeft = None  # onde o mapa foi desenhado na janela no último quadro
     # Track if the keys to move the camera are being held down
     cameraUp = False
     cameraDown = False
     cameraLeft = False
     cameraRight = False
 
+    heldKeys = set()  # teclas pressionadas agora, para reconhecer as repetições
+    actionQueue = deque()  # movimentos, UNDO e REDO esperando a vez, em ordem
+    slides = []  # os objetos deslizando no movimento atual
+    spriteRects = []  # onde os objetos deslizando foram desenhados na janela
+    timestep = FixedTimestep()
+
     while True:  # main game loop
         # Redefina essas variáveis
-        playerMoveTo = None
         keyPressed = False
+        dirtySpaces = []  # espaços (x, y) do mapa que precisam ser redesenhados
+
+        # O loop só precisa rodar continuamente enquanto a câmera se move, um
+        # movimento está sendo animado ou ainda há algo para desenhar; fora
+        # isso ele espera por eventos. Enquanto uma dica é procurada, o loop
+        # também precisa rodar para mostrar o progresso dela.
+        busy = screenNeedsRedraw or cameraUp or cameraDown or cameraLeft or cameraRight or \
+            len(actionQueue) > 0 or len(slides) > 0 or HINTS.isRunning()
 
-        for event in pygame.event.get():  # event handling loop
+        PROFILER.beginFrame()
+        with PROFILER.section(WAIT):
+            events = getEvents(busy)
+        eventsStart = time.perf_counter()
+
+        for event in events:  # event handling loop
             if event.type == QUIT:
                 # O jogador clicou no "X" no canto da janela
                 terminate()
 
+            elif event.type == VIDEOEXPOSE:
+                # A janela foi descoberta e precisa ser desenhada de novo.
+                screenNeedsRedraw = True
+
             elif event.type == KEYDOWN:
-                # Tecla pressionada
-                keyPressed = True
-                if event.key == K_LEFT:
-                    playerMoveTo = LEFT
-                elif event.key == K_RIGHT:
-                    playerMoveTo = RIGHT
-                elif event.key == K_UP:
-                    playerMoveTo = UP
-                elif event.key == K_DOWN:
-                    playerMoveTo = DOWN
+                # Tecla pressionada. Se ela já estava pressionada, é uma
+                # repetição de uma tecla segurada.
+                isRepeat = event.key in heldKeys
+                heldKeys.add(event.key)
+                if not isRepeat:
+                    keyPressed = True
+                if event.key in (K_LEFT, K_RIGHT, K_UP, K_DOWN):
+                    # Os movimentos esperam na fila até o anterior terminar de
+                    # ser animado. As repetições de uma tecla segurada só
+                    # entram com a fila vazia, para não se acumularem.
+                    if not isRepeat or not actionQueue:
+                        actionQueue.append({K_LEFT: LEFT, K_RIGHT: RIGHT, K_UP: UP, K_DOWN: DOWN}[event.key])
                 # Defina o modo de movimento da câmera.
                 elif event.key == K_a:
                     cameraLeft = True
@@ -188,22 +328,45 @@ def runLevel(levels, levelNum):
                     cameraDown = True
 
                 elif event.key == K_n:
+                    journal.close()
                     return 'next'
                 elif event.key == K_b:
+                    journal.close()
                     return 'back'
                 elif event.key == K_ESCAPE:
                     terminate()  # Esc key quits.
                 elif event.key == K_BACKSPACE:
+                    journal.clear()
                     return 'reset'  # Reset the level
-                elif event.key == K_p:
+                elif event.key in (K_z, K_y):
+                    # Desfaça o último movimento ou refaça o último desfeito.
+                    # Como nos movimentos, as repetições só entram com a fila
+                    # vazia, para não continuar depois de a tecla ser solta.
+                    if not isRepeat or not actionQueue:
+                        actionQueue.append(UNDO if event.key == K_z else REDO)
+                elif event.key == K_h and not levelIsComplete and not isRepeat:
+                    # Procure a próxima jogada a partir da posição atual, em
+                    # outro processo, sem parar o jogo.
+                    HINTS.start(levelObj, gameStateObj)
+                elif event.key == K_p and not isRepeat:
                     # Mude a imagem do player para a próxima
                     currentImage += 1
                     if currentImage >= len(PLAYERIMAGES):
                         # Após a última imagem do player, use a primeira
                         currentImage = 0
-                    mapNeedsRedraw = True
+                    levelView['playerImage'] = currentImage
+                    dirtySpaces.append(cellToXY(board, gameStateObj.player))
+
+            elif event.type == MOUSEBUTTONDOWN and event.button == 1 and mapTopLeft is not None:
+                # Clique em um espaço: o jogador anda até ele pelo caminho mais
+                # curto, ou, se há uma estrela ali ao lado dele, a empurra.
+                mapx = (event.pos[0] - mapTopLeft[0]) // TILEWIDTH
+                mapy = (event.pos[1] - mapTopLeft[1] - TILETOPMARGIN) // TILEFLOORHEIGHT
+                if 0 <= mapx < len(mapObj) and 0 <= mapy < len(mapObj[0]):
+                    actionQueue.append((CLICK, xyToCell(board, mapx, mapy)))
 
             elif event.type == KEYUP:
+                heldKeys.discard(event.key)
                 # Desativar o modo de movimento da câmera
                 if event.key == K_a:
                     cameraLeft = False
@@ -214,172 +377,205 @@ def runLevel(levels, levelNum):
                 elif event.key == K_s:
                     cameraDown = False
 
-        if playerMoveTo != None and not levelIsComplete:
-            # Se o jogador apertou uma tecla para mover, faça o movimento
-            # (se possível) e empurre as estrelas empurráveis.
-            moved = makeMove(mapObj, gameStateObj, playerMoveTo)
-
-            if moved:
-                # incrementar o contador de passos.
-                gameStateObj['stepCounter'] += 1
-                mapNeedsRedraw = True
+        PROFILER.addTime('eventos', time.perf_counter() - eventsStart)
+        simulationStart = time.perf_counter()
+
+        # A simulação avança em passos de SIMULATION_STEP segundos, quantos
+        # couberem no tempo que passou desde o último quadro. Depois de
+        # esperar por eventos, só um passo é feito, para tratar a tecla.
+        if busy:
+            timestep.addFrameTime(FPSCLOCK.get_time() / 1000.0)
+        else:
+            timestep.addFrameTime(timestep.step)
+        while timestep.nextStep():
+            prevCameraOffsetX = cameraOffsetX
+            prevCameraOffsetY = cameraOffsetY
+            cameraStep = CAM_MOVE_SPEED * timestep.step
+            if cameraUp and cameraOffsetY < MAX_CAM_X_PAN:
+                cameraOffsetY = min(MAX_CAM_X_PAN, cameraOffsetY + cameraStep)
+            elif cameraDown and cameraOffsetY > -MAX_CAM_X_PAN:
+                cameraOffsetY = max(-MAX_CAM_X_PAN, cameraOffsetY - cameraStep)
+
+            if cameraLeft and cameraOffsetX < MAX_CAM_Y_PAN:
+                cameraOffsetX = min(MAX_CAM_Y_PAN, cameraOffsetX + cameraStep)
+            elif cameraRight and cameraOffsetX > -MAX_CAM_Y_PAN:
+                cameraOffsetX = max(-MAX_CAM_Y_PAN, cameraOffsetX - cameraStep)
+
+            if slides and slides[0].isFinished(timestep.time):
+                # A animação terminou: desenhe o jogador e a estrela de volta
+                # nos pedaços do mapa.
+                for cell in animatedCells:
+                    dirtySpaces.append(cellToXY(board, cell))
+                animatedCells.clear()
+                slides = []
+
+            if slides or not actionQueue:
+                continue
+            action = actionQueue.popleft()
+            if levelIsComplete:
+                actionQueue.clear()
+                continue
+
+            playerBefore = gameStateObj.player
+            starsBefore = gameStateObj.stars
+            # De onde o jogador e a estrela deslizam: um clique faz vários
+            # movimentos de uma vez, e só o último é animado.
+            slidePlayer = playerBefore
+            slideStars = starsBefore
+            if action == UNDO:
+                changed = history.undo(gameStateObj) is not None
+                if changed:
+                    journal.append(savegame.UNDO_RECORD, gameStateObj, history)
+            elif action == REDO:
+                changed = history.redo(gameStateObj) is not None
+                if changed:
+                    journal.append(savegame.REDO_RECORD, gameStateObj, history)
+            else:
+                if isinstance(action, tuple):
+                    # O caminho é planejado agora, a partir da posição depois
+                    # das ações que estavam na fila antes do clique.
+                    directions = playerRegion.clickPath(gameStateObj, action[1]) or []
+                else:
+                    directions = [action]
+                changed = False
+                with PROFILER.section('makeMove'):
+                    for direction in directions:
+                        playerFrom = gameStateObj.player
+                        starsFrom = gameStateObj.stars
+                        if not makeMove(mapObj, gameStateObj, direction):
+                            break
+                        # Se o jogador apertou uma tecla para mover, o movimento foi
+                        # feito (e a estrela empurrada). incrementar o contador de passos.
+                        changed = True
+                        slidePlayer = playerFrom
+                        slideStars = starsFrom
+                        gameStateObj.stepCounter += 1
+                        history.record(direction, starsFrom != gameStateObj.stars)
+                        journal.append(history.moves[history.position - 1], gameStateObj, history)
+
+            if not changed:
+                continue  # Nada mudou.
+            # A posição mudou, então a dica (pronta ou ainda sendo procurada)
+            # não vale mais.
+            HINTS.cancel()
+
+            # Anime o jogador e a estrela empurrada (se houver) deslizando até
+            # os novos espaços. Só os espaços que eles deixaram ou ocuparam
+            # precisam ser redesenhados.
+            slides = [Slide(PLAYERIMAGES[currentImage], cellToXY(board, slidePlayer),
+                            cellToXY(board, gameStateObj.player), timestep.time, MOVE_DURATION)]
+            animatedCells.add(gameStateObj.player)
+            slideStarCells = bitsToCells(slideStars ^ gameStateObj.stars)
+            if slideStarCells:
+                starFrom, starTo = slideStarCells
+                if not (slideStars >> starFrom) & 1:
+                    starFrom, starTo = starTo, starFrom
+                slides.insert(0, Slide('star', cellToXY(board, starFrom), cellToXY(board, starTo),
+                                       timestep.time, MOVE_DURATION))
+                animatedCells.add(starTo)
+            movedStars = bitsToCells(starsBefore ^ gameStateObj.stars)
+            for cell in movedStars + [playerBefore, slidePlayer, gameStateObj.player]:
+                dirtySpaces.append(cellToXY(board, cell))
 
             if isLevelFinished(levelObj, gameStateObj):
                 # nível for resolvido, devemos mostrar o "solved!" imagem.
                 levelIsComplete = True
                 keyPressed = False
 
-        DISPLAYSURF.fill(BGCOLOR)
-
-        if mapNeedsRedraw:
-            mapSurf = drawMap(mapObj, gameStateObj, levelObj['goals'])
-            mapNeedsRedraw = False
-
-        if cameraUp and cameraOffsetY < MAX_CAM_X_PAN:
-            cameraOffsetY += CAM_MOVE_SPEED
-        elif cameraDown and cameraOffsetY > -MAX_CAM_X_PAN:
-            cameraOffsetY -= CAM_MOVE_SPEED
-
-        if cameraLeft and cameraOffsetX < MAX_CAM_Y_PAN:
-            cameraOffsetX += CAM_MOVE_SPEED
-        elif cameraRight and cameraOffsetX > -MAX_CAM_Y_PAN:
-            cameraOffsetX -= CAM_MOVE_SPEED
-
-        # Ajuste o objeto Rect do mapSurf com base no deslocamento da câmera.
-        mapSurfRect = mapSurf.get_rect()
-        mapSurfRect.center = (HALF_WINWIDTH + cameraOffsetX, HALF_WINHEIGHT + cameraOffsetY)
-
-        # Desenhe mapSurf no objeto DISPLAYSURF Surface.
-        DISPLAYSURF.blit(mapSurf, mapSurfRect)
-
-        DISPLAYSURF.blit(levelSurf, levelRect)
-        stepSurf = BASICFONT.render('Passos: %s' % (gameStateObj['stepCounter']), 1, TEXTCOLOR)
-        stepRect = stepSurf.get_rect()
-        stepRect.bottomleft = (20, WINHEIGHT - 10)
-        DISPLAYSURF.blit(stepSurf, stepRect)
-
+        PROFILER.addTime('simulação', time.perf_counter() - simulationStart)
+
+        # Ajuste o objeto Rect do mapa com base no deslocamento da câmera,
+        # interpolado entre os dois últimos passos da simulação.
+        alpha = timestep.alpha()
+        mapSurfRect = mapView.getRect()
+        mapSurfRect.center = (HALF_WINWIDTH + int(round(prevCameraOffsetX + (cameraOffsetX - prevCameraOffsetX) * alpha)),
+                              HALF_WINHEIGHT + int(round(prevCameraOffsetY + (cameraOffsetY - prevCameraOffsetY) * alpha)))
+        if mapSurfRect.topleft != mapTopLeft:
+            # A câmera se moveu (ou é o primeiro quadro).
+            mapTopLeft = mapSurfRect.topleft
+            screenNeedsRedraw = True
+
+        # Redesenhe apenas os espaços do mapa que mudaram (nos pedaços do mapa
+        # que estão guardados) e anote onde eles ficam na janela.
+        dirtyRects = []
+        for (x, y) in dirtySpaces:
+            spaceRect = pygame.Rect((x * TILEWIDTH, y * TILEFLOORHEIGHT, TILEWIDTH, TILEHEIGHT))
+            mapView.redraw(spaceRect)
+            dirtyRects.append(spaceRect.move(mapSurfRect.topleft))
+
+        # Os objetos deslizando, na posição do instante deste quadro. A área
+        # onde eles estavam no quadro anterior também precisa ser redesenhada.
+        renderTime = timestep.renderTime()
+        sprites = []
+        for slide in slides:
+            x, y = slide.position(renderTime)
+            spriteRect = pygame.Rect((mapSurfRect.left + int(round(x * TILEWIDTH)),
+                                      mapSurfRect.top + int(round(y * TILEFLOORHEIGHT)), TILEWIDTH, TILEHEIGHT))
+            sprites.append((IMAGESDICT[slide.imageName], spriteRect))
+        dirtyRects.extend(spriteRects)
+        spriteRects = [spriteRect for (spriteSurf, spriteRect) in sprites]
+        dirtyRects.extend(spriteRects)
+
+        # O HUD só renderiza o texto de passos de novo quando o número muda, e
+        # anota as áreas que mudaram (a antiga e a nova, pois o texto muda de
+        # tamanho).
+        hudStart = time.perf_counter()
+        hud.setText('steps', 'Passos: %s' % (gameStateObj.stepCounter), bottomleft=(20, WINHEIGHT - 10))
+        if PROFILER.enabled and PROFILER.frameCount % PROFILEROVERLAYINTERVAL == 0:
+            hud.setText('profiler', PROFILER.overlayText(PROFILEROVERLAYFRAMES), topleft=(10, 10))
+        HINTS.poll()
+        hintText = getHintText(HINTS)
+        if hintText is None:
+            hud.remove('hint')
+        else:
+            hud.setText('hint', hintText, bottomleft=(20, WINHEIGHT - 60))
         if levelIsComplete:
             # for resolvido, mostre a opção "solved!" imagem até o player pressionou uma tecla.
-            solvedRect = IMAGESDICT['solved'].get_rect()
-            solvedRect.center = (HALF_WINWIDTH, HALF_WINHEIGHT)
-            DISPLAYSURF.blit(IMAGESDICT['solved'], solvedRect)
+            hud.setImage('solved', IMAGESDICT['solved'], center=(HALF_WINWIDTH, HALF_WINHEIGHT))
 
             if keyPressed:
+                journal.clear()
                 return 'solved'
-
-        pygame.display.update()  # desenhe DISPLAYSURF na tela.
-        FPSCLOCK.tick()
-
-
-def isWall(mapObj, x, y):
-    """Retorna True se a posição (x, y) em
-         o mapa é uma parede; caso contrário, retorne False."""
-    if x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
-        return False  # x e y não estão realmente no mapa.
-    elif mapObj[x][y] in ('#', 'x'):
-        return True  # parede está bloqueando
-    return False
-
-
-def decorateMap(mapObj, startxy):
-    """Faz uma cópia do objeto de mapa fornecido e o modifica.
-         Aqui está o que é feito para isso:
-             * Paredes que são cantos são transformadas em peças de canto.
-             * É feita a distinção entre os pisos externo e interno.
-             * Decorações de árvores/pedras são adicionadas aleatoriamente aos ladrilhos externos.
-
-         Retorna o objeto de mapa decorado."""
-
-    startx, starty = startxy  # Syntactic sugar
-
-    # Copie o objeto do mapa para não modificar o original passado
-    mapObjCopy = copy.deepcopy(mapObj)
-
-    # Remova os caracteres que não são da parede dos dados do mapa
-    for x in range(len(mapObjCopy)):
-        for y in range(len(mapObjCopy[0])):
-            if mapObjCopy[x][y] in ('$', '.', '@', '+', '*'):
-                mapObjCopy[x][y] = ' '
-
-    # Preenchimento de inundação para determinar os pisos internos/externos.
-    floodFill(mapObjCopy, startx, starty, ' ', 'o')
-
-    # Converta as paredes adjacentes em ladrilhos de canto.
-    for x in range(len(mapObjCopy)):
-        for y in range(len(mapObjCopy[0])):
-
-            if mapObjCopy[x][y] == '#':
-                if (isWall(mapObjCopy, x, y - 1) and isWall(mapObjCopy, x + 1, y)) or \
-                        (isWall(mapObjCopy, x + 1, y) and isWall(mapObjCopy, x, y + 1)) or \
-                        (isWall(mapObjCopy, x, y + 1) and isWall(mapObjCopy, x - 1, y)) or \
-                        (isWall(mapObjCopy, x - 1, y) and isWall(mapObjCopy, x, y - 1)):
-                    mapObjCopy[x][y] = 'x'
-
-            elif mapObjCopy[x][y] == ' ' and random.randint(0, 99) < OUTSIDE_DECORATION_PCT:
-                mapObjCopy[x][y] = random.choice(list(OUTSIDEDECOMAPPING.keys()))
-
-    return mapObjCopy
-
-
-def isBlocked(mapObj, gameStateObj, x, y):
-    """Retorna True se a posição (x, y) no mapa for
-         bloqueado por uma parede ou estrela, caso contrário, retorne False."""
-
-    if isWall(mapObj, x, y):
-        return True
-    elif x < 0 or x >= len(mapObj) or y < 0 or y >= len(mapObj[x]):
-        return True  # x e y não estão realmente no mapa.
-    elif (x, y) in gameStateObj['stars']:
-        return True  # uma estrela está bloqueando
-
-    return False
-
-
-def makeMove(mapObj, gameStateObj, playerMoveTo):
-    """Dado um objeto de mapa e estado do jogo, veja se é possível o
-         jogador para fazer o movimento dado. Se for, altere a configuração do player.
-         posição (e a posição de qualquer estrela empurrada). Caso contrário, não faça nada.
-
-         Retorna True se o jogador se moveu, caso contrário, False."""
-
-    # Certifique-se de que o jogador possa se mover na direção que deseja.
-    playerx, playery = gameStateObj['player']
-
-    # Esta variável é "syntactic sugar". Digitar "stars" é mais
-    # legível do que digitar "gameStateObj['stars']" em nosso código.
-    stars = gameStateObj['stars']
-
-    # O código para lidar com cada uma das direções é tão semelhante à parte
-    # de adicionar ou subtrair 1 às coordenadas x/y. Podemos
-    # simplifique usando as variáveis xOffset e yOffset.
-    if playerMoveTo == UP:
-        xOffset = 0
-        yOffset = -1
-    elif playerMoveTo == RIGHT:
-        xOffset = 1
-        yOffset = 0
-    elif playerMoveTo == DOWN:
-        xOffset = 0
-        yOffset = 1
-    elif playerMoveTo == LEFT:
-        xOffset = -1
-        yOffset = 0
-
-    # Veja se o jogador pode se mover nessa direção.
-    if isWall(mapObj, playerx + xOffset, playery + yOffset):
-        return False
-    else:
-        if (playerx + xOffset, playery + yOffset) in stars:
-            # Há uma estrela no caminho, veja se o jogador pode empurrá-la.
-            if not isBlocked(mapObj, gameStateObj, playerx + (xOffset * 2), playery + (yOffset * 2)):
-                # Mova a estrela.
-                ind = stars.index((playerx + xOffset, playery + yOffset))
-                stars[ind] = (stars[ind][0] + xOffset, stars[ind][1] + yOffset)
-            else:
-                return False
-        # Mover o jogador para cima
-        gameStateObj['player'] = (playerx + xOffset, playery + yOffset)
-        return True
+        dirtyRects.extend(hud.takeDirtyRects())
+        PROFILER.addTime('hud', time.perf_counter() - hudStart)
+
+        if screenNeedsRedraw:
+            # Desenhe a janela inteira: a câmera se moveu ou é o primeiro quadro.
+            with PROFILER.section('composição'):
+                drawScreenRects([DISPLAYSURF.get_rect()], mapView, mapSurfRect, sprites, hud)
+            with PROFILER.section('display.update'):
+                pygame.display.update()  # desenhe DISPLAYSURF na tela.
+            RECORDER.capture(DISPLAYSURF)
+            screenNeedsRedraw = False
+        elif dirtyRects:
+            # Atualize na tela só as áreas que mudaram.
+            screenRect = DISPLAYSURF.get_rect()
+            dirtyRects = [rect.clip(screenRect) for rect in dirtyRects]
+            with PROFILER.section('composição'):
+                drawScreenRects(dirtyRects, mapView, mapSurfRect, sprites, hud)
+            with PROFILER.section('display.update'):
+                pygame.display.update(dirtyRects)
+            RECORDER.capture(DISPLAYSURF, dirtyRects)
+        PROFILER.endFrame()
+
+
+def getHintText(hintEngine):
+    """Retorna o texto que o HUD mostra para a dica, ou None se não há dica."""
+    if hintEngine.status == hints.SEARCHING:
+        return 'Dica: procurando... (%s posições)' % (hintEngine.nodesExpanded)
+    elif hintEngine.status == hints.FOUND:
+        pushLetter = hintEngine.hint[-1]
+        return 'Dica: empurre uma estrela %s (caminho: %s)' % (HINTDIRECTIONNAMES[pushLetter.lower()],
+                                                               hintEngine.hint)
+    elif hintEngine.status == hints.SOLVED:
+        return 'Dica: o nível já está resolvido.'
+    elif hintEngine.status == hints.UNSOLVABLE:
+        return 'Dica: não há solução a partir daqui. Desfaça alguns movimentos.'
+    elif hintEngine.status == hints.LIMIT:
+        return 'Dica: nenhuma jogada encontrada em %s segundos.' % (hintEngine.timeLimit)
+    elif hintEngine.status == hints.FAILED:
+        return 'Dica: a busca falhou.'
+    return None
 
 
 def startScreen():
@@ -399,7 +595,9 @@ def startScreen():
     instructionText = [
         'Empurre as estrelas sobre as marcas.',
         'Teclas de seta para mover, WASD para controle da câmera, P para mudar de caractere.',
-        'Backspace para redefinir o nível, Esc para sair.',
+        'Backspace para redefinir o nível, Z para desfazer, Y para refazer, Esc para sair.',
+        'H para pedir uma dica da próxima jogada.',
+        'Clique em um espaço para andar até ele, ou em uma estrela ao lado para empurrá-la.',
         'N para o próximo nível, B para voltar um nível.'
     ]
 
@@ -419,210 +617,356 @@ def startScreen():
         topCoord += instRect.height  # Ajuste para a altura da linha.
         DISPLAYSURF.blit(instSurf, instRect)
 
+    # Exiba o conteúdo do DISPLAYSURF na tela real.
+    pygame.display.update()
+    RECORDER.capture(DISPLAYSURF)
+
     while True:  # Loop principal para a tela inicial.
-        for event in pygame.event.get():
+        # Nada se mexe nesta tela, então apenas espere pelo próximo evento.
+        for event in getEvents(False):
             if event.type == QUIT:
                 terminate()
+            elif event.type == VIDEOEXPOSE:
+                # A janela foi descoberta e precisa ser mostrada de novo.
+                pygame.display.update()
             elif event.type == KEYDOWN:
                 if event.key == K_ESCAPE:
                     terminate()
                 return  # usuário pressionou uma tecla, então retorne.
 
-        # Exiba o conteúdo do DISPLAYSURF na tela real.
-        pygame.display.update()
-        FPSCLOCK.tick()
-
-
-def readLevelsFile(filename):
-    assert os.path.exists(filename), 'Arquivo dos Levels nao foi encontrado: %s' % (filename)
-    mapFile = open(filename, 'r')
-    # Cada nível deve terminar com uma linha em branco
-    content = mapFile.readlines() + ['\r\n']
-    mapFile.close()
-
-    levels = []  # Irá conter uma lista de objetos de nível.
-    levelNum = 0
-    mapTextLines = []  # contém as linhas para o mapa de um único nível.
-    mapObj = []  # o objeto de mapa criado a partir dos dados em mapTextLines
-
-    for lineNum in range(len(content)):
-        # Processe cada linha que estava no arquivo de nível.
-        line = content[lineNum].rstrip('\r\n')
-
-        if ';' in line:
-            # Ignore as linhas com ;, são comentários no arquivo de levels.
-            line = line[:line.find(';')]
-
-        if line != '':
-            # Esta linha faz parte do mapa.
-            mapTextLines.append(line)
-        elif line == '' and len(mapTextLines) > 0:
-            # Uma linha em branco indica o final do mapa de um nível no arquivo.
-            # Converta o texto em mapTextLines em um objeto nivelado.
-
-            # Encontre a linha mais longa no mapa.
-            maxWidth = -1
-            for i in range(len(mapTextLines)):
-                if len(mapTextLines[i]) > maxWidth:
-                    maxWidth = len(mapTextLines[i])
-            # Adicione espaços ao final das linhas mais curtas. este
-            # garante que o mapa seja retangular.
-            for i in range(len(mapTextLines)):
-                mapTextLines[i] += ' ' * (maxWidth - len(mapTextLines[i]))
-
-            # Converter mapTextLines em um objeto de mapa.
-            for x in range(len(mapTextLines[0])):
-                mapObj.append([])
-
-            # Percorra os espaços no mapa e encontre @,. E $
-            # caracteres para o estado inicial do jogo.
-            for y in range(len(mapTextLines)):
-                for x in range(maxWidth):
-                    mapObj[x].append(mapTextLines[y][x])
-
-            startx = None  # X e y para a posição inicial do jogador
-            starty = None
-            goals = []  # lista de (x, y) tuplas para cada objetivo.
-            stars = []  # lista de (x, y) para a posição inicial de cada estrela.
-
-            for x in range(maxWidth):
-                for y in range(len(mapObj[x])):
-                    if mapObj[x][y] in ('@', '+'):
-                        # '@' é jogador, '+' é jogador e objetivo
-                        startx = x
-                        starty = y
-
-                    if mapObj[x][y] in ('.', '+', '*'):
-                        # '.' é objetivo, '*' é estrela e objetivo
-                        goals.append((x, y))
-
-                    if mapObj[x][y] in ('$', '*'):
-                        # '$' é uma estrela
-                        stars.append((x, y))
-
-            # Verificações básicas de sanidade do projeto:
-            assert startx != None and starty != None, 'O nível %s (em torno da linha %s) em %s está faltando um "@" ou "+" para marcar o ponto inicial.' % (
-            levelNum + 1, lineNum, filename)
-            assert len(goals) > 0, 'O nível %s (em torno da linha %s) em %s deve ter pelo menos uma meta.' % (
-            levelNum + 1, lineNum, filename)
-            assert len(stars) >= len(
-                goals), 'O nível %s (em torno da linha %s) em %s é impossível de resolver. Possui %s objetivos, mas apenas %s estrelas.' % (
-            levelNum + 1, lineNum, filename, len(goals), len(stars))
-
-            # Criar um objeto nivelado e iniciar o estado do jogo.
-            gameStateObj = {
-                'player': (startx, starty),
-                'stepCounter': 0,
-                'stars': stars
-            }
-
-            levelObj = {
-                'width': maxWidth,
-                'height': len(mapObj),
-                'mapObj': mapObj,
-                'goals': goals,
-                'startState': gameStateObj
-            }
-
-            levels.append(levelObj)
-
-            # Redefina as variáveis para ler o próximo mapa.
-            mapTextLines = []
-            mapObj = []
-            gameStateObj = {}
-            levelNum += 1
-
-    return levels
-
-
-def floodFill(mapObj, x, y, oldCharacter, newCharacter):
-    """Altera qualquer valor que corresponda a oldCharacter no objeto de mapa para
-         newCharacter na posição (x, y) e faz o mesmo para o
-         posições à esquerda, direita, baixo e cima de (x, y), recursivamente."""
-
-    # Neste jogo, o algoritmo de preenchimento cria o interior / o exterior
-    # distinção de piso. Esta é uma função "recursiva".
-    # Para obter mais informações sobre o algoritmo Flood Fill, consulte:
-    #   http://en.wikipedia.org/wiki/Flood_fill
-    if mapObj[x][y] == oldCharacter:
-        mapObj[x][y] = newCharacter
-
-    if x < len(mapObj) - 1 and mapObj[x + 1][y] == oldCharacter:
-        floodFill(mapObj, x + 1, y, oldCharacter, newCharacter)
-
-    if x > 0 and mapObj[x - 1][y] == oldCharacter:
-        floodFill(mapObj, x - 1, y, oldCharacter, newCharacter)
-
-    if y < len(mapObj[x]) - 1 and mapObj[x][y + 1] == oldCharacter:
-        floodFill(mapObj, x, y + 1, oldCharacter, newCharacter)
-
-    if y > 0 and mapObj[x][y - 1] == oldCharacter:
-        floodFill(mapObj, x, y - 1, oldCharacter, newCharacter)
-
-
-def drawMap(mapObj, gameStateObj, goals):
-    """Desenha o mapa para um objeto Surface, incluindo o jogador e
-         estrelas. Esta função não chama pygame.display.update (), nem
-         ele desenha o texto "Nível" e "Etapas" no canto."""
-
-    # mapSurf será o único objeto Surface que os blocos serão desenhados
-    # on, para que seja fácil posicionar o mapa inteiro no DISPLAYSURF
-    # Objeto de superfície. Primeiro, a largura e a altura devem ser calculadas.
-    mapSurfWidth = len(mapObj) * TILEWIDTH
-    mapSurfHeight = (len(mapObj[0]) - 1) * TILEFLOORHEIGHT + TILEHEIGHT
-    mapSurf = pygame.Surface((mapSurfWidth, mapSurfHeight))
-    mapSurf.fill(BGCOLOR)
-
-    # Desenhe os sprites de ladrilhos nessa superfície.
-    for x in range(len(mapObj)):
-        for y in range(len(mapObj[x])):
-            spaceRect = pygame.Rect((x * TILEWIDTH, y * TILEFLOORHEIGHT, TILEWIDTH, TILEHEIGHT))
 
-            if mapObj[x][y] in TILEMAPPING:
-                baseTile = TILEMAPPING[mapObj[x][y]]
-            elif mapObj[x][y] in OUTSIDEDECOMAPPING:
-                baseTile = TILEMAPPING[' ']
+def getEvents(busy):
+    """Retorna a lista de eventos para a próxima iteração de um loop do jogo.
+
+         Se busy for True (a câmera está se movendo, por exemplo), o loop é
+         limitado a FPS quadros por segundo. Caso contrário nada muda na tela
+         até o jogador fazer algo, então a função dorme em pygame.event.wait()
+         até chegar um evento, em vez de gastar a CPU girando o loop."""
+
+    if busy:
+        FPSCLOCK.tick(FPS)
+        return pygame.event.get()
+
+    events = [pygame.event.wait()]
+    events.extend(pygame.event.get())
+    FPSCLOCK.tick()  # Reinicia a contagem de tempo do relógio após a espera.
+    return events
 
-            # Primeiro desenhe o piso de base/parede.
-            mapSurf.blit(baseTile, spaceRect)
 
-            if mapObj[x][y] in OUTSIDEDECOMAPPING:
-                # Desenhe qualquer decoração de árvore/pedra que esteja nesse ladrilho.
-                mapSurf.blit(OUTSIDEDECOMAPPING[mapObj[x][y]], spaceRect)
-            elif (x, y) in gameStateObj['stars']:
-                if (x, y) in goals:
-                    # Um objetivo E estrela estão neste espaço, primeiro o objetivo.
-                    mapSurf.blit(IMAGESDICT['covered goal'], spaceRect)
-                # Em seguida, desenhe o sprite estrela.
-                mapSurf.blit(IMAGESDICT['star'], spaceRect)
-            elif (x, y) in goals:
-                # Desenhe um objetivo sem uma estrela nele.
-                mapSurf.blit(IMAGESDICT['uncovered goal'], spaceRect)
+def getLevelView(levels, levelNum):
+    """Retorna o dicionário com o mapa decorado do nível e os seus pedaços
+         desenhados (um ChunkedMapSurface), criando-o se ele não está entre
+         os MAXCACHEDLEVELS níveis guardados.
 
-            # Último desenhe o jogador no tabuleiro.
-            if (x, y) == gameStateObj['player']:
-                # Nota: o valor "currentImage" refere-se
-                # para uma tecla em "PLAYERIMAGES" que possui o
-                # imagem específica do jogador que queremos mostrar.
-                mapSurf.blit(PLAYERIMAGES[currentImage], spaceRect)
+         As decorações são sorteadas com a semente de levelRandom(), então o
+         nível tem sempre a mesma aparência. Os pedaços mostram gameState, o
+         último estado passado para showGameState()."""
 
-    return mapSurf
+    if levelNum in LEVELVIEWS:
+        LEVELVIEWS.move_to_end(levelNum)
+        return LEVELVIEWS[levelNum]
 
+    levelObj = levels[levelNum]
+    startState = levelObj['startState']
+    mapObj = decorateMap(levelObj['mapObj'], cellToXY(startState.board, startState.player),
+                         levelRandom(levelObj['mapObj']))
+    levelView = {
+        'mapObj': mapObj,
+        'goals': set(levelObj['goals']),
+        'gameState': startState,
+        'hiddenCells': set(),  # células cujo jogador ou estrela não são desenhados
+        'playerImage': currentImage  # a imagem do jogador nos pedaços
+    }
+    levelView['mapView'] = ChunkedMapSurface(
+        len(mapObj) * TILEWIDTH, (len(mapObj[0]) - 1) * TILEFLOORHEIGHT + TILEHEIGHT, CHUNKWIDTH, CHUNKHEIGHT,
+        lambda surface, area, origin: drawMapArea(surface, levelView['mapObj'], levelView['gameState'],
+                                                  levelView['goals'], area, origin, levelView['hiddenCells']),
+        MAXCHUNKS)
+
+    LEVELVIEWS[levelNum] = levelView
+    if len(LEVELVIEWS) > MAXCACHEDLEVELS:
+        LEVELVIEWS.popitem(last=False)
+    return levelView
+
+
+def showGameState(levelView, gameStateObj):
+    """Faz os pedaços guardados de levelView mostrarem gameStateObj,
+         redesenhando só os espaços que são diferentes do estado mostrado
+         antes (as estrelas e o jogador que mudaram de lugar, e os que
+         estavam escondidos por uma animação)."""
+
+    oldState = levelView['gameState']
+    board = gameStateObj.board
+    cells = set(bitsToCells(oldState.stars ^ gameStateObj.stars))
+    cells.update(levelView['hiddenCells'])
+    if oldState.player != gameStateObj.player or levelView['playerImage'] != currentImage:
+        cells.update((oldState.player, gameStateObj.player))
+
+    levelView['gameState'] = gameStateObj
+    levelView['hiddenCells'].clear()
+    levelView['playerImage'] = currentImage
+    for cell in cells:
+        x, y = cellToXY(board, cell)
+        levelView['mapView'].redraw(pygame.Rect((x * TILEWIDTH, y * TILEFLOORHEIGHT, TILEWIDTH, TILEHEIGHT)))
+
+
+def drawMapArea(surface, mapObj, gameStateObj, goals, area, origin=(0, 0), hiddenCells=()):
+    """Desenha em surface só a parte area (um Rect nas coordenadas do mapa)
+         do mapa, onde o canto superior esquerdo de surface é o ponto origin
+         do mapa. goals é um conjunto de tuplas (x, y). O jogador e as estrelas
+         nas células de hiddenCells não são desenhados (eles estão sendo
+         animados por cima do mapa).
+
+         Os ladrilhos são mais altos que o piso, então cada um cobre parte dos
+         ladrilhos das linhas vizinhas da mesma coluna. Por isso a área é limpa
+         e todos os espaços que a cobrem são desenhados de novo, de cima para
+         baixo, com o recorte limitado a essa área."""
+
+    PROFILER.count('áreas do mapa desenhadas')
+    drawStart = time.perf_counter()
+    originx, originy = origin
+    surface.set_clip(area.move(-originx, -originy))
+    surface.fill(BGCOLOR)
+
+    firstX = max(0, area.left // TILEWIDTH)
+    lastX = min(len(mapObj) - 1, (area.right - 1) // TILEWIDTH)
+    # O ladrilho da linha y vai de y * TILEFLOORHEIGHT até TILEHEIGHT pixels abaixo.
+    firstY = max(0, (area.top - TILEHEIGHT) // TILEFLOORHEIGHT + 1)
+    lastY = min(len(mapObj[0]) - 1, (area.bottom - 1) // TILEFLOORHEIGHT)
+    for x in range(firstX, lastX + 1):
+        for y in range(firstY, lastY + 1):
+            drawMapSpace(surface, mapObj, gameStateObj, goals, x, y, origin, hiddenCells)
+    surface.set_clip(None)
+    PROFILER.count('ladrilhos desenhados', max(0, lastX - firstX + 1) * max(0, lastY - firstY + 1))
+    PROFILER.addTime('drawMap', time.perf_counter() - drawStart)
+
+
+def drawMapSpace(mapSurf, mapObj, gameStateObj, goals, x, y, origin=(0, 0), hiddenCells=()):
+    """Desenha o espaço (x, y) do mapa em mapSurf: o piso ou parede, a
+         decoração, o objetivo, a estrela e o jogador, nesta ordem. goals é
+         um conjunto de tuplas (x, y) e origin é o ponto do mapa que fica no
+         canto superior esquerdo de mapSurf. Se a célula está em hiddenCells,
+         a estrela e o jogador não são desenhados."""
+
+    spaceRect = pygame.Rect((x * TILEWIDTH - origin[0], y * TILEFLOORHEIGHT - origin[1], TILEWIDTH, TILEHEIGHT))
+    cell = xyToCell(gameStateObj.board, x, y)
+
+    if mapObj[x][y] in TILEMAPPING:
+        baseTile = TILEMAPPING[mapObj[x][y]]
+    elif mapObj[x][y] in OUTSIDEDECOMAPPING:
+        baseTile = TILEMAPPING[' ']
+
+    # Primeiro desenhe o piso de base/parede.
+    mapSurf.blit(baseTile, spaceRect)
+
+    if mapObj[x][y] in OUTSIDEDECOMAPPING:
+        # Desenhe qualquer decoração de árvore/pedra que esteja nesse ladrilho.
+        mapSurf.blit(OUTSIDEDECOMAPPING[mapObj[x][y]], spaceRect)
+    elif gameStateObj.hasStar(cell) and cell not in hiddenCells:
+        if (x, y) in goals:
+            # Um objetivo E estrela estão neste espaço, primeiro o objetivo.
+            mapSurf.blit(IMAGESDICT['covered goal'], spaceRect)
+        # Em seguida, desenhe o sprite estrela.
+        mapSurf.blit(IMAGESDICT['star'], spaceRect)
+    elif (x, y) in goals:
+        # Desenhe um objetivo sem uma estrela nele.
+        mapSurf.blit(IMAGESDICT['uncovered goal'], spaceRect)
+
+    # Último desenhe o jogador no tabuleiro.
+    if cell == gameStateObj.player and cell not in hiddenCells:
+        # Nota: o valor "currentImage" refere-se
+        # para uma tecla em "PLAYERIMAGES" que possui o
+        # imagem específica do jogador que queremos mostrar.
+        mapSurf.blit(IMAGESDICT[PLAYERIMAGES[currentImage]], spaceRect)
+
+
+def drawScreenRects(rects, mapView, mapSurfRect, sprites, hud):
+    """Compõe apenas as áreas rects da janela: a cor de fundo, os pedaços do
+         mapa (um ChunkedMapSurface) que aparecem ali, os objetos que estão
+         deslizando (uma lista de pares (Surface, Rect)) e o HUD por cima."""
+
+    for rect in rects:
+        DISPLAYSURF.set_clip(rect)
+        DISPLAYSURF.fill(BGCOLOR)
+        mapView.draw(DISPLAYSURF, mapSurfRect.topleft, rect)
+        for spriteSurf, spriteRect in sprites:
+            if spriteRect.colliderect(rect):
+                DISPLAYSURF.blit(spriteSurf, spriteRect)
+        hud.draw(DISPLAYSURF, rect)
+    DISPLAYSURF.set_clip(None)
+
+
+def reportSolveResult(levelObj, levelNum, result):
+    """Confere e imprime o resultado de starsolver.solve() para um nível."""
+
+    if result['status'] == 'solved':
+        # Confira a solução com as mesmas regras usadas durante o jogo.
+        assert playSolution(levelObj, result['solution']), 'Solução inválida para o nível %s.' % (levelNum)
+        print('Level %s: resolvido com %s passos e %s empurrões (%s nós, %.2fs)' % (
+            levelNum, result['moves'], result['pushes'], result['nodesExpanded'], result['seconds']))
+        print(result['solution'])
+    elif result['status'] == 'limit' and result['nodesExpanded'] is None:
+        print('Level %s: limite de tempo atingido, processo terminado (%.2fs)' % (levelNum, result['seconds']))
+    elif result['status'] == 'limit':
+        print('Level %s: limite atingido (%s nós, %.2fs)' % (
+            levelNum, result['nodesExpanded'], result['seconds']))
+    elif result['status'] == 'memory':
+        print('Level %s: limite de memória atingido (%.2fs)' % (levelNum, result['seconds']))
+    elif result['status'] == 'crashed':
+        print('Level %s: o processo terminou sem resultado (%.2fs)' % (levelNum, result['seconds']))
+    else:
+        print('Level %s: sem solução (%s nós, %.2fs)' % (
+            levelNum, result['nodesExpanded'], result['seconds']))
+
+
+def solveLevels(filename, levelNums, mode, timeLimit, tableFilename=None):
+    """Resolve os níveis do arquivo sem abrir a janela do jogo e imprime o
+         resultado de cada um. levelNums é uma lista de números de nível
+         (começando em 1), ou None para todos os níveis do arquivo.
+
+         Com tableFilename, os estados da busca de cada nível ficam em disco
+         (veja disksolver.solveOnDisk()), nos arquivos tableFilename.N, e
+         rodar de novo continua as buscas que não terminaram."""
+
+    levels = openLevelsFile(filename)
+    if levelNums is None:
+        levelNums = range(1, len(levels) + 1)
+
+    for levelNum in levelNums:
+        assert 1 <= levelNum <= len(levels), 'O nível %s não existe em %s.' % (levelNum, filename)
+        if tableFilename:
+            result = disksolver.solveOnDisk(levels[levelNum - 1], '%s.%s' % (tableFilename, levelNum),
+                                            mode=mode, timeLimit=timeLimit)
+        else:
+            result = starsolver.solve(levels[levelNum - 1], mode=mode, timeLimit=timeLimit)
+        reportSolveResult(levels[levelNum - 1], levelNum, result)
+
+
+def checkSolutionFile(filename, levelNum, solutionText):
+    """Reproduz sem janela uma solução LURD (o texto da solução ou o nome de
+         um arquivo com ela) no nível levelNum e imprime se ela é válida, os
+         passos e empurrões, e o passo em que ela falha, se falhar."""
+
+    levels = openLevelsFile(filename)
+    assert 1 <= levelNum <= len(levels), 'O nível %s não existe em %s.' % (levelNum, filename)
+    if os.path.isfile(solutionText):
+        with open(solutionText) as solutionFile:
+            solutionText = solutionFile.read()
+    try:
+        solution = replay.expandLURD(solutionText)
+    except ValueError as error:
+        # Um caractere que não é da notação LURD também é uma solução inválida.
+        print('Level %s: solução inválida. %s' % (levelNum, error))
+        return False
 
-def isLevelFinished(levelObj, gameStateObj):
-    """Retorna True se todos os objetivos tiverem estrelas."""
+    startTime = time.perf_counter()
+    levelReplay = replay.Replay(levels[levelNum - 1], solution)
+    seconds = time.perf_counter() - startTime
 
-    for goal in levelObj['goals']:
-        if goal not in gameStateObj['stars']:
-            # Encontrou um espaço com um objetivo, mas nenhuma estrela nele.
-            return False
-    return True
+    if levelReplay.isSolution():
+        print('Level %s: solução válida com %s passos e %s empurrões (%.3fs)' % (
+            levelNum, levelReplay.length, levelReplay.pushes, seconds))
+    elif levelReplay.isValid():
+        print('Level %s: os %s passos são válidos, mas o nível não termina resolvido.' % (
+            levelNum, levelReplay.length))
+    else:
+        print('Level %s: solução inválida. %s' % (levelNum, levelReplay.error))
+    return levelReplay.isSolution()
+
+
+def batchSolveLevels(filename, levelNums, mode, timeLimit, memoryLimitMB, processes):
+    """Como solveLevels(), mas resolve os níveis em paralelo em vários
+         processos e termina com uma tabela de resumo de todos os níveis. Sem
+         timeLimit, cada nível tem batchsolver.DEFAULT_TIME_LIMIT segundos."""
+
+    levels = openLevelsFile(filename)
+    if levelNums is None:
+        levelNums = range(1, len(levels) + 1)
+    for levelNum in levelNums:
+        assert 1 <= levelNum <= len(levels), 'O nível %s não existe em %s.' % (levelNum, filename)
+
+    if timeLimit is None:
+        timeLimit = batchsolver.DEFAULT_TIME_LIMIT
+    results = batchsolver.solveInParallel(
+        levels, levelNums, mode=mode, timeLimit=timeLimit, memoryLimitMB=memoryLimitMB,
+        processes=processes,
+        callback=lambda result: reportSolveResult(levels[result['levelNum'] - 1], result['levelNum'], result))
+
+    print()
+    print('%6s  %-10s %8s %9s %10s %9s %9s' % ('Level', 'Status', 'Passos', 'Empurrões', 'Nós', 'Tempo', 'Memória'))
+    for result in results:
+        print('%6s  %-10s %8s %9s %10s %8.2fs %7sMB' % (
+            result['levelNum'], result['status'],
+            '-' if result['moves'] is None else result['moves'],
+            '-' if result['pushes'] is None else result['pushes'],
+            '-' if result['nodesExpanded'] is None else result['nodesExpanded'],
+            result['seconds'],
+            '-' if result['peakMemoryMB'] is None else int(result['peakMemoryMB'])))
+    solved = len([result for result in results if result['status'] == 'solved'])
+    print('%s de %s níveis resolvidos.' % (solved, len(results)))
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='Star Pusher')
+    parser.add_argument('levelsFile', nargs='?', default='Levels.txt',
+                        help='arquivo de níveis usado por --solve')
+    parser.add_argument('--solve', action='store_true',
+                        help='resolve os níveis sem abrir a janela do jogo')
+    parser.add_argument('--level', type=int, action='append', dest='levels',
+                        help='número do nível a resolver (pode ser repetido)')
+    parser.add_argument('--moves', action='store_const', const=starsolver.MOVES,
+                        default=starsolver.PUSHES, dest='mode',
+                        help='minimiza os passos em vez dos empurrões')
+    parser.add_argument('--time-limit', type=float, default=None, dest='timeLimit',
+                        help='tempo máximo de busca por nível, em segundos (em --batch, o padrão é %s)'
+                             % (batchsolver.DEFAULT_TIME_LIMIT))
+    parser.add_argument('--table', dest='tableFilename', metavar='ARQUIVO',
+                        help='guarda os estados de --solve em disco, para níveis que não cabem na memória; '
+                             'rodar de novo continua a busca')
+    parser.add_argument('--batch', action='store_true',
+                        help='resolve os níveis em paralelo, um processo por núcleo')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='número de processos usados por --batch')
+    parser.add_argument('--memory-limit', type=int, default=batchsolver.DEFAULT_MEMORY_LIMIT_MB,
+                        dest='memoryLimitMB', help='memória máxima por nível em --batch, em MB')
+    parser.add_argument('--check', dest='checkSolution', metavar='SOLUÇÃO',
+                        help='confere uma solução LURD (o texto ou um arquivo) no nível de --level')
+    parser.add_argument('--profile', action='store_true',
+                        help='mede o tempo de cada quadro e o mostra na tela')
+    parser.add_argument('--profile-output', dest='profileOutput',
+                        help='grava as medições de --profile neste arquivo ao sair (.json ou .csv)')
+    parser.add_argument('--record', dest='recordOutput', metavar='SAÍDA',
+                        help='grava a partida em um diretório de PNGs ou, com o ffmpeg, em um vídeo (.mp4, ...)')
+    return parser.parse_args()
 
 
 def terminate():
+    if PROFILER.enabled:
+        if PROFILEOUTPUT:
+            PROFILER.export(PROFILEOUTPUT)
+        else:
+            # Sem arquivo, mostre ao menos o resumo dos tempos do quadro.
+            frameTimes = PROFILER.summary().get(FRAME)
+            if frameTimes:
+                print('quadro: média %.2f ms, p50 %.2f ms, p99 %.2f ms' % (
+                    frameTimes['media'] * 1000, frameTimes['p50'] * 1000, frameTimes['p99'] * 1000))
+    # Espere a gravação terminar de codificar os quadros que estão na fila.
+    RECORDER.stop()
+    if RECORDER.error is not None:
+        print('A gravação foi interrompida: %s' % (RECORDER.error))
     pygame.quit()
     sys.exit()
 
 
 if __name__ == '__main__':
-    main()
+    args = parseArgs()
+    if args.checkSolution:
+        assert args.levels and len(args.levels) == 1, '--check precisa de exatamente um --level.'
+        sys.exit(0 if checkSolutionFile(args.levelsFile, args.levels[0], args.checkSolution) else 1)
+    elif args.batch:
+        batchSolveLevels(args.levelsFile, args.levels, args.mode, args.timeLimit,
+                         args.memoryLimitMB, args.processes)
+    elif args.solve:
+        solveLevels(args.levelsFile, args.levels, args.mode, args.timeLimit, args.tableFilename)
+    else:
+        main(args.profile, args.profileOutput, args.recordOutput)
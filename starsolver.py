@@ -0,0 +1,460 @@
+"""Resolvedor automático do Star Pusher.
+
+Este módulo não importa o pygame: ele recebe os objetos de nível retornados
+por readLevelsFile() e procura uma solução com A* no espaço de empurrões,
+usando como heurística um limite inferior baseado no emparelhamento de
+custo mínimo entre estrelas e objetivos. A solução é devolvida na notação
+LURD (letras minúsculas para passos, maiúsculas para empurrões)."""
+
+import heapq
+import time
+from collections import deque
+
+from deadlock import isDeadlockedPush
+from gamestate import DOWN, LEFT, RIGHT, UP
+
+# Letra da notação LURD para cada direção. Passos usam a letra minúscula e
+# empurrões a letra maiúscula.
+LURDLETTERS = {UP: 'u', DOWN: 'd', LEFT: 'l', RIGHT: 'r'}
+
+# Custo usado para posições de onde uma estrela nunca chega a um objetivo.
+INFINITY = 1 << 20
+
+# Modos de busca aceitos por solve().
+PUSHES = 'pushes'  # Minimiza o número de empurrões.
+MOVES = 'moves'  # Minimiza o número total de passos (incluindo empurrões).
+
+# A cada quantos nós expandidos solve() chama a função progress.
+PROGRESS_INTERVAL = 1000
+
+# Quantos emparelhamentos (veja goalMatching()) a heurística guarda para
+# refazer os dos filhos quando a posição é expandida.
+MATCHING_CACHE_SIZE = 4096
+
+
+def pushDistances(board):
+    """Para cada objetivo, calcula quantos empurrões uma estrela sozinha no mapa
+         precisa para chegar até ele a partir de cada célula.
+
+         A busca é feita ao contrário ("puxando" a estrela a partir do objetivo):
+         a estrela só pode ser empurrada de prev para cell se existe espaço
+         para o jogador atrás dela. Retorna uma lista de listas, uma por
+         objetivo, com INFINITY nas células de onde o objetivo é inalcançável."""
+
+    walls = board['walls']
+    offsets = [offset for (direction, offset) in board['directions']]
+    table = []
+    for goal in board['goals']:
+        dist = [INFINITY] * board['size']
+        dist[goal] = 0
+        queue = deque([goal])
+        while queue:
+            cell = queue.popleft()
+            nextDist = dist[cell] + 1
+            for offset in offsets:
+                prev = cell - offset
+                if not walls[prev] and not walls[prev - offset] and dist[prev] == INFINITY:
+                    dist[prev] = nextDist
+                    queue.append(prev)
+        table.append(dist)
+    return table
+
+
+def _augment(costRows, u, v, match, i):
+    """Uma fase do algoritmo húngaro: emparelha o objetivo i (contando de 1)
+         com uma estrela, mudando match (match[j] é o objetivo da estrela j)
+         e as variáveis duais u e v. As variáveis já devem ser viáveis para
+         os outros objetivos emparelhados."""
+
+    numStars = len(v) - 1
+    columns = range(1, numStars + 1)
+    way = [0] * (numStars + 1)
+    minv = [INFINITY * INFINITY] * (numStars + 1)
+    used = [False] * (numStars + 1)
+    match[0] = i
+    j0 = 0
+    while True:
+        used[j0] = True
+        i0 = match[j0]
+        row = costRows[i0 - 1]
+        ui0 = u[i0]
+        delta = INFINITY * INFINITY
+        j1 = 0
+        for j in columns:
+            if not used[j]:
+                cur = row[j - 1] - ui0 - v[j]
+                if cur < minv[j]:
+                    minv[j] = cur
+                    way[j] = j0
+                if minv[j] < delta:
+                    delta = minv[j]
+                    j1 = j
+        for j in range(numStars + 1):
+            if used[j]:
+                u[match[j]] += delta
+                v[j] -= delta
+            else:
+                minv[j] -= delta
+        j0 = j1
+        if match[j0] == 0:
+            break
+    while j0:
+        j1 = way[j0]
+        match[j0] = match[j1]
+        j0 = j1
+
+
+def matchingLowerBound(costRows, numStars):
+    """Retorna o custo do emparelhamento de custo mínimo entre objetivos (linhas
+         de costRows) e estrelas (colunas), usando o algoritmo húngaro.
+
+         Cada objetivo recebe uma estrela diferente; estrelas a mais podem
+         ficar sem objetivo. O resultado é um limite inferior admissível para
+         o número de empurrões que faltam."""
+
+    numGoals = len(costRows)
+    u = [0] * (numGoals + 1)
+    v = [0] * (numStars + 1)
+    match = [0] * (numStars + 1)
+    for i in range(1, numGoals + 1):
+        _augment(costRows, u, v, match, i)
+    return -v[0]
+
+
+def _squareRows(costRows, numStars):
+    # Objetivos falsos, de custo 0, para as estrelas a mais: com a matriz
+    # quadrada toda estrela tem um objetivo, o que rematchGoals() precisa.
+    return costRows + [[0] * numStars] * (numStars - len(costRows))
+
+
+def goalMatching(costRows, stars):
+    """Retorna o emparelhamento de custo mínimo entre os objetivos (linhas de
+         costRows) e as estrelas da tupla stars, como (u, vByCell, goalByCell):
+         as variáveis duais dos objetivos, as das estrelas por célula e o
+         objetivo de cada estrela por célula. É o ponto de partida de
+         rematchGoals() para as posições que saem desta com um empurrão."""
+
+    numStars = len(stars)
+    rows = _squareRows(costRows, numStars)
+    u = [0] * (numStars + 1)
+    v = [0] * (numStars + 1)
+    match = [0] * (numStars + 1)
+    for i in range(1, numStars + 1):
+        _augment(rows, u, v, match, i)
+    return u, dict(zip(stars, v[1:])), dict(zip(stars, match[1:]))
+
+
+def rematchGoals(costRows, stars, parentMatching, star, target):
+    """Retorna (custo, emparelhamento) do emparelhamento de custo mínimo
+         para a tupla stars, a posição em que a estrela em star foi empurrada
+         para target, a partir de parentMatching, o goalMatching() da posição
+         anterior. O emparelhamento retornado é como o de goalMatching().
+
+         As outras estrelas não mudaram, então o emparelhamento e as variáveis
+         duais delas continuam valendo: só o objetivo da estrela empurrada é
+         emparelhado de novo, com uma fase do algoritmo húngaro (O(n²) em vez
+         das n fases de matchingLowerBound())."""
+
+    numStars = len(stars)
+    rows = _squareRows(costRows, numStars)
+    parentU, vByCell, goalByCell = parentMatching
+    u = list(parentU)
+    freeGoal = goalByCell[star]
+    v = [0] + [vByCell.get(cell, 0) for cell in stars]
+    match = [0] + [goalByCell.get(cell, 0) for cell in stars]
+    # A estrela em target fica sem objetivo, com o maior v que mantém as
+    # variáveis duais viáveis para os objetivos que continuam emparelhados.
+    column = stars.index(target) + 1
+    v[column] = min((rows[i - 1][column - 1] - u[i] for i in range(1, numStars + 1) if i != freeGoal),
+                    default=0)
+    _augment(rows, u, v, match, freeGoal)
+    numGoals = len(costRows)
+    total = sum(rows[match[j] - 1][j - 1] for j in range(1, numStars + 1) if match[j] <= numGoals)
+    return total, (u, dict(zip(stars, v[1:])), dict(zip(stars, match[1:])))
+
+
+def makeHeuristic(board, distances, maxCacheSize=None):
+    """Cria a função heurística h(stars, starBits, pushed=None) para a placa
+         dada, onde stars é a tupla de células com estrelas e starBits os
+         bits delas (a chave da cache: um hash poderia juntar posições
+         diferentes). pushed, se dado, é (parentStars, star, target): a
+         posição anterior e o empurrão que levou a stars. Com ele o
+         emparelhamento é refeito a partir do da posição anterior (veja
+         rematchGoals()), que é calculado uma vez para todos os filhos dela
+         ou vem dos últimos MATCHING_CACHE_SIZE emparelhamentos refeitos.
+
+         Retorna INFINITY quando as estrelas não podem cobrir todos os
+         objetivos (isso já é um beco sem saída e o nó pode ser descartado).
+         Os valores ficam guardados; com maxCacheSize, a cache é esvaziada
+         quando chega a esse tamanho."""
+
+    numGoals = len(board['goals'])
+    cache = {}
+    matchings = {}  # estrelas -> goalMatching() das posições recentes
+    parent = [None, None]  # (estrelas, goalMatching()) da última posição anterior
+
+    def heuristic(stars, starBits, pushed=None):
+        if starBits in cache:
+            return cache[starBits]
+
+        costRows = [[dist[star] for star in stars] for dist in distances]
+
+        # Atalho: se cada objetivo tem uma estrela mais próxima diferente,
+        # esse emparelhamento guloso já é o de custo mínimo.
+        total = 0
+        chosen = set()
+        for row in costRows:
+            best = min(row)
+            chosen.add(row.index(best))
+            total += best
+        if len(chosen) < numGoals:
+            if pushed is None:
+                total = matchingLowerBound(costRows, len(stars))
+            else:
+                parentStars, star, target = pushed
+                if parent[0] != parentStars:
+                    parent[0] = parentStars
+                    parent[1] = matchings.get(parentStars)
+                    if parent[1] is None:
+                        parent[1] = goalMatching([[dist[cell] for cell in parentStars] for dist in distances],
+                                                 parentStars)
+                total, matching = rematchGoals(costRows, stars, parent[1], star, target)
+                if len(matchings) >= MATCHING_CACHE_SIZE:
+                    matchings.clear()
+                matchings[stars] = matching
+
+        if total >= INFINITY:
+            total = INFINITY
+        if maxCacheSize is not None and len(cache) >= maxCacheSize:
+            cache.clear()
+        cache[starBits] = total
+        return total
+
+    return heuristic
+
+
+def playerReach(walls, offsets, stars, player):
+    """Marca as células que o jogador alcança sem empurrar nenhuma estrela.
+
+         Retorna (marks, normalized): em marks, 2 é uma célula alcançável e 1 é
+         uma parede ou estrela. normalized é a menor célula alcançável, usada
+         para identificar a região do jogador na tabela de transposição.
+         walls e offsets são os da placa; stars é a tupla de células com
+         estrelas. Usada pelos dois resolvedores (este e o disksolver)."""
+
+    marks = bytearray(walls)
+    for star in stars:
+        marks[star] = 1
+    marks[player] = 2
+    normalized = player
+    stack = [player]
+    while stack:
+        cell = stack.pop()
+        for offset in offsets:
+            nxt = cell + offset
+            if not marks[nxt]:
+                marks[nxt] = 2
+                stack.append(nxt)
+                if nxt < normalized:
+                    normalized = nxt
+    return marks, normalized
+
+
+def walkDistances(walls, directions, starBits, player):
+    """Busca em largura a partir do jogador, com as estrelas dadas como máscara
+         de bits, sem empurrar nenhuma. Retorna um dicionário
+         {célula: (distância, célula anterior, direção)} das células alcançáveis,
+         de onde walkPath() monta o caminho e o modo MOVES tira o custo de
+         chegar a cada empurrão."""
+
+    dist = {player: (0, None, None)}
+    queue = deque([player])
+    while queue:
+        cell = queue.popleft()
+        nextDist = dist[cell][0] + 1
+        for direction, offset in directions:
+            nxt = cell + offset
+            if nxt not in dist and not walls[nxt] and not (starBits >> nxt) & 1:
+                dist[nxt] = (nextDist, cell, direction)
+                queue.append(nxt)
+    return dist
+
+
+def walkPath(board, starBits, start, end):
+    """Retorna a lista de direções do caminho mais curto de start até end que
+         não empurra estrelas, ou None se end não for alcançável."""
+
+    dist = walkDistances(board['walls'], board['directions'], starBits, start)
+    if end not in dist:
+        return None
+    path = []
+    cell = end
+    while cell != start:
+        distance, prev, direction = dist[cell]
+        path.append(direction)
+        cell = prev
+    path.reverse()
+    return path
+
+
+def solve(levelObj, mode=PUSHES, maxNodes=None, timeLimit=None, startState=None, progress=None):
+    """Procura uma solução para o nível com A*.
+
+         mode é PUSHES (mínimo de empurrões) ou MOVES (mínimo de passos). A busca
+         para ao expandir maxNodes nós ou ao passar timeLimit segundos, se dados.
+         startState é o GameState de onde a busca parte (o padrão é o estado
+         inicial do nível). progress, se dada, é chamada com (nós expandidos,
+         segundos) a cada PROGRESS_INTERVAL nós expandidos.
+
+         Retorna um dicionário com:
+             * 'status': 'solved', 'unsolvable' ou 'limit'
+             * 'solution': a solução em LURD (None se não resolvido)
+             * 'moves' e 'pushes': o tamanho da solução
+             * 'nodesExpanded': quantos nós a busca expandiu
+             * 'seconds': o tempo gasto na busca"""
+
+    assert mode in (PUSHES, MOVES), 'Modo de busca desconhecido: %s' % (mode)
+    startTime = time.time()
+
+    board = levelObj['board']
+    if startState is None:
+        startState = levelObj['startState']
+    walls = board['walls']
+    directions = board['directions']
+    offsets = [offset for (direction, offset) in directions]
+    goalMask = board['goalMask']
+    deadlocks = levelObj['deadlocks']
+    heuristic = makeHeuristic(board, pushDistances(board))
+
+    result = {
+        'status': 'unsolvable',
+        'solution': None,
+        'moves': None,
+        'pushes': None,
+        'nodesExpanded': 0,
+        'seconds': 0.0
+    }
+
+    startStars = tuple(startState.starCells())
+    startH = heuristic(startStars, startState.stars)
+    if startH >= INFINITY:
+        result['seconds'] = time.time() - startTime
+        return result
+
+    # Os estados são identificados pela posição inteira, (bits das estrelas,
+    # jogador), e não por um hash dela, que poderia juntar dois estados
+    # diferentes. bestCost guarda o menor custo conhecido de cada estado gerado
+    # e parents o empurrão que levou até ele. transpositionTable guarda os
+    # estados já expandidos (no modo PUSHES a posição do jogador é normalizada
+    # pela região).
+    startKey = (startState.stars, startState.player)
+    bestCost = {startKey: 0}
+    parents = {startKey: None}
+    transpositionTable = set()
+    openList = [(startH, startH, 0, startStars, startState.stars, startState.player)]
+    counter = 1
+    nodesExpanded = 0
+    goalKey = None
+
+    while openList:
+        f, h, order, stars, starBits, player = heapq.heappop(openList)
+        key = (starBits, player)
+        cost = f - h
+        if cost > bestCost[key]:
+            continue  # Uma entrada antiga, já existe um caminho melhor.
+
+        if goalMask & ~starBits == 0:
+            goalKey = key
+            break
+
+        if mode == PUSHES:
+            marks, normalized = playerReach(walls, offsets, stars, player)
+            closedKey = (starBits, normalized)
+        else:
+            dist = walkDistances(walls, directions, starBits, player)
+            closedKey = key
+        if closedKey in transpositionTable:
+            continue
+        transpositionTable.add(closedKey)
+
+        nodesExpanded += 1
+        if maxNodes is not None and nodesExpanded > maxNodes:
+            result['status'] = 'limit'
+            break
+        if timeLimit is not None and time.time() - startTime > timeLimit:
+            result['status'] = 'limit'
+            break
+        if progress is not None and nodesExpanded % PROGRESS_INTERVAL == 0:
+            progress(nodesExpanded, time.time() - startTime)
+
+        for i in range(len(stars)):
+            star = stars[i]
+            for direction, offset in directions:
+                behind = star - offset
+                target = star + offset
+                if walls[target] or (starBits >> target) & 1:
+                    continue
+                if mode == PUSHES:
+                    if marks[behind] != 2:
+                        continue
+                    newCost = cost + 1
+                else:
+                    if behind not in dist:
+                        continue
+                    newCost = cost + dist[behind][0] + 1
+                if isDeadlockedPush(deadlocks, starBits, star, target):
+                    continue
+
+                newStarBits = starBits ^ (1 << star) ^ (1 << target)
+                newStars = tuple(sorted(stars[:i] + (target,) + stars[i + 1:]))
+                newH = heuristic(newStars, newStarBits, (stars, star, target))
+                if newH >= INFINITY:
+                    continue
+                newKey = (newStarBits, star)
+                if newKey in bestCost and bestCost[newKey] <= newCost:
+                    continue
+                bestCost[newKey] = newCost
+                parents[newKey] = (key, behind, direction)
+                heapq.heappush(openList, (newCost + newH, newH, counter, newStars, newStarBits, star))
+                counter += 1
+
+    result['nodesExpanded'] = nodesExpanded
+    if goalKey is not None:
+        result['solution'] = _buildSolution(board, startState, parents, goalKey)
+        result['status'] = 'solved'
+        result['moves'] = len(result['solution'])
+        result['pushes'] = sum(1 for letter in result['solution'] if letter.isupper())
+    result['seconds'] = time.time() - startTime
+    return result
+
+
+def _buildSolution(board, startState, parents, goalKey):
+    """Reconstrói a string LURD a partir dos ponteiros de parents, refazendo
+         os empurrões a partir do estado inicial."""
+
+    pushes = []  # lista de (célula do jogador antes do empurrão, direção)
+    key = goalKey
+    while parents[key] is not None:
+        parentKey, behind, direction = parents[key]
+        pushes.append((behind, direction))
+        key = parentKey
+    pushes.reverse()
+    return pushesToLURD(board, startState, pushes)
+
+
+def pushesToLURD(board, startState, pushes):
+    """Retorna a string LURD que faz os empurrões de pushes, uma lista de
+         (célula do jogador antes do empurrão, direção), a partir de
+         startState, andando pelo caminho mais curto até cada empurrão."""
+
+    offsets = board['offsets']
+    letters = []
+    state = startState.copy()
+    for behind, direction in pushes:
+        for step in walkPath(board, state.stars, state.player, behind):
+            letters.append(LURDLETTERS[step])
+        letters.append(LURDLETTERS[direction].upper())
+        star = behind + offsets[direction]
+        state.moveStar(star, star + offsets[direction])
+        state.player = star
+    return ''.join(letters)
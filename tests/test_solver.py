@@ -0,0 +1,221 @@
+"""Testes do resolvedor, do diário de salvamento e da reprodução de soluções."""
+
+import os
+import random
+
+import pytest
+
+import savegame
+import starsolver
+from deadlock import isDeadlockedPush
+from gamestate import DOWN, LEFT, RIGHT, UP
+from levelfile import parseLevel, readLevelsFile
+from replay import Replay, expandLURD
+from starcore import checkSolution, makeMove, playSolution
+
+LEVELS_FILENAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Levels.txt')
+
+# Um nível pequeno: o jogador precisa dar a volta para empurrar a segunda estrela.
+SMALL_LEVEL = [
+    '#######',
+    '#.@   #',
+    '#  $  #',
+    '# $   #',
+    '#.    #',
+    '#######',
+]
+
+# A estrela só pode ir para o canto, que não é um objetivo.
+DEADLOCKED_LEVEL = [
+    '#####',
+    '#@$ #',
+    '##  #',
+    '#.  #',
+    '#####',
+]
+
+
+def makeLevel(lines):
+    return parseLevel(list(lines), 0, len(lines), 'teste')
+
+
+@pytest.fixture(scope='module')
+def levels():
+    return readLevelsFile(LEVELS_FILENAME)
+
+
+@pytest.mark.parametrize('mode', [starsolver.PUSHES, starsolver.MOVES])
+def testSolveFindsValidSolution(mode):
+    levelObj = makeLevel(SMALL_LEVEL)
+    result = starsolver.solve(levelObj, mode=mode)
+    assert result['status'] == 'solved'
+    assert playSolution(levelObj, result['solution'])
+    assert checkSolution(levelObj, result['solution'])
+    assert result['moves'] == len(result['solution'])
+    assert result['pushes'] == sum(1 for letter in result['solution'] if letter.isupper())
+
+
+def testSolveIsOptimal(levels):
+    pushes = starsolver.solve(levels[0], mode=starsolver.PUSHES)
+    moves = starsolver.solve(levels[0], mode=starsolver.MOVES)
+    assert pushes['pushes'] == 4
+    assert moves['moves'] <= pushes['moves']
+    assert playSolution(levels[0], pushes['solution']) and playSolution(levels[0], moves['solution'])
+
+
+def testSolveStopsAtTimeLimit(levels):
+    # O nível 6 tem 29 estrelas e não é resolvido em frações de segundo.
+    result = starsolver.solve(levels[5], timeLimit=0.2)
+    assert result['status'] == 'limit'
+    assert result['solution'] is None
+    assert result['seconds'] < 1.0
+
+
+def testSolveStopsAtNodeLimit(levels):
+    result = starsolver.solve(levels[5], maxNodes=10)
+    assert result['status'] == 'limit'
+
+
+def testDeadlockedLevelIsUnsolvable():
+    levelObj = makeLevel(DEADLOCKED_LEVEL)
+    board = levelObj['board']
+    star = levelObj['startState'].starCells()[0]
+    corner = star + board['offsets'][RIGHT]
+    # Empurrar a estrela para o canto é um beco sem saída e nem é gerado.
+    assert isDeadlockedPush(levelObj['deadlocks'], levelObj['startState'].stars, star, corner)
+    result = starsolver.solve(levelObj)
+    assert result['status'] == 'unsolvable'
+    assert result['nodesExpanded'] <= 1
+
+
+def testRematchGoalsMatchesFullMatching(levels):
+    levelObj = levels[5]
+    board = levelObj['board']
+    distances = starsolver.pushDistances(board)
+    stars = tuple(levelObj['startState'].starCells())
+    matching = starsolver.goalMatching([[dist[cell] for cell in stars] for dist in distances], stars)
+    starBits = levelObj['startState'].stars
+    checked = 0
+    for star in stars:
+        for direction, offset in board['directions']:
+            target = star + offset
+            if board['walls'][target] or (starBits >> target) & 1:
+                continue
+            newStars = tuple(sorted(set(stars) - {star} | {target}))
+            costRows = [[dist[cell] for cell in newStars] for dist in distances]
+            total = starsolver.rematchGoals(costRows, newStars, matching, star, target)[0]
+            assert total == starsolver.matchingLowerBound(costRows, len(newStars))
+            checked += 1
+    assert checked > 0
+
+
+def testExpandLURD():
+    assert expandLURD('3r2U\nl d') == 'rrrUUld'
+    with pytest.raises(ValueError):
+        expandLURD('rux')
+    with pytest.raises(ValueError):
+        expandLURD('r3')
+
+
+def testReplayRoundTrip():
+    levelObj = makeLevel(SMALL_LEVEL)
+    solution = starsolver.solve(levelObj)['solution']
+    levelReplay = Replay(levelObj, expandLURD(solution), keyframeInterval=4)
+    assert levelReplay.isSolution()
+    assert levelReplay.length == len(solution)
+    assert levelReplay.stateAt(levelReplay.length).isSolved()
+    # Cada passo reproduzido a partir de um quadro-chave é igual a jogar com makeMove().
+    gameStateObj = levelObj['startState'].copy()
+    letterToDirection = {'u': UP, 'd': DOWN, 'l': LEFT, 'r': RIGHT}
+    for step, letter in enumerate(solution):
+        state = levelReplay.stateAt(step)
+        assert (state.player, state.stars) == (gameStateObj.player, gameStateObj.stars)
+        makeMove(levelObj['mapObj'], gameStateObj, letterToDirection[letter.lower()])
+        gameStateObj.stepCounter += 1
+
+
+def testReplayStopsAtInvalidStep():
+    levelObj = makeLevel(SMALL_LEVEL)
+    levelReplay = Replay(levelObj, 'U')  # não há estrela acima do jogador
+    assert not levelReplay.isValid()
+    assert levelReplay.length == 0
+    assert not checkSolution(levelObj, 'U')
+    assert not playSolution(levelObj, 'U')
+
+
+def playRandomMoves(levelObj, journal, gameStateObj, history, count, seed):
+    rng = random.Random(seed)
+    for i in range(count):
+        if rng.random() < 0.1 and history.undo(gameStateObj) is not None:
+            journal.append(savegame.UNDO_RECORD, gameStateObj, history)
+            continue
+        direction = rng.choice([UP, DOWN, LEFT, RIGHT])
+        starsBefore = gameStateObj.stars
+        if makeMove(levelObj['mapObj'], gameStateObj, direction):
+            gameStateObj.stepCounter += 1
+            history.record(direction, starsBefore != gameStateObj.stars)
+            journal.append(history.moves[history.position - 1], gameStateObj, history)
+
+
+def assertSameGame(stateA, historyA, stateB, historyB):
+    assert (stateA.player, stateA.stars, stateA.stepCounter) == (stateB.player, stateB.stars, stateB.stepCounter)
+    assert historyA.moves == historyB.moves and historyA.position == historyB.position
+
+
+def testJournalResume(levels, tmp_path):
+    levelObj = levels[3]
+    journal = savegame.LevelJournal(levelObj, 3, str(tmp_path))
+    gameStateObj, history = journal.resume()
+    assert history.position == 0
+    playRandomMoves(levelObj, journal, gameStateObj, history, 1000, seed=1)
+    journal.close()
+    assert os.path.exists(journal.snapshotFilename)
+
+    resumed = savegame.LevelJournal(levelObj, 3, str(tmp_path))
+    resumedState, resumedHistory = resumed.resume()
+    resumed.close()
+    assertSameGame(resumedState, resumedHistory, gameStateObj, history)
+
+    # Um fim de arquivo com lixo (de uma queda) é ignorado.
+    with open(journal.journalFilename, 'ab') as journalFile:
+        journalFile.write(b'\0\0')
+    resumed = savegame.LevelJournal(levelObj, 3, str(tmp_path))
+    resumedState, resumedHistory = resumed.resume()
+    resumed.close()
+    assertSameGame(resumedState, resumedHistory, gameStateObj, history)
+
+
+def testJournalDropsStaleSnapshot(levels, tmp_path):
+    levelObj = levels[3]
+    journal = savegame.LevelJournal(levelObj, 3, str(tmp_path))
+    gameStateObj, history = journal.resume()
+    playRandomMoves(levelObj, journal, gameStateObj, history, 600, seed=2)
+    journal.close()
+
+    # O diário cortado antes do instantâneo: o instantâneo não vale mais.
+    with open(journal.journalFilename, 'r+b') as journalFile:
+        journalFile.truncate(savegame.JOURNAL_HEADER.size + 50)
+    journal = savegame.LevelJournal(levelObj, 3, str(tmp_path))
+    gameStateObj, history = journal.resume()
+    assert history.position <= 50
+    assert not os.path.exists(journal.snapshotFilename)
+    playRandomMoves(levelObj, journal, gameStateObj, history, 600, seed=3)
+    journal.close()
+
+    resumed = savegame.LevelJournal(levelObj, 3, str(tmp_path))
+    resumedState, resumedHistory = resumed.resume()
+    resumed.close()
+    assertSameGame(resumedState, resumedHistory, gameStateObj, history)
+
+
+def testJournalIgnoresOtherLevel(levels, tmp_path):
+    journal = savegame.LevelJournal(levels[3], 3, str(tmp_path))
+    gameStateObj, history = journal.resume()
+    playRandomMoves(levels[3], journal, gameStateObj, history, 50, seed=4)
+    journal.close()
+    os.replace(journal.journalFilename, os.path.join(str(tmp_path), 'nivel5' + savegame.JOURNAL_EXTENSION))
+    other = savegame.LevelJournal(levels[4], 4, str(tmp_path))
+    otherState, otherHistory = other.resume()
+    other.close()
+    assert otherHistory.position == 0
+    assert otherState.player == levels[4]['startState'].player
@@ -0,0 +1,177 @@
+"""Vários níveis jogados ao mesmo tempo, em lote, para treinar agentes.
+
+O VecStarPusher guarda N ambientes (cada um jogando um nível do
+readLevelsFile()) em matrizes do NumPy e faz um movimento em todos eles com
+uma única chamada de step(), com as mesmas regras de makeMove() e
+isBlocked(). Em vez de um GameState, um mapa e uma chamada de função por
+ambiente a cada passo, cada passo é um punhado de operações nas matrizes
+inteiras, então o custo por movimento cai com o número de ambientes.
+
+Todas as placas são copiadas para uma grade comum, do tamanho da maior
+placa, com paredes em volta dos níveis menores. Como a grade é a mesma, os
+deslocamentos de cada direção também são iguais em todos os ambientes.
+
+O NumPy é opcional: o jogo não importa este módulo. Este módulo não importa
+o pygame."""
+
+import numpy
+
+from gamestate import cellToXY
+from history import DIRECTIONS
+
+# As ações de step() são os índices das direções em history.DIRECTIONS
+# (cima, baixo, esquerda, direita).
+NUM_ACTIONS = len(DIRECTIONS)
+
+# As recompensas de cada passo.
+REWARD_STEP = -0.1  # cada passo, mesmo os que batem em uma parede
+REWARD_STAR_ON_GOAL = 1.0  # uma estrela empurrada para um objetivo
+REWARD_STAR_OFF_GOAL = -1.0  # uma estrela empurrada para fora de um objetivo
+REWARD_SOLVED = 10.0  # o nível foi resolvido
+
+# Os bits de cada espaço nas observações. Um espaço sem nenhum bit é piso;
+# um objetivo com uma estrela é OBS_GOAL | OBS_STAR, e assim por diante.
+OBS_WALL = 1
+OBS_GOAL = 2
+OBS_STAR = 4
+OBS_PLAYER = 8
+
+
+class VecStarPusher:
+    """N ambientes, o ambiente i jogando levels[levelIndices[i]].
+
+         levels são objetos de nível (de readLevelsFile() ou
+         openLevelsFile()). Sem levelIndices, o ambiente i joga o nível
+         i % len(levels). Um ambiente que resolve o nível, ou que chega a
+         maxSteps ações (se dado; as que batem em paredes também contam),
+         termina e volta sozinho para o estado
+         inicial do seu nível no mesmo step().
+
+         As observações são matrizes de uint8 com o formato (N, colunas,
+         linhas) da grade comum, com os bits OBS_*; obs[i, x + 1, y + 1] é o
+         espaço (x, y) do nível do ambiente i.
+
+         Internamente, as células de todos os ambientes ficam em matrizes
+         planas: a célula c do ambiente i é o índice i * size + c."""
+
+    def __init__(self, levels, numEnvs=None, levelIndices=None, maxSteps=None):
+        if levelIndices is None:
+            if numEnvs is None:
+                numEnvs = len(levels)
+            levelIndices = [i % len(levels) for i in range(numEnvs)]
+        self.levelIndices = numpy.array(levelIndices, dtype=numpy.int64)
+        self.numEnvs = len(self.levelIndices)
+        self.maxSteps = maxSteps
+
+        # Cada nível usado é convertido uma vez; os ambientes que jogam o
+        # mesmo nível copiam as mesmas linhas.
+        usedLevels = sorted(set(levelIndices))
+        boards = [levels[i]['board'] for i in usedLevels]
+        self.numCols = max(board['numCols'] for board in boards) + 2
+        self.numRows = max(board['numRows'] for board in boards) + 2
+        size = self.numCols * self.numRows
+
+        levelWalls = numpy.ones((len(usedLevels), size), dtype=bool)
+        levelGoals = numpy.zeros((len(usedLevels), size), dtype=bool)
+        levelStars = numpy.zeros((len(usedLevels), size), dtype=bool)
+        levelPlayers = numpy.zeros(len(usedLevels), dtype=numpy.int64)
+        for row, levelNum in enumerate(usedLevels):
+            levelObj = levels[levelNum]
+            board = levelObj['board']
+            startState = levelObj['startState']
+            walls = numpy.frombuffer(bytes(board['walls']), dtype=numpy.uint8)
+            grid = levelWalls[row].reshape(self.numCols, self.numRows)
+            grid[:board['numCols'] + 2, :board['stride']] = walls.reshape(board['numCols'] + 2, board['stride'])
+            levelGoals[row, [self._gridCell(board, cell) for cell in board['goals']]] = True
+            levelStars[row, [self._gridCell(board, cell) for cell in startState.starCells()]] = True
+            levelPlayers[row] = self._gridCell(board, startState.player)
+
+        # A linha de cada ambiente nas matrizes dos níveis.
+        envRows = numpy.searchsorted(usedLevels, self.levelIndices)
+        self.size = size
+        self.walls = levelWalls[envRows].ravel()
+        self.goals = levelGoals[envRows].ravel()
+        self.numGoals = levelGoals[envRows].sum(axis=1)
+        self.startStars = levelStars[envRows].ravel()
+        # A primeira célula de cada ambiente nas matrizes planas.
+        self.envStarts = numpy.arange(self.numEnvs, dtype=numpy.int64) * size
+        self.startPlayers = levelPlayers[envRows] + self.envStarts
+        # As paredes e os objetivos não mudam, então a parte deles nas
+        # observações é calculada uma vez.
+        self.staticObs = (self.walls * OBS_WALL + self.goals * OBS_GOAL).astype(numpy.uint8)
+
+        self.offsets = numpy.array([{'up': -1, 'down': 1, 'left': -self.numRows, 'right': self.numRows}[direction]
+                                    for direction in DIRECTIONS], dtype=numpy.int64)
+        self.envs = numpy.arange(self.numEnvs)
+        self.stars = self.startStars.copy()
+        self.players = self.startPlayers.copy()
+        self.steps = numpy.zeros(self.numEnvs, dtype=numpy.int64)
+        self.starsOnGoals = (self.stars & self.goals).reshape(self.numEnvs, size).sum(axis=1)
+
+    def _gridCell(self, board, cell):
+        """Converte uma célula da placa do nível em uma célula da grade comum."""
+        x, y = cellToXY(board, cell)
+        return (x + 1) * self.numRows + y + 1
+
+    def reset(self, envs=None):
+        """Volta os ambientes envs (todos, se não for dado) para o estado
+             inicial dos seus níveis. Retorna as observações de todos."""
+        self._resetEnvs(self.envs if envs is None else envs)
+        return self.observations()
+
+    def _resetEnvs(self, envs):
+        stars = self.stars.reshape(self.numEnvs, self.size)
+        stars[envs] = self.startStars.reshape(self.numEnvs, self.size)[envs]
+        self.players[envs] = self.startPlayers[envs]
+        self.steps[envs] = 0
+        self.starsOnGoals[envs] = self.numGoals[envs] - \
+            (self.goals.reshape(self.numEnvs, self.size)[envs] & ~stars[envs]).sum(axis=1)
+
+    def step(self, actions):
+        """Faz em cada ambiente i o movimento actions[i] (um índice de
+             history.DIRECTIONS). Retorna (observações, recompensas, terminou,
+             resolvido): as observações depois dos ambientes que terminaram
+             voltarem ao início, e três matrizes de N valores."""
+
+        offsets = self.offsets[actions]
+        targets = self.players + offsets
+        # As bordas da grade são paredes, então beyond só sai da grade do
+        # ambiente quando targets é uma parede, e esses movimentos são
+        # descartados de qualquer jeito. O clip só evita sair das matrizes.
+        beyond = numpy.clip(targets + offsets, 0, len(self.walls) - 1)
+
+        targetStars = self.stars[targets]
+        beyondBlocked = self.walls[beyond] | self.stars[beyond]
+        moved = ~self.walls[targets] & ~(targetStars & beyondBlocked)
+        pushed = moved & targetStars
+
+        pushFrom = targets[pushed]
+        pushTo = beyond[pushed]
+        self.stars[pushFrom] = False
+        self.stars[pushTo] = True
+        goalChange = numpy.zeros(self.numEnvs, dtype=numpy.int64)
+        goalChange[pushed] = self.goals[pushTo].astype(numpy.int64) - self.goals[pushFrom]
+        self.starsOnGoals += goalChange
+
+        self.players = numpy.where(moved, targets, self.players)
+        self.steps += 1
+
+        solved = self.starsOnGoals == self.numGoals
+        rewards = numpy.full(self.numEnvs, REWARD_STEP)
+        rewards[goalChange > 0] += REWARD_STAR_ON_GOAL
+        rewards[goalChange < 0] += REWARD_STAR_OFF_GOAL
+        rewards[solved] += REWARD_SOLVED
+        done = solved.copy()
+        if self.maxSteps is not None:
+            done |= self.steps >= self.maxSteps
+
+        if done.any():
+            self._resetEnvs(self.envs[done])
+        return self.observations(), rewards, done, solved
+
+    def observations(self):
+        """Retorna as observações de todos os ambientes (veja a classe)."""
+        obs = self.stars.view(numpy.uint8) * numpy.uint8(OBS_STAR)
+        obs |= self.staticObs
+        obs[self.players] |= OBS_PLAYER
+        return obs.reshape(self.numEnvs, self.numCols, self.numRows)